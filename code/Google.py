@@ -1,13 +1,86 @@
 import pickle
 import datetime
+import json
 import os
+import threading
 
-from google_auth_oauthlib.flow import InstalledAppFlow  # , Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+# Google client libraries take ~0.3 s to import: they are imported by the functions needing them, so a 'LazyService'
+# never used (dry runs) costs nothing.
 
+_credentials = {}  # Credentials loaded once per token file, shared by services of the same process.
+_credentials_lock = threading.Lock()
+
+
+def get_discovery_document(api_name, api_version, directory='.'):
+    """Get the API discovery document from a local copy, stored at first use (from the client library static copy, or
+    downloaded if the library has none), so services are built offline."""
+    from googleapiclient.discovery import V2_DISCOVERY_URI
+    from googleapiclient.discovery_cache import get_static_doc
+    from urllib.request import urlopen
+
+    doc_file = os.path.join(directory, f'discovery_{api_name}_{api_version}.json')
+
+    if os.path.exists(doc_file):
+        with open(doc_file, encoding='utf8') as doc:
+            return doc.read()
+
+    content = get_static_doc(api_name.lower(), api_version)
+
+    if content is None:
+        with urlopen(V2_DISCOVERY_URI.format(api=api_name.lower(), apiVersion=api_version)) as response:
+            content = response.read().decode('utf8')
+
+    with open(doc_file, 'w', encoding='utf8') as doc:
+        doc.write(content)
+
+    return content
+
+
+def get_credentials(client_secret_file, api_name, api_version, scopes, token_file=None):
+    """Get OAuth credentials, stored as JSON (older pickle tokens are converted), refreshed or requested if needed.
+    One token file per account: 'token_<API name>_<API version>.json' by default."""
+    from google_auth_oauthlib.flow import InstalledAppFlow  # , Flow
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    with _credentials_lock:
+        token_file = token_file or f'token_{api_name}_{api_version}.json'
+        cred = _credentials.get(token_file)
+        pickle_file = f'{os.path.splitext(token_file)[0]}.pickle'
+
+        if cred is None and os.path.exists(token_file):
+            cred = Credentials.from_authorized_user_file(token_file, scopes)
+
+        elif cred is None and os.path.exists(pickle_file):
+            with open(pickle_file, 'rb') as token:
+                cred = pickle.load(token)
+
+            save_credentials(cred, token_file)
+            os.remove(pickle_file)
+
+        if not cred or not cred.valid:
+            if cred and cred.expired and cred.refresh_token:
+                cred.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, scopes)
+                cred = flow.run_local_server()
+
+            save_credentials(cred, token_file)
+
+        _credentials[token_file] = cred
+
+        return cred
+
+
+def save_credentials(cred, token_file):
+    """Write credentials as JSON, readable by the current user only."""
+    with os.fdopen(os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as token:
+        json.dump(json.loads(cred.to_json()), token)
+
+
+def create_service(client_secret_file, api_name, api_version, *scopes, token_file=None):
+    from googleapiclient.discovery import build_from_document
 
-def create_service(client_secret_file, api_name, api_version, *scopes):
     print(client_secret_file, api_name, api_version, scopes, sep='-')
     csf = client_secret_file
     api_sn = api_name
@@ -15,27 +88,10 @@ def create_service(client_secret_file, api_name, api_version, *scopes):
     scopes_ = list(scopes[0])
     print(scopes_)
 
-    cred = None
-
-    pickle_file = f'token_{api_sn}_{api_v}.pickle'
-    # print(pickle_file)
-
-    if os.path.exists(pickle_file):
-        with open(pickle_file, 'rb') as token:
-            cred = pickle.load(token)
-
-    if not cred or not cred.valid:
-        if cred and cred.expired and cred.refresh_token:
-            cred.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(csf, scopes_)
-            cred = flow.run_local_server()
-
-        with open(pickle_file, 'wb') as token:
-            pickle.dump(cred, token)
+    cred = get_credentials(csf, api_sn, api_v, scopes_, token_file)
 
     try:
-        service = build(api_sn, api_v, credentials=cred)
+        service = build_from_document(get_discovery_document(api_sn, api_v), credentials=cred)
         print(api_sn, 'service created successfully')
         return service
     except Exception as e:
@@ -43,6 +99,23 @@ def create_service(client_secret_file, api_name, api_version, *scopes):
         return None
 
 
+class LazyService:
+    """Service created with 'create_service' on first use only: nothing is read, refreshed or requested before."""
+
+    def __init__(self, client_secret_file, api_name, api_version, *scopes, token_file=None):
+        self.arguments = (client_secret_file, api_name, api_version, *scopes)
+        self.token_file = token_file
+        self.service = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        with self.lock:
+            if self.service is None:
+                self.service = create_service(*self.arguments, token_file=self.token_file)
+
+        return getattr(self.service, name)
+
+
 def convert_to_rfc_datetime(year=1900, month=1, day=1, hour=0, minute=0):
     dt = datetime.datetime(year, month, day, hour, minute).isoformat() + 'Z'
     return dt
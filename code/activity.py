@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from datetime import datetime
+from dateutil import tz
+from dateutil.relativedelta import relativedelta
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: activity.py
+@author: Dylan "dyl-m" Monfret
+
+Channel activity: a channel is active if its newest upload is less than a year old. The newest upload is found in the
+first page of its uploads playlist, so there is no need to retrieve a whole year of history to count uploads. The
+newest upload date of each channel is kept in a local JSON store, for channels without upload in the crawled period.
+
+Inactive channels are listed in a summary file written once per execution, to be checked by hand.
+
+Store format: {channel ID: {"last_upload": ISO 8601 UTC date or None, "checked_at": ISO date}}
+Report format: {"date": ISO date, "channels": [{"channel_id": ..., "channel_name": ..., "last_upload": ...,
+                                               "url": ...}, ...]}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/channel_activity.json'
+REPORT_PATH = '../files/inactive_channels.json'
+INACTIVE_AFTER = relativedelta(years=1)
+
+" - LOCAL FUNCTIONS - "
+
+
+def load_activity(json_path=DEFAULT_PATH):
+    """Load the channel activity store from disk.
+
+    :param json_path: file path to the store JSON file.
+    :return: the store as a dictionary (empty if the file does not exist yet).
+    """
+    if not isfile(json_path):
+        return {}
+
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def save_activity(activity, json_path=DEFAULT_PATH):
+    """Write the channel activity store on disk.
+
+    :param activity: the store dictionary.
+    :param json_path: file path to the store JSON file.
+    """
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump(activity, json_file, indent=4, sort_keys=True)
+
+
+def newest_upload(api_videos_list):
+    """Get the upload date of the most recent video of a list.
+
+    :param api_videos_list: list of 'playlistItems' resources (see 'get_videos.api_get_channel_videos').
+    :return: the date in ISO 8601 format (UTC), None if the list has no dated video.
+    """
+    return max((video["contentDetails"]["videoPublishedAt"] for video in api_videos_list
+                if "videoPublishedAt" in video["contentDetails"]), default=None)  # ISO 8601 UTC dates are sortable.
+
+
+def record_upload(activity, channel_id, last_upload):
+    """Update the newest upload date of a channel.
+
+    :param activity: the store dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param last_upload: newest upload date found by the crawl (see 'newest_upload'), None if none.
+    :return: the newest upload date known for this channel, None if none.
+    """
+    entry = activity.setdefault(channel_id, {"last_upload": None})
+
+    if last_upload is not None and (entry["last_upload"] is None or last_upload > entry["last_upload"]):
+        entry["last_upload"] = last_upload
+
+    entry["checked_at"] = f"{datetime.today():%Y-%m-%dT%H:%M:%S}"
+
+    return entry["last_upload"]
+
+
+def is_active(last_upload, now=None):
+    """Return a Boolean indicating if a channel uploaded a video recently.
+
+    :param last_upload: newest upload date in ISO 8601 format, None if the channel never uploaded.
+    :param now: reference date (today by default).
+    :return: True if the newest upload is less than a year ('INACTIVE_AFTER') old.
+    """
+    if last_upload is None:
+        return False
+
+    now = (now or datetime.today()).astimezone(tz.tzutc())
+    return datetime.strptime(last_upload, "%Y-%m-%dT%H:%M:%S%z") >= now - INACTIVE_AFTER
+
+
+def write_inactive_report(inactive_channels, json_path=REPORT_PATH):
+    """Write the summary of inactive channels found by an execution, replacing the previous one.
+
+    :param inactive_channels: list of {"channel_id": ..., "channel_name": ..., "last_upload": ...} dictionaries.
+    :param json_path: file path to the report JSON file.
+    """
+    channels = [{**channel, "url": f"https://www.youtube.com/channel/{channel['channel_id']}"}
+                for channel in inactive_channels]
+
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump({"date": f"{datetime.today():%Y-%m-%dT%H:%M:%S}", "channels": channels}, json_file, indent=4)
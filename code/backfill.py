@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+
+import channel_cache as cc
+import channel_db as cd
+import duration_cache as dc
+import get_videos as gv
+import json
+import quota as qt
+import response_cache as rc
+import routing as rt
+import run_log as rl
+import transport as tp
+
+from datetime import datetime
+from math import ceil
+from os import makedirs
+from os.path import isfile
+from pprint import pformat
+from time import perf_counter
+
+"""- SCRIPT INFORMATION -
+
+@file_name: backfill.py
+@author: Dylan "dyl-m" Monfret
+
+Backfill of a long period (months, years), over several days. A regular execution on such a period ignores channels
+with too many videos selected ('gv.MAX_CHANNEL_SHARE' of the insertion budget) and spends more than the daily quota.
+The backfill works on a persistent work queue, saved after each step, each run going on where the previous one
+stopped:
+
+1. survey: the uploads of each channel in the period are listed (listing requests only, cheap), channels deferred for
+   lack of quota are surveyed by the next run;
+2. windows: once every channel is surveyed, the period is split into windows of consecutive videos, each window costing
+   at most 'WINDOW_SHARE' of the daily insertion budget;
+3. insertions: windows are processed oldest first, videos of a window being added in chronological order (durations,
+   routing rules and insertions as in 'get_videos.execution'), as long as the quota left today allows it, keeping
+   '1 - BACKFILL_SHARE' of it for regular executions. A window interrupted (quota, API errors) is resumed first by the
+   next run, so playlists stay in chronological order.
+
+Progress and throughput are reported after each window, in the logs ('LOGS_DIRECTORY') and in "window" events.
+
+Queue format: {"oldest_date": ISO date, "latest_date": ISO date,
+               "pending_channels": [channel ID, ...] (not surveyed yet),
+               "videos": {channel ID: [[video ID, upload date (ISO 8601 UTC), title], ...]},
+               "windows": None until planned, then [{"oldest": ..., "latest": ... (upload dates), "videos": count,
+                                                     "status": "pending" or "done",
+                                                     "remaining": None or {playlist key: [video ID, ...]},
+                                                     "added": count, "missing": count,
+                                                     "failed": count (videos which can't be added, dropped),
+                                                     "units": count, "seconds": total}, ...]}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/backfill.json'
+LOGS_DIRECTORY = '../Logs/backfill'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+WINDOW_SHARE = 0.25  # Share of the daily insertion budget a window may cost.
+BACKFILL_SHARE = gv.WARNING_SHARE  # Share of the daily insertion budget the backfill may spend.
+SAVE_EVERY = 20  # Channels surveyed between two saves of the queue.
+
+" - LOCAL FUNCTIONS - "
+
+
+def new_queue(oldest_date, latest_date, channel_ids):
+    """Create the work queue of a backfill.
+
+    :param oldest_date: Lower bound of time interval.
+    :param latest_date: Upper bound of time interval.
+    :param channel_ids: list of channel IDs to survey.
+    :return: the queue dictionary.
+    """
+    return {"oldest_date": f"{oldest_date:{DATE_FORMAT}}", "latest_date": f"{latest_date:{DATE_FORMAT}}",
+            "pending_channels": list(channel_ids), "videos": {}, "windows": None}
+
+
+def load_queue(json_path=DEFAULT_PATH):
+    """Load the work queue from disk.
+
+    :param json_path: file path to the queue JSON file.
+    :return: the queue as a dictionary, None if the file does not exist.
+    """
+    if not isfile(json_path):
+        return None
+
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def save_queue(queue, json_path=DEFAULT_PATH):
+    """Write the work queue on disk.
+
+    :param queue: the queue dictionary.
+    :param json_path: file path to the queue JSON file.
+    """
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump(queue, json_file, separators=(',', ':'))
+
+
+def is_complete(queue):
+    return not queue["pending_channels"] and queue["windows"] is not None and \
+        all(window["status"] == "done" for window in queue["windows"])
+
+
+def plan_windows(videos, max_units):
+    """Split the surveyed videos into windows of consecutive uploads, each one within a quota budget. Videos uploaded
+    at the same time stay in the same window.
+
+    :param videos: dictionary associating channel ID and its videos (see queue format).
+    :param max_units: quota units a window may cost (one insertion per video, plus its 'videos.list' share).
+    :return: list of windows (see queue format), oldest first.
+    """
+    insert_cost = qt.UNIT_COSTS['playlistItems.insert']
+    max_videos = max(1, int(max_units // (insert_cost + 1 / 50)))
+    dates = sorted(video[1] for channel_videos in videos.values() for video in channel_videos)
+    windows = []
+    start = 0
+
+    while start < len(dates):
+        end = min(start + max_videos, len(dates))
+
+        while end < len(dates) and dates[end] == dates[end - 1]:
+            end += 1
+
+        windows.append({"oldest": dates[start], "latest": dates[end - 1], "videos": end - start, "status": "pending",
+                        "remaining": None, "added": 0, "missing": 0, "failed": 0, "units": 0, "seconds": 0.0})
+        start = end
+
+    return windows
+
+
+def window_videos(queue, window):
+    """Get the videos of a window, as (video ID, upload date, channel ID, title) tuples (see 'gv.video_selection')."""
+    return [(video_id, published, channel_id, title) for channel_id, channel_videos in queue["videos"].items()
+            for video_id, published, title in channel_videos if window["oldest"] <= published <= window["latest"]]
+
+
+def window_cost(window):
+    """Estimate the quota cost of what is left to do for a window."""
+    insert_cost = qt.UNIT_COSTS['playlistItems.insert']
+
+    if window["remaining"] is None:
+        return window["videos"] * insert_cost + ceil(window["videos"] / 50)
+
+    return sum(len(video_ids) for video_ids in window["remaining"].values()) * insert_cost
+
+
+def survey(queue, api_service, channel_cache=None, max_workers=1, service_factory=None, json_path=DEFAULT_PATH):
+    """List the uploads of pending channels in the backfill period.
+
+    :param queue: the queue dictionary, updated and saved every 'SAVE_EVERY' channels.
+    :param api_service: API Google Token generated with Google.py call.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :param max_workers: maximum number of channels crawled at the same time.
+    :param service_factory: function without argument returning a new API service, needed if 'max_workers' > 1.
+    :param json_path: file path to the queue JSON file.
+    :return: number of channels surveyed.
+    """
+    oldest_date = datetime.strptime(queue["oldest_date"], DATE_FORMAT)
+    latest_date = datetime.strptime(queue["latest_date"], DATE_FORMAT)
+    pending = queue["pending_channels"]
+    deferred = []
+    surveyed = 0
+
+    crawled_channels = gv.iter_crawled_channels([(channel_id, oldest_date, oldest_date) for channel_id in pending],
+                                                latest_date, api_service, channel_cache=channel_cache,
+                                                max_workers=max_workers, service_factory=service_factory)
+
+    for channel_id, (_, channel_selection) in zip(list(pending), crawled_channels):
+        if channel_selection is None:
+            deferred.append(channel_id)
+            continue
+
+        if channel_id not in gv.channels_ignored:
+            queue["videos"][channel_id] = [[video_id, published, title]
+                                           for video_id, published, _, title in channel_selection["selection_list"]]
+
+        surveyed += 1
+
+        if surveyed % SAVE_EVERY == 0:
+            queue["pending_channels"] = deferred + pending[surveyed + len(deferred):]
+            save_queue(queue, json_path)
+
+    queue["pending_channels"] = deferred
+    save_queue(queue, json_path)
+
+    return surveyed
+
+
+def process_window(queue, window, api_service, playlist_ids, routing_rules, channel_categories, contents,
+                   duration_cache=None, delay=True, json_path=DEFAULT_PATH):
+    """Add the videos of a window to their playlists, in chronological order. Videos which can't be added (deleted,
+    private, ...) are dropped, a quota or API error stops the window before the next videos.
+
+    :param queue: the queue dictionary, saved once the window is routed and once it is processed.
+    :param window: a window of the queue.
+    :param api_service: API Google Token generated with Google.py call.
+    :param playlist_ids: dictionary associating playlist keys and IDs.
+    :param routing_rules: list of routing rules (see 'routing.py').
+    :param channel_categories: dictionary associating channel ID and its categories (see 'rt.channels_by_category').
+    :param contents: dictionary associating playlist key and the set of video IDs in the playlist, filled when needed.
+    :param duration_cache: duration cache dictionary (see 'duration_cache.py'), None to request every video.
+    :param delay: if True, input delay between videos' additions into playlist.
+    :param json_path: file path to the queue JSON file.
+    :return: small text for logs.
+    """
+    to_print = ""
+
+    if window["remaining"] is None:
+        duration_list = gv.api_get_videos_duration(window_videos(queue, window), api_service,
+                                                   duration_cache=duration_cache)
+        routed = rt.route_videos(duration_list, routing_rules, channel_categories)
+        window["remaining"] = {playlist_key: [video[0] for video in videos] for playlist_key, videos in routed.items()}
+        window["missing"] = len(duration_list.missing)
+        save_queue(queue, json_path)
+
+    for playlist_key, video_ids in window["remaining"].items():
+        if not video_ids:
+            continue
+
+        if playlist_key not in contents:
+            contents[playlist_key] = gv.api_get_playlist_video_ids(playlist_ids[playlist_key], api_service)
+
+        added = gv.api_add_to_playlist(playlist_ids[playlist_key], [(video_id,) for video_id in video_ids],
+                                       api_service, delay=delay, playlist_content=contents[playlist_key],
+                                       save_not_added=False)
+        not_added = set(added["not_added"])
+        window["remaining"][playlist_key] = [video_id for video_id in video_ids if video_id in not_added]
+        window["added"] += len(video_ids) - len(not_added) - len(added["failed"])
+        window["failed"] += len(added["failed"])
+        to_print += added["logs"]
+
+        if not_added:  # Deferred (quota, API errors), later videos wait: the playlist stays in chronological order.
+            break
+
+    if not any(window["remaining"].values()):
+        window["status"] = "done"
+
+    save_queue(queue, json_path)
+
+    return to_print
+
+
+def progress(queue, api_service):
+    """Summarize the progress of a backfill.
+
+    :param queue: the queue dictionary.
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :return: small text for logs.
+    """
+    if queue["windows"] is None:
+        return f"Channels surveyed: {len(queue['videos'])}, {len(queue['pending_channels'])} left " \
+               f"({sum(len(videos) for videos in queue['videos'].values())} videos so far)\n"
+
+    windows = queue["windows"]
+    done = [window for window in windows if window["status"] == "done"]
+    units_left = sum(window_cost(window) for window in windows if window["status"] != "done")
+    days_left = ceil(units_left / (qt.insert_budget(api_service) * BACKFILL_SHARE))
+
+    return f"Windows done: {len(done)} / {len(windows)}, videos added: {sum(window['added'] for window in windows)} " \
+           f"/ {sum(window['videos'] for window in windows)}\n" \
+           f"Left: about {units_left} units, {days_left} day(s) of quota\n"
+
+
+def run(path_channel_data_base_json, path_playlist_ids_json, oldest_date, latest_date, api_service,
+        selected_category=None, short_vid_index=None, long_vid_index=None, min_dur_long_vid=10, routing_rules=None,
+        delay=True, queue_path=DEFAULT_PATH, channel_cache_path=cc.DEFAULT_PATH, duration_cache_path=dc.DEFAULT_PATH,
+        logs_directory=LOGS_DIRECTORY, max_workers=1, service_factory=None):
+    """Go on with the backfill of a period, as far as today's quota allows it. Run it again on the next days until it
+    is complete.
+
+    :param path_channel_data_base_json: file path to channel data_base. (Corresponding with 'gv.execution' function)
+    :param path_playlist_ids_json: file path to playlists URL. (Corresponding with 'gv.execution' function)
+    :param oldest_date: Lower bound of time interval, for a new backfill.
+    :param latest_date: Upper bound of time interval, for a new backfill (usually the last regular execution date).
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :param selected_category: channel's category to explore, ignored if 'routing_rules' are given.
+    :param short_vid_index: key value corresponding to short videos playlist, ignored if 'routing_rules' are given.
+    :param long_vid_index: key value corresponding to long videos playlist, ignored if 'routing_rules' are given.
+    :param min_dur_long_vid: minimum duration to consider that a video is long, ignored if 'routing_rules' are given.
+    :param routing_rules: list of routing rules (see 'routing.py').
+    :param delay: if True, input delay between videos' additions into playlist.
+    :param queue_path: file path to the work queue. An unfinished backfill in it is continued, whatever the dates.
+    :param channel_cache_path: file path to the channel metadata cache, None to disable it.
+    :param duration_cache_path: file path to the duration cache (see 'duration_cache.py'), None to disable it.
+    :param logs_directory: Logs folder path of the backfill runs.
+    :param max_workers: maximum number of channels surveyed at the same time.
+    :param service_factory: function without argument returning a new API service, needed if 'max_workers' > 1.
+    :return: the queue dictionary.
+    """
+    today_date = datetime.today()
+
+    if routing_rules is None:
+        routing_rules = rt.default_rules(selected_category, short_vid_index, long_vid_index, min_dur_long_vid)
+
+    categories = rt.rules_categories(routing_rules)
+    channel_categories = rt.channels_by_category(
+        cd.load_channel_db(path_channel_data_base_json, index_path=None)["categories"], categories)
+    playlist_ids = gv.read_json(path_playlist_ids_json)
+
+    queue = load_queue(queue_path)
+
+    if queue is None or is_complete(queue):
+        queue = new_queue(oldest_date, latest_date, channel_categories)
+
+    log = f"Date of execution: {today_date:{DATE_FORMAT}}\n" \
+          f"Backfill from {queue['oldest_date']} to {queue['latest_date']}\n" \
+          f"Categories: {', '.join(categories)} ({len(channel_categories)} channels)\n\n"
+    print(log)
+
+    makedirs(logs_directory, exist_ok=True)
+    run_log = rl.RunLog(logs_directory, today_date, mode="backfill", oldest_date=queue["oldest_date"],
+                        latest_date=queue["latest_date"], categories=categories,
+                        playlists=rt.rules_playlists(routing_rules), channels=len(channel_categories))
+    run_log.write(log)
+
+    channel_cache = cc.load_channel_cache(channel_cache_path) if channel_cache_path else None
+    duration_cache = dc.load_duration_cache(duration_cache_path) if duration_cache_path else None
+
+    if queue["pending_channels"]:
+        start = perf_counter()
+        surveyed = survey(queue, api_service, channel_cache, max_workers, service_factory, queue_path)
+        to_print = f"Survey: {surveyed} channels in {perf_counter() - start:.1f} s, " \
+                   f"{len(queue['pending_channels'])} deferred\n"
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+        run_log.event("survey", channels=surveyed, deferred=len(queue["pending_channels"]),
+                      seconds=round(perf_counter() - start, 3), quota_used=gv.quota_used(api_service))
+
+        if channel_cache is not None:
+            cc.save_channel_cache(channel_cache, channel_cache_path)
+
+    if not queue["pending_channels"] and queue["windows"] is None:
+        queue["windows"] = plan_windows(queue["videos"], qt.insert_budget(api_service) * WINDOW_SHARE)
+        save_queue(queue, queue_path)
+        windows = [(window['oldest'], window['latest'], window['videos']) for window in queue['windows']]
+        to_print = f"Windows planned: {len(windows)}\n{pformat(windows)}\n"
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+
+    contents = {}
+    reserve = qt.insert_budget(api_service) * (1 - BACKFILL_SHARE)  # Kept for regular executions.
+
+    for count, window in enumerate(queue["windows"] or []):
+        if window["status"] == "done":
+            continue
+
+        if window_cost(window) > qt.insert_remaining(api_service) - reserve:
+            to_print = f"Quota left today too low for the next window ({window_cost(window)} units): run the " \
+                       f"backfill again tomorrow.\n"
+            print(to_print)
+            run_log.write(f"{to_print}\n")
+            break
+
+        start = perf_counter()
+        used_before = gv.quota_used(api_service) or 0
+        added_before = window["added"]
+
+        try:
+            run_log.write(process_window(queue, window, api_service, playlist_ids, routing_rules, channel_categories,
+                                         contents, duration_cache, delay, queue_path))
+
+        except tp.UNAVAILABLE_ERRORS as error:  # Durations or playlist contents unavailable: the window waits.
+            to_print = f"Daily quota budget reached (or API unavailable), window deferred: {error}\n"
+            print(to_print)
+            run_log.write(f"{to_print}\n")
+            break
+
+        seconds = perf_counter() - start
+        added = window["added"] - added_before
+        units = (gv.quota_used(api_service) or 0) - used_before
+        window["units"] += units
+        window["seconds"] = round(window["seconds"] + seconds, 3)
+        save_queue(queue, queue_path)
+
+        to_print = f"Window {count + 1} / {len(queue['windows'])} ({window['oldest']} - {window['latest']}): " \
+                   f"{added} videos added in {seconds:.1f} s ({added / seconds if seconds else 0.0:.2f} videos/s), " \
+                   f"{units} units, {window['missing']} missing, {window['failed']} failed, " \
+                   f"status {window['status']}\n" \
+                   f"{progress(queue, api_service)}"
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+        run_log.event("window", index=count, oldest=window["oldest"], latest=window["latest"],
+                      videos=window["videos"], added=added, missing=window["missing"], failed=window["failed"],
+                      units=units,
+                      seconds=round(seconds, 3), status=window["status"], quota_used=gv.quota_used(api_service))
+
+        if window["status"] != "done":  # Next windows wait for this one.
+            break
+
+    if duration_cache is not None:
+        dc.save_duration_cache(duration_cache, duration_cache_path)
+
+    usage = qt.usage_of(api_service)
+
+    if usage is not None:
+        usage.save()
+
+    response_cache = rc.cache_of(api_service)
+
+    if response_cache is not None:
+        response_cache.save()
+
+    to_print = "Backfill complete.\n" if is_complete(queue) else f"Backfill progress:\n{progress(queue, api_service)}"
+    print(to_print)
+    run_log.write(f"{to_print}\n")
+    run_log.event("backfill", complete=is_complete(queue), quota_used=gv.quota_used(api_service))
+    run_log.close()
+
+    return queue
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import metrics as mt
+import transport as tp
+
+from googleapiclient.errors import HttpError
+from time import sleep
+
+"""- SCRIPT INFORMATION -
+
+@file_name: batching.py
+@author: Dylan "dyl-m" Monfret
+
+Execution of many API requests with as few HTTP round trips as possible, using Google batch requests
+('new_batch_http_request'), and with a pacing adapted to rate-limit responses instead of fixed delays.
+"""
+
+" - LOCAL CLASSES - "
+
+
+class AdaptivePacer:
+    """Delay between two API calls, doubled when the API answers with a rate-limit error and halved otherwise."""
+
+    def __init__(self, initial_delay=0.0, min_delay=0.0, max_delay=64.0):
+        self.delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.total_wait = 0.0
+
+    def wait(self):
+        if self.delay > 0:
+            self.total_wait += self.delay
+
+            with mt.timed("wait", "pacer"):
+                sleep(self.delay)
+
+    def success(self):
+        self.delay = self.delay / 2 if self.delay / 2 > max(self.min_delay, 0.05) else self.min_delay
+
+    def rate_limited(self):
+        self.delay = min(self.max_delay, max(1.0, self.delay * 2))
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def execute_batch(api_service, requests, callback, batch_size=50, pacer=None, max_retries=5):
+    """Execute requests by batches, each batch being one HTTP round trip. Rate-limited requests are sent again in a
+    later batch (up to 'max_retries' times), after a longer pause. Errors are classified by 'tp.classify_error'.
+
+    With a batch size of 1, requests are executed one by one without the batch endpoint. The API may execute requests
+    of a same batch in any order.
+
+    :param api_service: API Google Token generated with Google.py call.
+    :param requests: list of (request ID, request) tuples, requests being built but not executed.
+    :param callback: function called once per request with (request ID, response, exception), exception being None
+                     on success and response None on failure.
+    :param batch_size: maximum number of requests per batch (50 at most is advised by Google).
+    :param pacer: an 'AdaptivePacer' object, to pause between batches (no pause by default).
+    :param max_retries: maximum number of retries for a rate-limited request.
+    """
+    pacer = pacer or AdaptivePacer()
+    attempts = {request_id: 0 for request_id, _ in requests}
+    pending = list(requests)
+
+    while pending:
+        chunk, pending = pending[:batch_size], pending[batch_size:]
+        outcomes = {}
+
+        pacer.wait()
+
+        if batch_size == 1:
+            request_id, request = chunk[0]
+
+            try:
+                outcomes[request_id] = (request.execute(), None)
+
+            except (HttpError, tp.RetriesExhaustedError, *tp.NETWORK_ERRORS) as exception:
+                outcomes[request_id] = (None, exception)
+
+        else:
+            batch = api_service.new_batch_http_request()
+
+            for idx, (request_id, request) in enumerate(chunk):
+                # Batch request IDs must be unique strings, the answer is matched back with the chunk index.
+                batch.add(request, request_id=str(idx),
+                          callback=lambda rid, response, exception: outcomes.update(
+                              {chunk[int(rid)][0]: (response, exception)}))
+
+            try:
+                batch.execute()
+
+            except (HttpError, tp.RetriesExhaustedError, *tp.NETWORK_ERRORS) as exception:  # The whole batch failed.
+                outcomes = {request_id: (None, exception) for request_id, _ in chunk}
+
+        retry = []
+
+        for request_id, request in chunk:
+            response, exception = outcomes.get(request_id, (None, ConnectionResetError("No answer in batch.")))
+
+            if exception is not None and tp.is_retryable(exception) and attempts[request_id] < max_retries:
+                attempts[request_id] += 1
+                retry.append((request_id, request))
+
+            else:
+                callback(request_id, response, exception)
+
+        if retry:
+            pacer.rate_limited()
+            pending = retry + pending
+
+        else:
+            pacer.success()
@@ -0,0 +1,894 @@
+# -*- coding: utf-8 -*-
+
+import activity as ac
+import backfill as bf
+import channel_db as cd
+import contextlib
+import fake_youtube as fy
+import get_videos as gv
+import glob
+import io
+import json
+import quota as qt
+import records as rs
+import response_cache as rc
+import routing as rt
+import run_log as rl
+import scheduler as sd
+import service_pool as sp
+import subprocess
+import sys
+import tracemalloc
+import transport as tp
+
+from datetime import datetime, timedelta, timezone
+from fake_youtube import FakeYouTube, synthetic_upload_dates
+from os import makedirs, utime
+from os.path import getsize, isfile
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+"""- SCRIPT INFORMATION -
+
+@file_name: benchmark.py
+@author: Dylan "dyl-m" Monfret
+
+Benchmarks of 'get_videos.py' functions and of whole executions against the offline fake service ('fake_youtube.py').
+No Google credentials are needed: run 'python benchmark.py' from the 'code' directory.
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+PLAYLIST_IDS = {"music": "PLbenchmarkShort", "mix": "PLbenchmarkLong"}  # Playlists of 'run_execution'.
+
+" - LOCAL FUNCTIONS - "
+
+
+def build_channels(service, nb_channels, nb_videos, every, newest=None):
+    """Fill a fake service with channels having a regular upload history.
+
+    :param service: a 'FakeYouTube' instance.
+    :param nb_channels: number of channels to create.
+    :param nb_videos: number of videos uploaded by each channel.
+    :param every: datetime.timedelta between two uploads of a channel.
+    :param newest: most recent upload date (now by default).
+    :return: list of created channel IDs.
+    """
+    channel_ids = [f"UCfake{idx:018d}" for idx in range(nb_channels)]
+
+    for channel_id in channel_ids:
+        service.add_channel(channel_id, f"Channel {channel_id[-4:]}", synthetic_upload_dates(nb_videos, every, newest))
+
+    return channel_ids
+
+
+def bench_windowed_paging(nb_channels=138, nb_videos=1000, every=timedelta(days=2)):
+    """Compare the number of 'playlistItems.list' requests made with full history, with a year of history (previous
+    activity count) and with the selection period only (activity probe, see 'activity.py').
+
+    :param nb_channels: number of channels to crawl.
+    :param nb_videos: number of videos uploaded by each channel.
+    :param every: datetime.timedelta between two uploads of a channel.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=3)
+    to_print = f"Windowed paging ({nb_channels} channels, {nb_videos} videos each, one upload every " \
+               f"{every.days} days)\n"
+    modes = (("Full history:", None), ("A year of history:", min(oldest_date, latest_date - timedelta(days=366))),
+             ("Activity probe:", oldest_date))
+
+    for label, lower_bound in modes:
+        service = FakeYouTube()
+        channel_ids = build_channels(service, nb_channels, nb_videos, every)
+        selected = 0
+        active = 0
+
+        for channel_id in channel_ids:
+            videos = gv.api_get_channel_videos(channel_id, service, lower_bound=lower_bound)
+            selected += len(gv.video_selection(videos, latest_date, oldest_date, channel_id, service)["selection_list"])
+            active += ac.is_active(ac.newest_upload(videos))
+
+        to_print += f"    {label:<20}{service.calls['playlistItems.list']:5d} page requests, {selected} videos " \
+                    f"selected, {active} active channels\n"
+
+    return to_print
+
+
+def bench_concurrent_crawl(nb_channels=138, nb_videos=200, latency=0.05, workers=(1, 4, 8, 16)):
+    """Compare crawl wall time of 'get_all_videos' with different numbers of workers, each request being delayed.
+
+    :param nb_channels: number of channels to crawl.
+    :param nb_videos: number of videos uploaded by each channel.
+    :param latency: seconds slept by each fake request.
+    :param workers: numbers of workers to try.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=3)
+    to_print = f"Concurrent crawl ({nb_channels} channels, {nb_videos} videos each, {latency * 1000:.0f} ms latency)\n"
+    reference_log = None
+
+    for max_workers in workers:
+        service = FakeYouTube(latency=latency)
+        channel_ids = build_channels(service, nb_channels, nb_videos, timedelta(days=2))
+        start = perf_counter()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = gv.get_all_videos(channel_ids, latest_date, oldest_date, service, max_workers=max_workers,
+                                       service_factory=lambda: service)
+
+        duration = perf_counter() - start
+        reference_log = reference_log or result["log_str"]
+        same_log = "same log" if result["log_str"] == reference_log else "DIFFERENT LOG"
+        to_print += f"    {max_workers:2d} worker(s): {duration:6.2f} s, {sum(service.calls.values())} requests, " \
+                    f"{same_log}\n"
+
+    return to_print
+
+
+def bench_batching(nb_videos=2000, nb_inserts=40, latency=0.05):
+    """Compare wall time of duration lookups and playlist insertions, request by request or by HTTP batches.
+
+    :param nb_videos: number of videos whose duration is requested.
+    :param nb_inserts: number of videos added to a playlist.
+    :param latency: seconds slept by each fake round trip (single request or batch).
+    :return: small text with the results.
+    """
+    to_print = f"Batching ({nb_videos} durations, {nb_inserts} insertions, {latency * 1000:.0f} ms latency)\n"
+
+    for batch_size in (1, 50):
+        service = FakeYouTube(latency=latency)
+        build_channels(service, 1, nb_videos, timedelta(hours=6))
+        start = perf_counter()
+
+        gv.api_get_videos_duration([(video_id,) for video_id in service.video_data], service, batch_size=batch_size)
+        to_print += f"    Durations, batch size {batch_size:2d}: {perf_counter() - start:6.2f} s\n"
+
+    linear_sleep = sum(1 + (cpt - 1) / 10 for cpt in range(nb_inserts))
+    to_print += f"    Insertions, previous linear delay: {linear_sleep:6.2f} s of sleep only\n"
+
+    for batch_size in (1, 10):
+        service = FakeYouTube(latency=latency)
+        build_channels(service, 1, nb_inserts, timedelta(hours=6))
+        start = perf_counter()
+
+        with contextlib.redirect_stdout(io.StringIO()), TemporaryDirectory() as directory:
+            gv.api_add_to_playlist('PLbenchmark', [(video_id,) for video_id in service.video_data], service,
+                                   batch_size=batch_size, not_added_directory=directory)
+
+        to_print += f"    Insertions, batch size {batch_size:2d}: {perf_counter() - start:6.2f} s\n"
+
+    return to_print
+
+
+def bench_columnar_selection(nb_videos=100000):
+    """Compare video selection on a long upload history, video by video and in bulk (for the duration split, see
+    'bench_video_records').
+
+    :param nb_videos: number of videos in the channel history.
+    :return: small text with the results.
+    """
+    service = FakeYouTube()
+    channel_id = build_channels(service, 1, nb_videos, timedelta(hours=2))[0]
+    api_videos_list = service.playlist_data[service.channel_data[channel_id]["uploads"]]
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=30)
+    a_year_ago = latest_date - timedelta(days=365)
+    to_print = f"Selection on a {nb_videos} videos history\n"
+
+    start = perf_counter()
+    previous_count = 0
+
+    for video in api_videos_list:  # Previous per video selection, 'video_in_period' called twice.
+        upload_date = datetime.strptime(video["contentDetails"]["videoPublishedAt"], "%Y-%m-%dT%H:%M:%S%z")
+        gv.video_in_period(latest_date, oldest_date, upload_date)
+        previous_count += gv.video_in_period(latest_date, a_year_ago, upload_date)
+
+    to_print += f"    {'Per video, previous:':<26}{perf_counter() - start:6.3f} s\n"
+
+    for columnar in (False, True):
+        start = perf_counter()
+        selection = gv.video_selection(api_videos_list, latest_date, oldest_date, channel_id, service,
+                                       columnar=columnar)
+        label = 'Columnar:' if columnar else 'Per video:'
+        to_print += f"    {label:<26}{perf_counter() - start:6.3f} s " \
+                    f"({len(selection['selection_list'])} selected, {selection['a_year_ago_count']} in a year)\n"
+
+    return to_print
+
+
+def bench_video_records(nb_videos=1000000, minute_threshold=10):
+    """Compare the previous duration list (one (video, datetime.timedelta, datetime.datetime) tuple per video) with
+    the array-backed store of 'records.py': memory allocated by Python, sort by upload date and duration split.
+
+    :param nb_videos: number of video records.
+    :param minute_threshold: minimum number of minutes to consider a video as a long video.
+    :return: small text with the results.
+    """
+    start_date = datetime(2010, 1, 1, tzinfo=timezone.utc).timestamp()
+    nb_channels = max(1, nb_videos // 500)
+    threshold = timedelta(minutes=minute_threshold)
+    to_print = f"Video records ({nb_videos} videos, {nb_channels} channels)\n"
+
+    def video_dates():  # Uploads shuffled in time, as they are when channels are merged.
+        for idx in range(nb_videos):
+            yield idx, int(start_date) + (idx * 7919 % nb_videos) * 600
+
+    tracemalloc.start()
+    duration_list = [((f"video{idx:07d}", rs.iso_date(published), f"UC{idx % nb_channels:022d}", f"Video {idx}"),
+                      timedelta(seconds=idx % 1800), datetime.fromtimestamp(published, timezone.utc))
+                     for idx, published in video_dates()]
+    tuples_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    records = rs.VideoRecords()
+
+    for idx, published in video_dates():
+        records.append(f"video{idx:07d}", published, f"UC{idx % nb_channels:022d}", f"Video {idx}", idx % 1800)
+
+    records_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    to_print += f"    {'Memory, tuples:':<26}{tuples_memory / 2 ** 20:6.1f} MiB\n" \
+                f"    {'Memory, records:':<26}{records_memory / 2 ** 20:6.1f} MiB\n"
+
+    start = perf_counter()
+    duration_list = sorted(duration_list, key=lambda tup: tup[2])
+    to_print += f"    {'Sort by date, tuples:':<26}{perf_counter() - start:6.3f} s\n"
+
+    start = perf_counter()
+    records.sort_by_date()
+    to_print += f"    {'Sort by date, records:':<26}{perf_counter() - start:6.3f} s\n"
+
+    start = perf_counter()
+    short_videos, long_videos = [], []
+
+    for video in duration_list:  # Previous 'get_videos.duration_filter' loop.
+        (long_videos if video[1] > threshold else short_videos).append(video[0])
+
+    to_print += f"    {'Duration split, tuples:':<26}{perf_counter() - start:6.3f} s\n"
+
+    start = perf_counter()
+    records.split_by_duration(minute_threshold * 60)
+    to_print += f"    {'Duration split, records:':<26}{perf_counter() - start:6.3f} s " \
+                f"({len(long_videos)} long videos)\n"
+
+    return to_print
+
+
+def bench_duration_lookups(nb_channels=138, nb_videos=60, deleted_every=25, windows=3, latency=0.005):
+    """Get durations of videos selected by overlapping periods (re-runs, sliding windows), some of them being deleted
+    since they were listed: 'videos.list' requests with and without the duration cache (see 'duration_cache.py'), and
+    videos given the duration of another one by the previous positional join.
+
+    :param nb_channels: number of channels.
+    :param nb_videos: number of videos uploaded by each channel (one every day).
+    :param deleted_every: one video out of 'deleted_every' is deleted (left out of 'videos.list' responses).
+    :param windows: number of 30 days periods, each one starting 10 days after the previous one.
+    :param latency: seconds slept by each fake round trip.
+    :return: small text with the results.
+    """
+    to_print = f"Duration lookups ({nb_channels} channels, {windows} overlapping periods of 30 days, one video out " \
+               f"of {deleted_every} deleted)\n"
+    newest = datetime.now(timezone.utc)
+    periods = [(newest - timedelta(days=30 + 10 * idx), newest - timedelta(days=10 * idx)) for idx in range(windows)]
+
+    for use_cache in (False, True):
+        fake = FakeYouTube(latency=latency)
+        build_channels(fake, nb_channels, nb_videos, timedelta(days=1), newest=newest)
+        videos = [(video_id, video["snippet"]["publishedAt"], video["snippet"]["channelId"], video["snippet"]["title"])
+                  for video_id, video in fake.video_data.items()]
+        durations = {}
+
+        for idx, video_id in enumerate(list(fake.video_data)):
+            fake.video_data[video_id]["contentDetails"]["duration"] = f'PT{idx % 30 + 1}M'
+            durations[video_id] = (idx % 30 + 1) * 60
+
+            if idx % deleted_every == 0:
+                del fake.video_data[video_id]
+
+        if not use_cache:  # Previous join: n-th duration of the responses given to the n-th video requested.
+            selected = [video[0] for video in videos if periods[0][0] <= datetime.fromisoformat(
+                video[1].replace('Z', '+00:00')) <= periods[0][1]]
+            items = [item for chunk in gv.divide_chunks(selected, 50)
+                     for item in fake.videos().list(id=",".join(chunk), part=['contentDetails']).execute()["items"]]
+            shifted = sum(1 for video_id, item in zip(selected, items) if item["id"] != video_id)
+            to_print += f"    {'Positional join:':<26}{shifted} of {len(selected)} videos given another duration\n"
+            fake.calls.clear()
+
+        duration_cache = {} if use_cache else None
+        wrong = missing = 0
+        start = perf_counter()
+
+        for oldest, latest in periods:
+            selected = [video for video in videos
+                        if oldest <= datetime.fromisoformat(video[1].replace('Z', '+00:00')) <= latest]
+            records = gv.api_get_videos_duration(selected, fake, duration_cache=duration_cache)
+            wrong += sum(1 for video, duration, _ in records if duration.total_seconds() != durations[video[0]])
+            missing += len(records.missing)
+
+        label = 'Keyed join, cached:' if use_cache else 'Keyed join:'
+        to_print += f"    {label:<26}{perf_counter() - start:6.2f} s, {fake.calls['videos.list']} 'videos.list' " \
+                    f"requests, {wrong} wrong durations, {missing} missing reported\n"
+
+    return to_print
+
+
+def bench_channel_db(nb_channels=50000, nb_categories=8, nb_changes=100, repeat=5):
+    """Compare loadings of a large PocketTube database: parsing and indexing it on each execution (previous version),
+    and 'cd.load_channel_db' with its index, for an unchanged, touched (same content) and modified database.
+
+    :param nb_channels: number of subscriptions, a quarter of them in two categories.
+    :param nb_categories: number of categories.
+    :param nb_changes: number of channels added, and of channels removed, by the modification.
+    :param repeat: number of loadings per variant (median is reported).
+    :return: small text with the results.
+    """
+    channel_ids = [f"UCfake{idx:018d}" for idx in range(nb_channels)]
+    database = {f"CATEGORY_{idx}": [] for idx in range(nb_categories)}
+
+    for idx, channel_id in enumerate(channel_ids):
+        database[f"CATEGORY_{idx % nb_categories}"].append(channel_id)
+
+        if idx % 4 == 0:
+            database[f"CATEGORY_{(idx + 1) % nb_categories}"].append(channel_id)
+
+    database.update({"ysc_collection": {channel_id: {"hidden": False} for channel_id in channel_ids[::10]},
+                     "ysc_meta": {"version": 1}, "ysc_popup": {}, "ysc_settings": {}})
+    categories = [f"CATEGORY_{idx}" for idx in range(nb_categories)]
+
+    with TemporaryDirectory() as directory:
+        db_path, index_path = f'{directory}/db.json', f'{directory}/channel_db_index.json'
+
+        with open(db_path, 'w', encoding='utf8') as json_file:
+            json.dump(database, json_file)
+
+        def load():
+            return rt.channels_by_category(cd.load_channel_db(db_path, index_path)["categories"], categories)
+
+        cd.save_channel_db(cd.load_channel_db(db_path, index_path), index_path)
+        variants = {"Previous, parsed:": lambda: rt.channels_by_category(gv.read_json(db_path), categories),
+                    "Index, unchanged:": load,
+                    "Index, touched:": lambda: utime(db_path) or load()}
+        to_print = f"PocketTube database of {nb_channels} channels " \
+                   f"({getsize(db_path) / 1024:.0f} KiB, index {getsize(index_path) / 1024:.0f} KiB, median)\n"
+
+        for label, loading in variants.items():
+            durations = []
+
+            for _ in range(repeat):
+                start = perf_counter()
+                loading()
+                durations.append(perf_counter() - start)
+
+            to_print += f"    {label:<26}{median(durations):6.3f} s\n"
+
+        for category in categories:  # Unsubscribe from the first channels of each category, subscribe to new ones.
+            database[category] = database[category][nb_changes // nb_categories:]
+            database[category] += [f"UCnew{category[-1]}{idx:017d}" for idx in range(nb_changes // nb_categories)]
+
+        with open(db_path, 'w', encoding='utf8') as json_file:
+            json.dump(database, json_file)
+
+        start = perf_counter()
+        changes = cd.load_channel_db(db_path, index_path)
+        to_print += f"    {'Index, modified:':<26}{perf_counter() - start:6.3f} s " \
+                    f"({len(changes['added'])} added, {len(changes['removed'])} removed)\n"
+
+    return to_print
+
+
+def bench_service_startup(repeat=5):
+    """Compare cold starts (new Python process) until the YouTube service object is usable. An API key replaces OAuth
+    credentials, a token refresh being a network round trip not measurable offline: the previous version did it at
+    'exe.py' import, even for dry runs.
+
+    :param repeat: number of processes started per variant (median is reported).
+    :return: small text with the results.
+    """
+    with TemporaryDirectory() as directory:
+        variants = {
+            "Previous, 'build':": "from googleapiclient.discovery import build\n"
+                                  "build('youtube', 'v3', developerKey='benchmark')",
+            "Cached document:": f"import Google\n"
+                                f"from googleapiclient.discovery import build_from_document\n"
+                                f"build_from_document(Google.get_discovery_document('YouTube', 'v3', {directory!r}), "
+                                f"developerKey='benchmark')",
+            "Lazy, until first use:": "import Google\n"
+                                      "Google.LazyService('client_secret.json', 'YouTube', 'v3', [])"}
+        to_print = "Service cold start (new process, median)\n"
+        subprocess.run([sys.executable, '-c', variants["Cached document:"]], check=True)  # Store the document.
+
+        for label, code in variants.items():
+            durations = []
+
+            for _ in range(repeat):
+                start = perf_counter()
+                subprocess.run([sys.executable, '-c', code], check=True)
+                durations.append(perf_counter() - start)
+
+            to_print += f"    {label:<26}{median(durations):6.3f} s\n"
+
+    return to_print
+
+
+def run_execution(service, channel_ids, latest_date, oldest_date, directory, max_workers=8, streaming=False,
+                  concurrent_durations=True):
+    """Run 'get_videos.execution' quietly on channels of a fake service, every file (database, cache, index, journal,
+    logs, videos not added) being written in a directory.
+
+    :param service: a 'FakeYouTube' instance, possibly wrapped (quota, retries).
+    :param channel_ids: list of channel IDs (the "MUSIQUE" category).
+    :param latest_date: Upper bound of time interval.
+    :param oldest_date: Lower bound of time interval.
+    :param directory: a temporary directory.
+    :param max_workers: maximum number of channels crawled at the same time.
+    :param streaming: if True, add videos during the crawl (see 'pipeline.py').
+    :param concurrent_durations: if False, look durations up after the crawl (no service factory, 'max_workers' must
+                                 be 1).
+    :return: the execution duration in seconds.
+    """
+    if not isfile(f'{directory}/db.json'):
+        makedirs(f'{directory}/Logs')
+
+        with open(f'{directory}/db.json', 'w', encoding='utf8') as json_file:
+            json.dump({"MUSIQUE": channel_ids}, json_file)
+
+        with open(f'{directory}/playlists.json', 'w', encoding='utf8') as json_file:
+            json.dump(PLAYLIST_IDS, json_file)
+
+    start = perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        gv.execution(f'{directory}/db.json', f'{directory}/playlists.json', latest_date, oldest_date, service,
+                     "MUSIQUE", "music", "mix", delay=False, max_workers=max_workers,
+                     service_factory=(lambda: service) if concurrent_durations else None,
+                     channel_cache_path=f'{directory}/channel_cache.json',
+                     video_index_path=f'{directory}/video_index.json', checkpoint_path=f'{directory}/checkpoint.jsonl',
+                     logs_directory=f'{directory}/Logs', streaming=streaming,
+                     activity_path=f'{directory}/channel_activity.json',
+                     inactive_report_path=f'{directory}/inactive_channels.json',
+                     duration_cache_path=f'{directory}/duration_cache.json',
+                     channel_db_index_path=f'{directory}/channel_db_index.json', not_added_directory=directory)
+
+    return perf_counter() - start
+
+
+def in_playlists(fake):
+    """Count videos added to the playlists of 'run_execution'."""
+    return sum(len(fake.playlist_data.get(playlist_id, [])) for playlist_id in PLAYLIST_IDS.values())
+
+
+def bench_execution(sizes=(10, 138, 2000), nb_videos=240, latency=0.01, max_workers=8):
+    """Run whole executions ('get_videos.execution'), a first one without channel cache nor video index, then a second
+    one just after, as a daily run would do.
+
+    :param sizes: numbers of channels of each scenario.
+    :param nb_videos: number of videos uploaded by each channel (one every 3 days, a third of them being long).
+    :param latency: seconds slept by each fake round trip.
+    :param max_workers: maximum number of channels crawled at the same time.
+    :return: small text with the results.
+    """
+    to_print = f"Whole execution ({nb_videos} videos per channel, {latency * 1000:.0f} ms latency, " \
+               f"{max_workers} workers)\n"
+
+    for nb_channels in sizes:
+        fake = FakeYouTube(latency=latency)
+        channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=3))
+
+        for idx, video in enumerate(fake.video_data.values()):
+            video["contentDetails"]["duration"] = 'PT14M' if idx % 3 == 0 else 'PT4M'
+
+        service = qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=10 ** 9))
+        latest_date = datetime.today()
+
+        with TemporaryDirectory() as directory:
+            for run, oldest_date in (("first run", latest_date - timedelta(days=2)), ("next run", latest_date)):
+                fake.calls.clear()
+                used = service.usage.used
+                duration = run_execution(service, channel_ids, latest_date, oldest_date, directory, max_workers)
+                label = f"{nb_channels} channels, {run}:"
+                to_print += f"    {label:<26}{duration:6.2f} s, {sum(fake.calls.values())} requests, " \
+                            f"{service.usage.used - used} units, {in_playlists(fake)} videos in playlists\n"
+
+    return to_print
+
+
+def bench_resilience(nb_channels=138, nb_videos=60, reset_rate=0.05, quota_limit=100, latency=0.005):
+    """Run whole executions against a failing API, with and without the retrying transport ('transport.py'): random
+    connection resets, then a quota exhausted during the crawl.
+
+    :param nb_channels: number of channels to crawl.
+    :param nb_videos: number of videos uploaded by each channel (one every 3 days).
+    :param reset_rate: probability for a request to end with a 'ConnectionResetError'.
+    :param quota_limit: units spent before the fake API answers with 'quotaExceeded' errors.
+    :param latency: seconds slept by each fake round trip.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=7)
+    to_print = f"Failing API ({nb_channels} channels, {reset_rate:.0%} connection resets, or quota exhausted after " \
+               f"{quota_limit} units)\n"
+
+    for label, failures in (("resets", {"reset_rate": reset_rate, "seed": 1}), ("quota", {"quota_limit": quota_limit})):
+        for retrying in (False, True):
+            fake = FakeYouTube(latency=latency, **failures)
+            channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=3))
+            service = qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=10 ** 9))
+
+            if retrying:
+                service = tp.RetryingService(service, tp.Transport(base_delay=0.01, seed=1))
+
+            with TemporaryDirectory() as directory:
+                try:
+                    duration = run_execution(service, channel_ids, latest_date, oldest_date, directory)
+                    outcome = f"{in_playlists(fake)} videos in playlists"
+
+                except Exception as error:  # pylint: disable=broad-except - Previous behaviour, reported.
+                    duration, outcome = 0.0, f"crashed ({type(error).__name__})"
+
+            name = f"{label}, {'transport' if retrying else 'no transport'}:"
+            to_print += f"    {name:<26}{duration:6.2f} s, {sum(fake.calls.values())} requests " \
+                        f"({sum(fake.failed.values())} failed), {outcome}\n"
+
+    return to_print
+
+
+def bench_quota_sharding(nb_channels=3000, nb_accounts=3, budget=2000, latency=0.0):
+    """Run whole executions with a small daily budget per account, with one account, then with a pool of accounts
+    (see 'service_pool.py'): list requests are spread over the accounts, insertions stay on the playlists owner.
+
+    :param nb_channels: number of channels to crawl (one upload every 100 days each, a new one for 1% of them).
+    :param nb_accounts: number of accounts of the pool.
+    :param budget: daily quota budget of each account.
+    :param latency: seconds slept by each fake round trip.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=1)
+    to_print = f"Quota sharding ({nb_channels} channels, {budget} units per account)\n"
+
+    for accounts in (1, nb_accounts):
+        fake = FakeYouTube(latency=latency)
+        channel_ids = [f"UCfake{idx:018d}" for idx in range(nb_channels)]
+
+        for idx, channel_id in enumerate(channel_ids):
+            newest = datetime.now(timezone.utc) - timedelta(days=idx % 100, hours=1)
+            fake.add_channel(channel_id, f"Channel {idx}", synthetic_upload_dates(5, timedelta(days=100), newest))
+
+        members = {f"account{idx}": qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=budget)) for idx in range(accounts)}
+        service = members["account0"] if accounts == 1 else sp.ServicePool(members, "account0", PLAYLIST_IDS.values())
+        service = tp.RetryingService(service, tp.Transport(base_delay=0.01))
+
+        with TemporaryDirectory() as directory:
+            duration = run_execution(service, channel_ids, latest_date, oldest_date, directory)
+            crawl = next(rl.read_events(glob.glob(f'{directory}/Logs/*.jsonl')[0], "crawl"))
+
+        used = ", ".join(f"{member.usage.used}" for member in members.values())
+        label = f"{accounts} account{'s' if accounts > 1 else ''}:"
+        to_print += f"    {label:<26}{duration:6.2f} s, {nb_channels - crawl['deferred']} channels crawled, " \
+                    f"{in_playlists(fake)} videos in playlists, units used: {used}\n"
+
+    return to_print
+
+
+def bench_backfill(nb_channels=40, nb_videos=30, nb_heavy=2, nb_heavy_videos=200, budget=10000):
+    """Compare a regular execution over a year with a backfill of the same year, run day after day with a new daily
+    quota each time: channels uploading every 12 days, and heavy ones uploading every day.
+
+    :param nb_channels: number of regular channels.
+    :param nb_videos: number of videos of each regular channel.
+    :param nb_heavy: number of heavy channels.
+    :param nb_heavy_videos: number of videos of each heavy channel.
+    :param budget: daily quota budget.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=365)
+    fake = FakeYouTube()
+    channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=12))
+    heavy_ids = [f"UCheavy{nb_channels + idx:017d}" for idx in range(nb_heavy)]  # Video IDs end with channel IDs.
+
+    for channel_id in heavy_ids:
+        fake.add_channel(channel_id, f"Heavy {channel_id[-4:]}", synthetic_upload_dates(nb_heavy_videos,
+                                                                                       timedelta(days=1)))
+
+    nb_total = nb_channels * nb_videos + nb_heavy * nb_heavy_videos
+    to_print = f"Backfill of a year ({nb_total} videos, {nb_heavy} heavy channels, {budget} units a day)\n"
+
+    def in_order():
+        published = {video_id: video["snippet"]["publishedAt"] for video_id, video in fake.video_data.items()}
+        return all([published[item["snippet"]["resourceId"]["videoId"]] for item in fake.playlist_data.get(playlist_id,
+                                                                                                          [])]
+                   == sorted(published[item["snippet"]["resourceId"]["videoId"]]
+                             for item in fake.playlist_data.get(playlist_id, []))
+                   for playlist_id in PLAYLIST_IDS.values())
+
+    with TemporaryDirectory() as directory:  # Previous version: one execution over the whole year.
+        service = qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=budget))
+        run_execution(service, channel_ids + heavy_ids, latest_date, oldest_date, directory, max_workers=1)
+        to_print += f"    {'One execution:':<26}{in_playlists(fake)} videos in playlists, " \
+                    f"{qt.usage_of(service).used} units\n"
+
+    fake.playlist_data.update({playlist_id: [] for playlist_id in PLAYLIST_IDS.values()})
+
+    with TemporaryDirectory() as directory:
+        makedirs(f'{directory}/Logs')
+
+        with open(f'{directory}/db.json', 'w', encoding='utf8') as json_file:
+            json.dump({"MUSIQUE": channel_ids + heavy_ids}, json_file)
+
+        with open(f'{directory}/playlists.json', 'w', encoding='utf8') as json_file:
+            json.dump(PLAYLIST_IDS, json_file)
+
+        days, queue, start = 0, None, perf_counter()
+
+        while queue is None or not bf.is_complete(queue):  # One run a day, with a new daily quota.
+            days += 1
+            service = qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=budget))
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                queue = bf.run(f'{directory}/db.json', f'{directory}/playlists.json', oldest_date, latest_date,
+                               service, "MUSIQUE", "music", "mix", delay=False, queue_path=f'{directory}/backfill.json',
+                               channel_cache_path=f'{directory}/channel_cache.json',
+                               duration_cache_path=f'{directory}/duration_cache.json',
+                               logs_directory=f'{directory}/Logs')
+
+        windows = queue["windows"]
+        to_print += f"    {'Backfill:':<26}{in_playlists(fake)} videos in playlists, {days} days, " \
+                    f"{len(windows)} windows ({median(window['videos'] for window in windows):.0f} videos, " \
+                    f"{median(window['added'] / window['seconds'] for window in windows):.0f} videos/s), " \
+                    f"chronological: {in_order()}, {perf_counter() - start:.1f} s\n"
+
+    return to_print
+
+
+def bench_scheduler(nb_channels=200, hours=24, sweep_every=timedelta(hours=6), units_per_hour=1000):
+    """Simulate a day of daemon mode (see 'scheduler.py') on a simulated clock: prolific channels (10%, one upload every
+    2 hours), regular ones (40%, every 3 days) and dormant ones (50%, last upload 2 years ago). Channels are checked
+    following their upload frequency, or all together every 'sweep_every' as successive executions would do, within
+    the same request-rate budget.
+
+    :param nb_channels: number of channels.
+    :param hours: simulated duration.
+    :param sweep_every: interval between two full sweeps.
+    :param units_per_hour: request-rate budget, in quota units per hour.
+    :return: small text with the results.
+    """
+    start = datetime.now().timestamp() - hours * 3600  # The simulation ends now: upload dates are in the past.
+    to_print = f"Daemon mode ({nb_channels} channels, {hours} simulated hours, {units_per_hour} units per hour)\n"
+    periods = [timedelta(hours=2) if idx % 10 == 0 else timedelta(days=3) if idx % 2 else None
+               for idx in range(nb_channels)]
+
+    for label, intervals in (("Sweeps:", (sweep_every, sweep_every)), ("Priority queue:", (sd.MIN_INTERVAL,
+                                                                                          sd.MAX_INTERVAL))):
+        fake = FakeYouTube()
+        channel_ids = [f"UCfake{idx:018d}" for idx in range(nb_channels)]
+        uploads = []  # (timestamp, channel ID), in the simulated day
+
+        for idx, (channel_id, period) in enumerate(zip(channel_ids, periods)):
+            first = datetime.fromtimestamp(start, timezone.utc) - (period or timedelta(days=730)) * (1 + idx % 7) / 7
+            fake.add_channel(channel_id, f"Channel {idx}", synthetic_upload_dates(20, period or timedelta(days=30),
+                                                                                 first))
+            uploads += [(first.timestamp() + period.total_seconds() * step, channel_id) for step in range(1, 100)
+                        if period and first.timestamp() + period.total_seconds() * step < start + hours * 3600]
+
+        uploads.sort(reverse=True)
+        clock = [start]
+        uploaded = {}  # Video ID -> upload timestamp
+        delays = []
+        service = qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=10 ** 9))
+
+        def wait(seconds):
+            delays.extend(clock[0] - uploaded.pop(video["contentDetails"]["videoId"])
+                          for playlist_id in PLAYLIST_IDS.values() for video in fake.playlist_data.get(playlist_id, [])
+                          if video["contentDetails"]["videoId"] in uploaded)
+            clock[0] += seconds
+
+            while uploads and uploads[-1][0] <= clock[0]:
+                upload_time, channel_id = uploads.pop()
+                uploaded[fake.upload(channel_id, datetime.fromtimestamp(upload_time, timezone.utc))] = upload_time
+
+        with TemporaryDirectory() as directory:
+            makedirs(f'{directory}/Logs')
+
+            with open(f'{directory}/db.json', 'w', encoding='utf8') as json_file:
+                json.dump({"MUSIQUE": channel_ids}, json_file)
+
+            with open(f'{directory}/playlists.json', 'w', encoding='utf8') as json_file:
+                json.dump(PLAYLIST_IDS, json_file)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                ticks = sd.run(f'{directory}/db.json', f'{directory}/playlists.json',
+                               datetime.fromtimestamp(start) - timedelta(hours=1), service,
+                               video_index_path=f'{directory}/video_index.json',
+                               activity_path=f'{directory}/channel_activity.json', units_per_hour=units_per_hour,
+                               min_interval=intervals[0], max_interval=intervals[1], until=start + hours * 3600,
+                               clock=lambda: clock[0], wait=wait, logs_directory=f'{directory}/Logs',
+                               selected_category="MUSIQUE", short_vid_index="music", long_vid_index="mix", delay=False,
+                               channel_cache_path=f'{directory}/channel_cache.json',
+                               checkpoint_path=f'{directory}/checkpoint.jsonl',
+                               duration_cache_path=f'{directory}/duration_cache.json',
+                               channel_db_index_path=f'{directory}/channel_db_index.json',
+                               not_added_directory=directory)
+
+        delays.sort()
+        to_print += f"    {label:<26}{sum(tick[1] for tick in ticks):5d} channel checks, " \
+                    f"{service.usage.used:5d} units, {len(delays)} new videos added " \
+                    f"({len(uploaded)} waiting): median delay {median(delays) / 60:5.0f} min, " \
+                    f"max {delays[-1] / 60:5.0f} min\n"
+
+    return to_print
+
+
+def bench_response_cache(nb_channels=138, nb_videos=240, nb_active=14, latency=0.01):
+    """Run two daily executions, a few channels uploading a video in between, with ETag revalidation of 'list'
+    responses (see 'response_cache.py'). The cache is saved after the first run and loaded again for the second one.
+    Responses are recorded too (as with '--record'): revalidation headers go through the recording requests.
+
+    :param nb_channels: number of channels to crawl.
+    :param nb_videos: number of videos uploaded by each channel before the first run (one every 3 days).
+    :param nb_active: number of channels uploading a video between the two runs.
+    :param latency: seconds slept by each fake round trip.
+    :return: small text with the results.
+    """
+    now = datetime.now(timezone.utc)
+    fake = FakeYouTube(latency=latency)
+    channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=3), newest=now - timedelta(days=2))
+    to_print = f"Response cache ({nb_channels} channels, {nb_active} of them uploading between two daily runs)\n"
+
+    with TemporaryDirectory() as directory:
+        runs = (("first run", now - timedelta(days=1), now - timedelta(days=4)),
+                ("next day", now, now - timedelta(days=1)))
+
+        for run, latest_date, oldest_date in runs:
+            cache = rc.ResponseCache(f'{directory}/response_cache.json')
+            recording = fy.RecordingService(fake, fy.Fixtures(f'{directory}/fixtures.json'))
+            service = qt.QuotaMeter(rc.CachingService(recording, cache), qt.QuotaUsage(None, budget=10 ** 9))
+            fake.calls.clear()
+            duration = run_execution(service, channel_ids, latest_date.astimezone().replace(tzinfo=None),
+                                     oldest_date.astimezone().replace(tzinfo=None), directory)
+            to_print += f"    {run + ':':<26}{duration:6.2f} s, {sum(fake.calls.values())} requests, " \
+                        f"{cache.hit_ratio:.1%} not modified, {cache.bytes_saved / 1024:.0f} KiB not downloaded\n"
+
+            for channel_id in channel_ids[:nb_active]:
+                fake.upload(channel_id, now - timedelta(hours=12))
+
+    return to_print
+
+
+def bench_metered_stack(nb_channels=138, nb_videos=60, nb_active=14, latency=0.005):
+    """Run two daily executions through the stack built by 'exe.create_metered_service' for one account (recording,
+    revalidation, timing, quota and retries, see 'sp.member_service'), the second one revalidating cached responses.
+
+    :param nb_channels: number of channels to crawl.
+    :param nb_videos: number of videos uploaded by each channel before the first run (one every 3 days).
+    :param nb_active: number of channels uploading a video between the two runs.
+    :param latency: seconds slept by each fake round trip.
+    :return: small text with the results.
+    """
+    now = datetime.now(timezone.utc)
+    fake = FakeYouTube(latency=latency)
+    channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=3), newest=now - timedelta(days=2))
+    to_print = f"Metered service stack ({nb_channels} channels, recorded, cached, timed, metered and retried)\n"
+
+    with TemporaryDirectory() as directory:
+        runs = (("first run", now - timedelta(days=1), now - timedelta(days=4)),
+                ("next day", now, now - timedelta(days=1)))
+
+        for run, latest_date, oldest_date in runs:
+            cache = rc.ResponseCache(f'{directory}/response_cache.json')
+            member = sp.member_service(fake, qt.QuotaUsage(None, budget=10 ** 9), cache,
+                                       fy.Fixtures(f'{directory}/fixtures.json'))
+            service = tp.RetryingService(member, tp.Transport(base_delay=0.01))
+            fake.calls.clear()
+            duration = run_execution(service, channel_ids, latest_date.astimezone().replace(tzinfo=None),
+                                     oldest_date.astimezone().replace(tzinfo=None), directory)
+            to_print += f"    {run + ':':<26}{duration:6.2f} s, {sum(fake.calls.values())} requests, " \
+                        f"{member.usage.used} units, {cache.hit_ratio:.1%} not modified\n"
+
+            for channel_id in channel_ids[:nb_active]:
+                fake.upload(channel_id, now - timedelta(hours=12))
+
+    return to_print
+
+
+def bench_streaming(sizes=(138, 1000), nb_videos=60, latency=0.005, max_workers=8):
+    """Run whole executions with durations and insertions after the crawl, then during it (see 'pipeline.py'),
+    measuring the delay before the first video is added and the peak of memory allocated by Python.
+
+    :param sizes: numbers of channels of each scenario.
+    :param nb_videos: number of videos uploaded by each channel (one every 3 days, a third of them being long).
+    :param latency: seconds slept by each fake round trip.
+    :param max_workers: maximum number of channels crawled at the same time.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=7)
+    to_print = f"Streaming execution ({nb_videos} videos per channel, {latency * 1000:.0f} ms latency, " \
+               f"{max_workers} workers)\n"
+
+    for nb_channels in sizes:
+        for streaming in (False, True):
+            fake = FakeYouTube(latency=latency)
+            channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=3))
+
+            for idx, video in enumerate(fake.video_data.values()):
+                video["contentDetails"]["duration"] = 'PT14M' if idx % 3 == 0 else 'PT4M'
+
+            with TemporaryDirectory() as directory:
+                tracemalloc.start()
+                duration = run_execution(fake, channel_ids, latest_date, oldest_date, directory, max_workers,
+                                         streaming=streaming)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                events_path = glob.glob(f'{directory}/Logs/*.jsonl')[0]
+                first_insert = next(event["elapsed"] - event["seconds"]
+                                    for event in rl.read_events(events_path, "insert"))
+
+            label = f"{nb_channels} channels, {'streaming' if streaming else 'batch'}:"
+            to_print += f"    {label:<26}{duration:6.2f} s, first video added after {first_insert:5.2f} s, " \
+                        f"{peak / 2 ** 20:5.1f} MiB peak, {in_playlists(fake)} videos in playlists\n"
+
+    return to_print
+
+
+def bench_duration_overlap(sizes=(138, 1000), nb_videos=60, latency=0.01):
+    """Compare duration lookups after the crawl (previous version) and during it ('pl.DurationLookup'), channels being
+    crawled one by one: time until every duration is known, and time spent on durations once the crawl is over.
+
+    :param sizes: numbers of channels of each scenario.
+    :param nb_videos: number of videos uploaded by each channel (one every 3 days).
+    :param latency: seconds slept by each fake round trip.
+    :return: small text with the results.
+    """
+    latest_date = datetime.today()
+    oldest_date = latest_date - timedelta(days=7)
+    to_print = f"Duration lookups ({nb_videos} videos per channel, {latency * 1000:.0f} ms latency)\n"
+
+    for nb_channels in sizes:
+        for concurrent in (False, True):
+            fake = FakeYouTube(latency=latency)
+            channel_ids = build_channels(fake, nb_channels, nb_videos, timedelta(days=3))
+
+            with TemporaryDirectory() as directory:
+                run_execution(fake, channel_ids, latest_date, oldest_date, directory, max_workers=1,
+                              concurrent_durations=concurrent)
+                events_path = glob.glob(f'{directory}/Logs/*.jsonl')[0]
+                durations = next(rl.read_events(events_path, "durations"))
+
+            label = f"{nb_channels} channels, {'during' if concurrent else 'after'} crawl:"
+            to_print += f"    {label:<32}durations known after {durations['elapsed']:6.2f} s " \
+                        f"({durations['seconds']:5.2f} s after the crawl), {fake.calls['videos.list']} 'videos.list' " \
+                        f"requests, {durations['videos']} videos\n"
+
+    return to_print
+
+
+" - MAIN PROGRAM -"
+
+if __name__ == "__main__":
+    gv.webbrowser.open = lambda url: None  # Playlists must not open browser tabs during benchmarks.
+    gv.sleep = lambda seconds: None  # Nor wait before opening playlists.
+
+    print(bench_windowed_paging())
+    print(bench_concurrent_crawl())
+    print(bench_batching())
+    print(bench_columnar_selection())
+    print(bench_video_records())
+    print(bench_duration_lookups())
+    print(bench_channel_db())
+    print(bench_service_startup())
+    print(bench_execution())
+    print(bench_resilience())
+    print(bench_quota_sharding())
+    print(bench_response_cache())
+    print(bench_metered_stack())
+    print(bench_streaming())
+    print(bench_scheduler())
+    print(bench_backfill())
+    print(bench_duration_overlap())
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from datetime import datetime, timedelta
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: channel_cache.py
+@author: Dylan "dyl-m" Monfret
+
+Local JSON store of channel metadata (uploads playlist ID and channel name), keyed by channel ID. Those values almost
+never change, so they are only requested again to the API once their entry is older than a time-to-live.
+
+Entry format: {"uploads": playlist ID, "title": channel name, "fetched_at": ISO date, "last_seen": ISO date}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/channel_cache.json'
+DEFAULT_TTL = timedelta(days=30)
+
+" - LOCAL FUNCTIONS - "
+
+
+def load_channel_cache(json_path=DEFAULT_PATH):
+    """Load the channel cache from disk.
+
+    :param json_path: file path to the cache JSON file.
+    :return: the cache as a dictionary (empty if the file does not exist yet).
+    """
+    if not isfile(json_path):
+        return {}
+
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def save_channel_cache(cache, json_path=DEFAULT_PATH):
+    """Write the channel cache on disk.
+
+    :param cache: the cache dictionary.
+    :param json_path: file path to the cache JSON file.
+    """
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump(cache, json_file, indent=4, sort_keys=True)
+
+
+def is_fresh(entry, ttl=DEFAULT_TTL, now=None):
+    """Return a Boolean indicating if a cache entry can still be used.
+
+    :param entry: a cache entry (or None).
+    :param ttl: time-to-live of an entry, as datetime.timedelta.
+    :param now: reference date (today by default).
+    :return: True if the entry exists and was fetched less than 'ttl' ago.
+    """
+    if not entry:
+        return False
+
+    now = now or datetime.today()
+    return now - datetime.fromisoformat(entry["fetched_at"]) < ttl
+
+
+def get_entry(cache, channel_id, ttl=DEFAULT_TTL, force_refresh=False):
+    """Get a channel entry if it is fresh, and mark it as seen.
+
+    :param cache: the cache dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param ttl: time-to-live of an entry, as datetime.timedelta.
+    :param force_refresh: if True, ignore the cached entry.
+    :return: the entry, or None if it has to be requested again.
+    """
+    entry = cache.get(channel_id)
+
+    if force_refresh or not is_fresh(entry, ttl):
+        return None
+
+    entry["last_seen"] = f"{datetime.today():%Y-%m-%dT%H:%M:%S}"
+    return entry
+
+
+def set_entry(cache, channel_id, uploads, title):
+    """Add or replace a channel entry.
+
+    :param cache: the cache dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param uploads: the channel uploads playlist ID.
+    :param title: the channel name.
+    :return: the new entry.
+    """
+    now = f"{datetime.today():%Y-%m-%dT%H:%M:%S}"
+    cache[channel_id] = {"uploads": uploads, "title": title, "fetched_at": now, "last_seen": now}
+    return cache[channel_id]
+
+
+def evict_expired(cache, ttl=DEFAULT_TTL):
+    """Remove expired entries from the cache.
+
+    :param cache: the cache dictionary.
+    :param ttl: time-to-live of an entry, as datetime.timedelta.
+    :return: list of evicted channel IDs.
+    """
+    now = datetime.today()
+    expired = [channel_id for channel_id, entry in cache.items() if not is_fresh(entry, ttl, now)]
+
+    for channel_id in expired:
+        del cache[channel_id]
+
+    return expired
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from hashlib import sha256
+from os import stat
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: channel_db.py
+@author: Dylan "dyl-m" Monfret
+
+PocketTube database loader. The database (exported with https://yousub.info/) holds channel IDs by category, next to
+the application settings ('ysc_*' keys), and only changes when subscriptions change. Its categories, without settings
+and without duplicates, are kept in a local JSON index with the modification time, size and SHA-256 of the file they
+were read from:
+
+- file unchanged (same modification time and size): the index is used, the database is neither hashed nor parsed;
+- file touched but same content (same SHA-256): the index is used, the database is not parsed;
+- otherwise the database is parsed, and compared with the index: channels added and removed since the last execution
+  are reported (see 'get_videos.execution', removed channels are evicted from every local store with
+  'evict_channels').
+
+Index format: {"mtime": modification time in nanoseconds, "size": bytes, "sha256": hexadecimal digest,
+               "categories": {category: [channel ID, ...]}}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/channel_db_index.json'
+INDEX_KEYS = ("mtime", "size", "sha256", "categories")
+
+_parsed = {}  # Database path -> index, for databases loaded without index file (several reads, one parsing).
+
+" - LOCAL FUNCTIONS - "
+
+
+def parse_categories(database):
+    """Get the categories of a PocketTube database, each channel once per category.
+
+    :param database: PocketTube database content.
+    :return: dictionary associating category and the list of its channel IDs, in database order.
+    """
+    return {category: list(dict.fromkeys(channel_ids)) for category, channel_ids in database.items()
+            if isinstance(channel_ids, list)}  # Settings ('ysc_*' keys) are dictionaries.
+
+
+def channel_ids_of(categories):
+    """Get the channel IDs of all categories, each channel once, in database order."""
+    return list(dict.fromkeys(channel_id for channel_ids in categories.values() for channel_id in channel_ids))
+
+
+def load_index(json_path=DEFAULT_PATH):
+    """Load the database index from disk.
+
+    :param json_path: file path to the index JSON file.
+    :return: the index as a dictionary, None if the file does not exist yet.
+    """
+    if not isfile(json_path):
+        return None
+
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def load_channel_db(json_path, index_path=DEFAULT_PATH):
+    """Load the categories of a PocketTube database, from the index if the database did not change.
+
+    :param json_path: file path to the PocketTube database.
+    :param index_path: file path to the database index, None to use no index file (the database is then parsed once
+                       per process and per modification).
+    :return: the new index (see 'save_channel_db'), with the channels "added" and "removed" since the index was saved
+             (both empty without previous index).
+    """
+    file_stat = stat(json_path)
+    previous = load_index(index_path) if index_path else _parsed.get(json_path)
+    index = {"mtime": file_stat.st_mtime_ns, "size": file_stat.st_size}
+
+    if previous is not None and (previous["mtime"], previous["size"]) == (index["mtime"], index["size"]):
+        index.update(sha256=previous["sha256"], categories=previous["categories"])
+
+    else:
+        with open(json_path, 'rb') as json_file:
+            content = json_file.read()
+
+        index["sha256"] = sha256(content).hexdigest()
+
+        if previous is not None and previous["sha256"] == index["sha256"]:
+            index["categories"] = previous["categories"]
+
+        else:
+            index["categories"] = parse_categories(json.loads(content))
+
+    if not index_path:
+        _parsed[json_path] = index
+
+    added, removed = [], []
+
+    if index_path and previous is not None and index["categories"] is not previous["categories"]:
+        channel_ids, previous_ids = channel_ids_of(index["categories"]), set(channel_ids_of(previous["categories"]))
+        new_ids = set(channel_ids)
+        added = [channel_id for channel_id in channel_ids if channel_id not in previous_ids]
+        removed = sorted(previous_ids - new_ids)
+
+    return {**index, "added": added, "removed": removed}
+
+
+def save_channel_db(index, json_path=DEFAULT_PATH):
+    """Write the database index on disk, once changes are taken into account.
+
+    :param index: the index dictionary (see 'load_channel_db').
+    :param json_path: file path to the index JSON file.
+    """
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump({key: index[key] for key in INDEX_KEYS}, json_file, separators=(',', ':'))
+
+
+def evict_channels(channel_ids, channel_cache=None, video_index=None, activity=None, duration_cache=None,
+                   response_cache=None):
+    """Remove channels (unsubscribed) from the local stores, the ones not used being None.
+
+    :param channel_ids: list of channel IDs.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py').
+    :param video_index: local video index (see 'video_index.py'), durations of its videos are evicted too.
+    :param activity: channel activity store (see 'activity.py').
+    :param duration_cache: duration cache (see 'duration_cache.py').
+    :param response_cache: a 'rc.ResponseCache' object, responses about the channels and their uploads playlist are
+                           evicted.
+    :return: number of entries removed.
+    """
+    removed = 0
+    keys = set()  # Channel IDs and uploads playlist IDs, looked for in response cache keys.
+
+    for channel_id in channel_ids:
+        keys.add(channel_id)
+
+        if channel_cache is not None and channel_id in channel_cache:
+            keys.add(channel_cache.pop(channel_id)["uploads"])
+            removed += 1
+
+        if video_index is not None and channel_id in video_index["channels"]:
+            videos = video_index["channels"].pop(channel_id)["videos"]
+            removed += 1
+
+            if duration_cache is not None:
+                removed += sum(duration_cache.pop(video_id, None) is not None for video_id in videos)
+
+        if activity is not None and activity.pop(channel_id, None) is not None:
+            removed += 1
+
+    if response_cache is not None:
+        removed += response_cache.evict(lambda key: any(a_key in key for a_key in keys))
+
+    return removed
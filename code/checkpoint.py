@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+from datetime import datetime, timedelta
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: checkpoint.py
+@author: Dylan "dyl-m" Monfret
+
+Journal of an execution progress (JSON lines), written after each channel crawled, after duration lookups and after
+each video added to a playlist. An interrupted execution (quota exhausted, network failure, ...) can then be resumed
+without spending quota again on finished steps. The journal only ends with a "done" record once nothing was deferred.
+
+Records: {"event": "start", "latest_date": ..., "oldest_date": ...}
+         {"event": "channel", "channel_id": ..., "videos": [...], "selection": {...}}
+         {"event": "duration_chunk", "videos": [[[video ID, upload date, channel ID, title], seconds, ISO date], ...]}
+                                                 (one record per chunk of durations found)
+         {"event": "inserted", "playlist_id": ..., "video_id": ...}
+         {"event": "done"}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/checkpoint.jsonl'
+
+" - LOCAL CLASSES - "
+
+
+class Checkpoint:
+    """Append-only journal of an execution."""
+
+    def __init__(self, json_path=DEFAULT_PATH, resume=False):
+        self.json_path = json_path
+        self.lock = threading.Lock()
+        self.records = []
+
+        if resume and isfile(json_path):
+            with open(json_path, encoding='utf8') as json_file:
+                self.records = [json.loads(line) for line in json_file if line.strip()]
+
+            if self.records and self.records[-1]["event"] == "done":  # Nothing to resume.
+                self.records = []
+
+        if not self.records:
+            open(json_path, 'w', encoding='utf8').close()
+
+    @property
+    def resumed(self):
+        return bool(self.records)
+
+    def _write(self, record):
+        with self.lock, open(self.json_path, 'a', encoding='utf8') as json_file:
+            json_file.write(json.dumps(record) + '\n')
+
+        if record["event"] != "channel":  # Crawled channels are only read when resuming, from the file.
+            self.records.append(record)
+
+    def _events(self, event):
+        return [record for record in self.records if record["event"] == event]
+
+    " - Start - "
+
+    def start(self, latest_date, oldest_date):
+        self._write({"event": "start", "latest_date": latest_date.isoformat(), "oldest_date": oldest_date.isoformat()})
+
+    def dates(self):
+        """Get the (latest date, oldest date) of the journaled execution."""
+        start = self._events("start")[0]
+        return datetime.fromisoformat(start["latest_date"]), datetime.fromisoformat(start["oldest_date"])
+
+    " - Crawl - "
+
+    def channel_crawled(self, channel_id, channel_videos, channel_selection):
+        # Only what the video index needs is kept from the 'playlistItems' resources.
+        videos = [{"contentDetails": {key: video["contentDetails"][key]
+                                      for key in ("videoId", "videoPublishedAt") if key in video["contentDetails"]}}
+                  for video in channel_videos]
+        self._write({"event": "channel", "channel_id": channel_id, "videos": videos, "selection": channel_selection})
+
+    def crawled_channels(self):
+        """Get crawled channels as a dictionary {channel ID: (videos, selection)} (see 'get_videos.crawl_channel')."""
+        crawled = {}
+
+        for record in self._events("channel"):
+            selection = dict(record["selection"])
+            selection["selection_list"] = [tuple(video) for video in selection["selection_list"]]
+            crawled[record["channel_id"]] = (record["videos"], selection)
+
+        return crawled
+
+    " - Durations - "
+
+    def duration_chunk_found(self, duration_list):
+        self._write({"event": "duration_chunk",
+                     "videos": [[list(video), duration.total_seconds(), date.isoformat()]
+                                for video, duration, date in duration_list]})
+
+    def duration_chunks(self):
+        """Get durations found before an interruption as a dictionary {video ID: (video, duration, date)}."""
+        return {video[0]: (tuple(video), timedelta(seconds=seconds), datetime.fromisoformat(date))
+                for record in self._events("duration_chunk") for video, seconds, date in record["videos"]}
+
+    " - Insertions - "
+
+    def video_inserted(self, playlist_id, video_id):
+        self._write({"event": "inserted", "playlist_id": playlist_id, "video_id": video_id})
+
+    def inserted(self, playlist_id):
+        """Get the set of video IDs already added to a playlist."""
+        return {record["video_id"] for record in self._events("inserted") if record["playlist_id"] == playlist_id}
+
+    def finish(self):
+        self._write({"event": "done"})
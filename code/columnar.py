@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+
+from dateutil import tz
+
+"""- SCRIPT INFORMATION -
+
+@file_name: columnar.py
+@author: Dylan "dyl-m" Monfret
+
+Columnar version of 'get_videos.video_selection': raw API items are converted into arrays once, then filtered in
+bulk with pandas. Worth it for long upload histories, the per-video loops of 'get_videos.py' being faster for a few
+pages of videos. The duration split is made on the integer durations column of 'records.VideoRecords'.
+"""
+
+" - LOCAL FUNCTIONS - "
+
+
+def videos_frame(api_videos_list):
+    """Convert 'playlistItems' resources into columns.
+
+    :param api_videos_list: list of videos got from 'get_videos.api_get_channel_videos' function.
+    :return: a pandas.DataFrame with 'video_id', 'published_at' (ISO 8601 string), 'title' and 'date' (UTC datetime)
+             columns.
+    """
+    details = [video["contentDetails"] for video in api_videos_list]
+    frame = pd.DataFrame({"video_id": [detail["videoId"] for detail in details],
+                          "published_at": [detail.get("videoPublishedAt") for detail in details],
+                          "title": [video["snippet"].get("title") for video in api_videos_list]})
+    frame["date"] = pd.to_datetime(frame["published_at"], utc=True)
+
+    return frame
+
+
+def select_videos(frame, latest_date, oldest_date, a_year_ago, channel_id=None):
+    """Select videos uploaded in a period and count videos uploaded in a year, in bulk.
+
+    :param frame: a DataFrame from 'videos_frame'.
+    :param latest_date: Upper bound of time interval.
+    :param oldest_date: Lower bound of time interval.
+    :param a_year_ago: Lower bound of the one year activity count.
+    :param channel_id: ID of the channel which uploaded these videos.
+    :return: a tuple with the selection list ((video ID, upload date, channel ID, title) tuples), the one year count
+             and IDs of videos without upload date (private or deleted).
+    """
+    tz_local = tz.tzlocal()
+    latest = pd.Timestamp(latest_date.astimezone(tz_local))
+    dates = frame["date"]
+
+    in_period = (dates >= pd.Timestamp(oldest_date.astimezone(tz_local))) & (dates <= latest)
+    in_year = (dates >= pd.Timestamp(a_year_ago.astimezone(tz_local))) & (dates <= latest)
+    selected = frame[in_period.to_numpy()]
+
+    return (list(zip(selected["video_id"], selected["published_at"], [channel_id] * len(selected), selected["title"])),
+            int(in_year.sum()),
+            frame.loc[dates.isna().to_numpy(), "video_id"].tolist())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: duration_cache.py
+@author: Dylan "dyl-m" Monfret
+
+Local JSON store of video durations and upload dates, keyed by video ID. Once a video is published its duration never
+changes, so entries never expire: a video is only looked up once (see 'get_videos.api_get_videos_duration'), even if
+it is selected again by a re-run or by an overlapping period.
+
+Videos not returned by the API (deleted or private) are not stored, they may be published again later.
+
+Cache format: {video ID: [upload date as epoch seconds, duration in seconds]}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/duration_cache.json'
+
+" - LOCAL FUNCTIONS - "
+
+
+def load_duration_cache(json_path=DEFAULT_PATH):
+    """Load the duration cache from disk.
+
+    :param json_path: file path to the cache JSON file.
+    :return: the cache as a dictionary (empty if the file does not exist yet).
+    """
+    if not isfile(json_path):
+        return {}
+
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def save_duration_cache(cache, json_path=DEFAULT_PATH):
+    """Write the duration cache on disk.
+
+    :param cache: the cache dictionary.
+    :param json_path: file path to the cache JSON file.
+    """
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump(cache, json_file, separators=(',', ':'))  # One line: the cache only grows.
+
+
+def get_duration(cache, video_id):
+    """Get the upload date and duration of a video.
+
+    :param cache: the cache dictionary (or None).
+    :param video_id: a YouTube video ID.
+    :return: a tuple (upload date as epoch seconds, duration in seconds), or None if the video is not cached.
+    """
+    if cache is None or video_id not in cache:
+        return None
+
+    published, seconds = cache[video_id]
+    return published, seconds
+
+
+def set_duration(cache, video_id, published, seconds):
+    """Store the upload date and duration of a video.
+
+    :param cache: the cache dictionary.
+    :param video_id: a YouTube video ID.
+    :param published: upload date as epoch seconds.
+    :param seconds: duration in seconds.
+    """
+    cache[video_id] = [published, seconds]
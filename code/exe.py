@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import argparse
+import backfill as bf
+import fake_youtube as fy
 import get_videos as gv
 import glob
 import os
+import quota as qt
 import re
+import response_cache as rc
+import routing as rt
+import run_log as rl
+import scheduler as sd
+import service_pool as sp
+import transport as tp
+import video_index as vi
 from datetime import datetime
-from Google import create_service
+from Google import LazyService
 
 """- SCRIPT INFORMATION -
 
@@ -22,18 +33,48 @@ API_NAME = 'YouTube'
 API_VERSION = 'v3'
 SCOPES = ['https://www.googleapis.com/auth/youtube']
 
-service = create_service(CLIENT_SECRET_FILE, API_NAME, API_VERSION, SCOPES)
+# One account by default, several if 'accounts.json' exists: list requests are spread over them (see 'service_pool.py').
+owner, accounts = sp.load_accounts(sp.DEFAULT_PATH, CLIENT_SECRET_FILE)
+quota_usages = {name: qt.QuotaUsage(sp.usage_path(name, owner), budget=qt.DAILY_QUOTA) for name in accounts}
+transport = tp.Transport()  # Retries and circuit breaker shared by all services.
+response_cache = rc.ResponseCache(rc.DEFAULT_PATH)
 
 " - Local Functions - "
 
 
+def create_metered_service(fixtures=None, owner_playlists=()):
+    """Create a service retrying failed requests, charging each attempt to today's quota usage of its account,
+    revalidating cached 'list' responses and timing round trips, built on first request only (dry runs never touch
+    credentials). With several accounts, requests are spread over one such service per account.
+
+    :param fixtures: a 'fy.Fixtures' object where every response is recorded, None to record nothing.
+    :param owner_playlists: IDs of the playlists filled by the script, only read with the owner account.
+    :return: a 'tp.RetryingService' object.
+    """
+    members = {name: sp.member_service(LazyService(account["client_secret"], API_NAME, API_VERSION, SCOPES,
+                                                   token_file=account["token"]),
+                                       quota_usages[name], response_cache, fixtures)
+               for name, account in accounts.items()}
+
+    if len(members) == 1:
+        return tp.RetryingService(members[owner], transport)
+
+    return tp.RetryingService(sp.ServicePool(members, owner, owner_playlists), transport)
+
+
 def get_last_exe_date(logs_directory):
-    """Get the last script execution date from logs' directory (so from most recent log file).
+    """Get the last script execution date from logs' directory (so from most recent log file). Only used before the
+    first execution with a local video index (see 'video_index.py').
 
     :param logs_directory: Logs' directory.
     :return: last execution date as datetime.datetime object.
     """
-    list_of_files = glob.glob(f'{logs_directory}/*')
+    last_run_start = rl.last_run_start(logs_directory)  # Structured events (see 'run_log.py'), if any.
+
+    if last_run_start is not None:
+        return datetime.fromisoformat(last_run_start["run_date"])
+
+    list_of_files = glob.glob(f'{logs_directory}/*.txt')
     latest_file = max(list_of_files, key=os.path.getctime)
 
     with open(f'{latest_file}', 'r', encoding="utf8") as f:
@@ -47,21 +88,77 @@ def get_last_exe_date(logs_directory):
 
 " - Main - "
 
+parser = argparse.ArgumentParser(description="Add new videos from subscribed channels into temporary playlists.")
+parser.add_argument('--resume', action='store_true', help="resume the last execution if it was interrupted")
+parser.add_argument('--dry-run', action='store_true', help="only estimate the quota cost, without any request")
+parser.add_argument('--record', metavar='FIXTURES',
+                    help="record API responses into a JSON file (see 'fake_youtube.py')")
+parser.add_argument('--streaming', action='store_true',
+                    help="add videos to playlists during the crawl instead of after it (see 'pipeline.py')")
+parser.add_argument('--profile', action='store_true', help="capture a cProfile of the execution, saved in Logs")
+parser.add_argument('--daemon', action='store_true',
+                    help="keep running, each channel being checked following its upload frequency (see 'scheduler.py')")
+parser.add_argument('--backfill', metavar='YYYY-MM-DD',
+                    help="add videos uploaded since this date, over several days (see 'backfill.py')")
+args = parser.parse_args()
+
+fixtures = fy.Fixtures(args.record) if args.record else None
+
 music_channels = "../files/PocketTube_DB.json"
 playlist_ids_json = "../files/temp_playlist.json"
+routing_rules_json = "../files/routing_rules.json"  # Optional, several categories and playlists (see 'routing.py').
 
-today = datetime.today()
-
-# a_date = "2020-01-01 00:00:00"
-# previous_date = datetime.strptime(a_date, '%Y-%m-%d %H:%M:%S')
+owner_playlists = set(gv.read_json(playlist_ids_json).values())
 
-previous_date = get_last_exe_date("../Logs")
+today = datetime.today()
 
-gv.execution(path_channel_data_base_json=music_channels,
-             path_playlist_ids_json=playlist_ids_json,
-             latest_date=today,
-             oldest_date=previous_date,
-             api_service=service,
-             selected_category="MUSIQUE",
-             short_vid_index="music",
-             long_vid_index="mix")
+# Channels already in the index are explored from their own high-water mark, 'previous_date' is used for new ones.
+previous_date = vi.get_last_run(vi.load_video_index(vi.DEFAULT_PATH)) or get_last_exe_date("../Logs")
+
+if args.backfill:  # Up to the last execution: later videos are added by regular executions.
+    bf.run(path_channel_data_base_json=music_channels,
+           path_playlist_ids_json=playlist_ids_json,
+           oldest_date=datetime.strptime(args.backfill, '%Y-%m-%d'),
+           latest_date=previous_date,
+           api_service=create_metered_service(fixtures, owner_playlists),
+           selected_category="MUSIQUE",
+           short_vid_index="music",
+           long_vid_index="mix",
+           routing_rules=rt.load_rules(routing_rules_json) if os.path.isfile(routing_rules_json) else None,
+           max_workers=8,
+           service_factory=lambda: create_metered_service(fixtures, owner_playlists))
+
+elif args.daemon:
+    sd.run(path_channel_data_base_json=music_channels,
+           path_playlist_ids_json=playlist_ids_json,
+           oldest_date=previous_date,
+           api_service=create_metered_service(fixtures, owner_playlists),
+           transport=transport,
+           selected_category="MUSIQUE",
+           short_vid_index="music",
+           long_vid_index="mix",
+           routing_rules=rt.load_rules(routing_rules_json) if os.path.isfile(routing_rules_json) else None,
+           streaming=args.streaming,
+           profile=args.profile,
+           max_workers=8,
+           service_factory=lambda: create_metered_service(fixtures, owner_playlists))
+
+else:
+    gv.execution(path_channel_data_base_json=music_channels,
+                 path_playlist_ids_json=playlist_ids_json,
+                 latest_date=today,
+                 oldest_date=previous_date,
+                 api_service=create_metered_service(fixtures, owner_playlists),
+                 selected_category="MUSIQUE",
+                 short_vid_index="music",
+                 long_vid_index="mix",
+                 routing_rules=rt.load_rules(routing_rules_json) if os.path.isfile(routing_rules_json) else None,
+                 resume=args.resume,
+                 dry_run=args.dry_run,
+                 streaming=args.streaming,
+                 profile=args.profile,
+                 max_workers=8,
+                 service_factory=lambda: create_metered_service(fixtures, owner_playlists))
+
+if fixtures is not None:
+    fixtures.save()
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import quota as qt
+import random
+import threading
+import wrapping as wr
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+from os.path import isfile
+from time import sleep
+
+"""- SCRIPT INFORMATION -
+
+@file_name: fake_youtube.py
+@author: Dylan "dyl-m" Monfret
+
+Offline, in-process stand-in for the YouTube Data API service object returned by 'Google.create_service'. Only the
+resources and methods used in 'get_videos.py' are implemented, with the same call chain
+('service.resource().method(**kwargs).execute()'), so functions can be profiled without Google credentials.
+
+List responses have an ETag and are answered with '304 Not Modified' errors when it matches the 'If-None-Match'
+header of the request. Failures of the real API can be injected: quota errors (HTTP 403 'quotaExceeded') once a
+number of units is spent, random 'ConnectionResetError' and errors queued for a given method ('FakeYouTube.fail_next').
+
+Record / replay: 'RecordingService' wraps a real service and stores every response into 'Fixtures' (a JSON file),
+'ReplayYouTube' answers the same requests from these fixtures, offline.
+"""
+
+" - LOCAL CLASSES - "
+
+
+class FakeRequest:
+    """Deferred API call, executed (and counted) on 'execute'."""
+
+    def __init__(self, service, method_name, handler, kwargs):
+        self.service = service
+        self.method_name = method_name
+        self.handler = handler
+        self.kwargs = kwargs
+        self.headers = {}
+
+    def execute(self):
+        if self.service.latency:
+            sleep(self.service.latency)  # Simulated network round trip.
+
+        return self.run()
+
+    def run(self):
+        with self.service.lock:
+            self.service.calls[self.method_name] += 1
+            error = self.service.injected_error(self.method_name)
+
+            if error is not None:
+                self.service.failed[self.method_name] += 1
+
+        if error is not None:
+            raise error
+
+        response = self.handler(**self.kwargs)
+
+        if self.method_name.endswith('.list'):  # List responses have an ETag, checked against 'If-None-Match'.
+            etag = hashlib.md5(json.dumps(response, sort_keys=True).encode('utf8')).hexdigest()
+
+            if self.headers.get('If-None-Match') == etag:
+                raise http_error(304, 'notModified')
+
+            response = {**response, "etag": etag}
+
+        return response
+
+
+class FakeBatch:
+    """Batch of requests executed in a single (simulated) round trip, like 'googleapiclient.http.BatchHttpRequest'."""
+
+    def __init__(self, service, callback=None):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback or self.callback, request_id or str(len(self.requests))))
+
+    def execute(self):
+        if self.service.latency:
+            sleep(self.service.latency)
+
+        with self.service.lock:
+            self.service.calls['batch'] += 1
+            reset = self.service.random.random() < self.service.reset_rate
+
+        if reset:  # The whole round trip is lost.
+            with self.service.lock:
+                self.service.failed['batch'] += 1
+
+            raise ConnectionResetError("[Errno 104] Connection reset by peer (injected)")
+
+        for request, callback, request_id in self.requests:
+            try:
+                response, exception = request.run(), None
+
+            except Exception as error:  # pylint: disable=broad-except - Given to the callback, as Google does.
+                response, exception = None, error
+
+            if callback is not None:
+                callback(request_id, response, exception)
+
+
+class FakeResource:
+    """Group of API methods ('channels', 'playlistItems', ...) bound to a fake service."""
+
+    def __init__(self, service, resource_name, handlers):
+        self.service = service
+        self.resource_name = resource_name
+        self.handlers = handlers
+
+    def __getattr__(self, method):
+        try:
+            handler = self.handlers[method]
+        except KeyError:
+            raise AttributeError(f"{self.resource_name}.{method} is not implemented by the fake service.")
+
+        return lambda **kwargs: FakeRequest(self.service, f"{self.resource_name}.{method}", handler, kwargs)
+
+
+class FakeYouTube:
+    """Fake YouTube service holding channels, playlists and videos in memory."""
+
+    def __init__(self, page_size=50, latency=0.0, quota_limit=None, reset_rate=0.0, seed=None):
+        self.page_size = page_size
+        self.latency = latency  # Seconds slept by each executed request.
+        self.quota_limit = quota_limit  # Units spent before 'quotaExceeded' errors, None for no limit.
+        self.reset_rate = reset_rate  # Probability for a round trip to end with a 'ConnectionResetError'.
+        self.random = random.Random(seed)
+        self.units = 0
+        self.failures = {}  # "resource.method" -> list of exceptions raised by next calls
+        self.lock = threading.Lock()
+        self.channel_data = {}  # Channel ID -> {"title": ..., "uploads": playlist ID}
+        self.playlist_data = {}  # Playlist ID -> list of 'playlistItems' resources (most recent first)
+        self.video_data = {}  # Video ID -> 'videos' resource
+        self.calls = Counter()  # "resource.method" (or "batch") -> number of executed requests
+        self.failed = Counter()  # "resource.method" (or "batch") -> number of injected failures
+
+    " - Data creation - "
+
+    def add_channel(self, channel_id, title, upload_dates, duration='PT4M'):
+        """Create a channel and its uploads playlist.
+
+        :param channel_id: a channel ID.
+        :param title: the channel name.
+        :param upload_dates: aware datetime.datetime objects, one per uploaded video.
+        :param duration: ISO 8601 duration given to every video of the channel.
+        """
+        uploads_id = f"UU{channel_id[2:]}"
+        self.channel_data[channel_id] = {"title": title, "uploads": uploads_id}
+        self.playlist_data[uploads_id] = []
+
+        for idx, upload_date in enumerate(sorted(upload_dates, reverse=True)):
+            video_id = f"{channel_id[-6:]}{idx:05d}"
+            date_str = f"{upload_date.astimezone(timezone.utc):%Y-%m-%dT%H:%M:%SZ}"
+            self.video_data[video_id] = {"id": video_id,
+                                         "snippet": {"publishedAt": date_str, "channelId": channel_id,
+                                                     "channelTitle": title, "title": f"Video {idx}"},
+                                         "contentDetails": {"duration": duration}}
+            self.playlist_data[uploads_id].append(self._playlist_item(uploads_id, video_id, date_str))
+
+    def upload(self, channel_id, upload_date, duration='PT4M'):
+        """Add a new video at the top of a channel uploads playlist.
+
+        :param channel_id: ID of a channel created with 'add_channel'.
+        :param upload_date: an aware datetime.datetime object.
+        :param duration: ISO 8601 duration of the video.
+        :return: the video ID.
+        """
+        uploads_id = self.channel_data[channel_id]["uploads"]
+        video_id = f"{channel_id[-6:]}{len(self.playlist_data[uploads_id]):05d}"
+        date_str = f"{upload_date.astimezone(timezone.utc):%Y-%m-%dT%H:%M:%SZ}"
+        self.video_data[video_id] = {"id": video_id,
+                                     "snippet": {"publishedAt": date_str, "channelId": channel_id,
+                                                 "channelTitle": self.channel_data[channel_id]["title"],
+                                                 "title": f"Video {len(self.playlist_data[uploads_id])}"},
+                                     "contentDetails": {"duration": duration}}
+
+        with self.lock:
+            self.playlist_data[uploads_id].insert(0, self._playlist_item(uploads_id, video_id, date_str))
+
+        return video_id
+
+    " - Failures - "
+
+    def fail_next(self, method_name, error, times=1):
+        """Make the next calls of a method fail.
+
+        :param method_name: "resource.method" name, like "playlistItems.list".
+        :param error: exception raised by these calls (see 'http_error').
+        :param times: number of failing calls.
+        """
+        with self.lock:
+            self.failures.setdefault(method_name, []).extend([error] * times)
+
+    def injected_error(self, method_name):
+        """Get the error a call has to raise, if any (called under the service lock)."""
+        if self.failures.get(method_name):
+            return self.failures[method_name].pop(0)
+
+        if self.random.random() < self.reset_rate:
+            return ConnectionResetError("[Errno 104] Connection reset by peer (injected)")
+
+        cost = qt.UNIT_COSTS.get(method_name, qt.DEFAULT_UNIT_COST)
+
+        if self.quota_limit is not None and self.units + cost > self.quota_limit:
+            return http_error(403, 'quotaExceeded', "The request cannot be completed because you have exceeded your "
+                                                    "quota.")
+
+        self.units += cost
+        return None
+
+    def _playlist_item(self, playlist_id, video_id, added_date):
+        video = self.video_data[video_id]
+        return {"id": f"{playlist_id}.{video_id}",
+                "snippet": {"publishedAt": added_date, "playlistId": playlist_id,
+                            "channelTitle": video["snippet"]["channelTitle"], "title": video["snippet"]["title"],
+                            "resourceId": {"kind": "youtube#video", "videoId": video_id}},
+                "contentDetails": {"videoId": video_id, "videoPublishedAt": video["snippet"]["publishedAt"]}}
+
+    def _page(self, items, page_token):
+        start = int(page_token or 0)
+        end = start + self.page_size
+        response = {"items": items[start:end], "pageInfo": {"totalResults": len(items)}}
+
+        if end < len(items):
+            response["nextPageToken"] = str(end)
+
+        return response
+
+    " - Resources - "
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def channels(self):
+        return FakeResource(self, 'channels', {'list': self._channels_list})
+
+    def playlistItems(self):  # NOSONAR - Same name as the Google API resource.
+        return FakeResource(self, 'playlistItems', {'list': self._playlist_items_list,
+                                                    'insert': self._playlist_items_insert})
+
+    def videos(self):
+        return FakeResource(self, 'videos', {'list': self._videos_list})
+
+    " - Handlers - "
+
+    def _channels_list(self, id, part, **_):  # pylint: disable=redefined-builtin
+        items = []
+
+        for channel_id in id.split(','):
+            if channel_id in self.channel_data:
+                channel = self.channel_data[channel_id]
+                items.append({"id": channel_id,
+                              "snippet": {"title": channel["title"]},
+                              "contentDetails": {"relatedPlaylists": {"uploads": channel["uploads"]}}})
+
+        return {"items": items}
+
+    def _playlist_items_list(self, playlistId, part, maxResults=5, pageToken=None, **_):  # pylint: disable=invalid-name
+        return self._page(self.playlist_data.get(playlistId, []), pageToken)
+
+    def _playlist_items_insert(self, part, body, **_):
+        playlist_id = body["snippet"]["playlistId"]
+        video_id = body["snippet"]["resourceId"]["videoId"]
+        item = self._playlist_item(playlist_id, video_id, f"{datetime.now(timezone.utc):%Y-%m-%dT%H:%M:%SZ}")
+
+        with self.lock:
+            self.playlist_data.setdefault(playlist_id, []).append(item)
+
+        return item
+
+    def _videos_list(self, id, part, **_):  # pylint: disable=redefined-builtin
+        return {"items": [self.video_data[video_id] for video_id in id.split(',') if video_id in self.video_data]}
+
+
+class Fixtures:
+    """API responses recorded by 'RecordingService', keyed by method name and request arguments."""
+
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.lock = threading.Lock()
+        self.responses = {}
+
+        if isfile(json_path):
+            with open(json_path, encoding='utf8') as json_file:
+                self.responses = json.load(json_file)
+
+    @staticmethod
+    def key(method_name, kwargs):
+        return json.dumps([method_name, kwargs], sort_keys=True, default=str)
+
+    def record(self, method_name, kwargs, response):
+        with self.lock:
+            self.responses[self.key(method_name, kwargs)] = response
+
+    def replay(self, method_name, kwargs):
+        try:
+            return self.responses[self.key(method_name, kwargs)]
+
+        except KeyError:
+            raise http_error(404, 'notRecorded', f"No recorded response for {method_name} {kwargs}.")
+
+    def save(self):
+        with self.lock, open(self.json_path, 'w', encoding='utf8') as json_file:
+            json.dump(self.responses, json_file, indent=1)
+
+
+class RecordingRequest(wr.WrappedRequest):
+    """Real API request whose response is recorded when executed."""
+
+    def execute(self, *args, **kwargs):
+        response = self.request.execute(*args, **kwargs)
+        self.service.fixtures.record(self.method_name, self.kwargs, response)
+        return response
+
+
+class RecordingBatch(wr.WrappedBatch):
+    """Real batch request recording the response of each successful request."""
+
+    def added(self, request, callback):
+        def record_then_callback(rid, response, exception):
+            if exception is None:
+                self.service.fixtures.record(request.method_name, request.kwargs, response)
+
+            if callback is not None:
+                callback(rid, response, exception)
+
+        return record_then_callback
+
+
+class RecordingService(wr.WrappedService):
+    """Service object recording every response into 'Fixtures'. Same interface as the wrapped service."""
+
+    request_class = RecordingRequest
+    batch_class = RecordingBatch
+
+    def __init__(self, api_service, fixtures):
+        super().__init__(api_service)
+        self.fixtures = fixtures
+
+
+class ReplayYouTube(FakeYouTube):
+    """Fake service answering requests with recorded responses (HTTP 404 'notRecorded' errors for other requests).
+    Latency and failures can be injected as with 'FakeYouTube'."""
+
+    def __init__(self, fixtures, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = fixtures
+
+    def _replay(self, method_name, **kwargs):
+        return self.fixtures.replay(method_name, kwargs)
+
+    def _replay_resource(self, resource_name, methods):
+        return FakeResource(self, resource_name,
+                            {method: partial(self._replay, f"{resource_name}.{method}") for method in methods})
+
+    def channels(self):
+        return self._replay_resource('channels', ('list',))
+
+    def playlistItems(self):  # NOSONAR - Same name as the Google API resource.
+        return self._replay_resource('playlistItems', ('list', 'insert'))
+
+    def videos(self):
+        return self._replay_resource('videos', ('list',))
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def http_error(status, reason, message=''):
+    """Build an API error as raised by 'googleapiclient'.
+
+    :param status: HTTP status code (403, 429, 500, ...).
+    :param reason: error reason ('quotaExceeded', 'rateLimitExceeded', 'backendError', ...).
+    :param message: error message.
+    :return: a googleapiclient.errors.HttpError object.
+    """
+    content = {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+    return HttpError(Response({'status': status}), json.dumps(content).encode('utf8'))
+
+
+def synthetic_upload_dates(nb_videos, every, newest=None):
+    """Generate regularly spaced upload dates, from the most recent to the oldest.
+
+    :param nb_videos: number of dates to generate.
+    :param every: datetime.timedelta between two uploads.
+    :param newest: most recent upload date (now by default).
+    :return: list of aware datetime.datetime objects.
+    """
+    newest = newest or datetime.now(timezone.utc) - timedelta(hours=1)
+    return [newest - idx * every for idx in range(nb_videos)]
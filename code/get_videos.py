@@ -1,18 +1,38 @@
 # -*- coding: utf-8 -*-
 
+import activity as ac
+import batching as bt
+import channel_cache as cc
+import channel_db as cd
+import checkpoint as ck
+import columnar as cl
+import duration_cache as dc
 import json
+import metrics as mt
+import pipeline as pl
+import quota as qt
+import records as rs
+import response_cache as rc
+import routing as rt
+import run_log as rl
+import threading
+import transport as tp
+import video_index as vi
 import webbrowser
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dateutil import tz
 from dateutil.relativedelta import relativedelta
 from Google import create_service
 from googleapiclient.errors import HttpError
 from isodate import parse_duration
+from operator import itemgetter
 from os import listdir, remove
-from os.path import isfile, join, getctime
+from os.path import isfile, join, splitext
 from pprint import pformat
-from time import sleep
+from time import perf_counter, sleep
 
 """ - CREDITS -
 
@@ -54,41 +74,99 @@ channels_url_exception = {"UC4YCVy0ggUoFd2NVU2z04WA",
 # channels_ignored = {'UC0n9yiP-AD2DpuuYCDwlNxQ'}
 channels_ignored = {''}
 
+# Shares of the daily insertion budget (of the playlists owner account, see 'qt.insert_budget'): channels whose videos
+# would cost more are ignored, a warning is given past the second one.
+MAX_CHANNEL_SHARE = 0.2
+WARNING_SHARE = 0.8
+
+COLUMNAR_MIN_VIDEOS = 1000  # Number of videos from which selection is made with 'columnar.py'.
+NOT_ADDED_DIRECTORY = '../files'  # Where 'NOT_ADDED_<playlist ID>.json' files are written (see 'write_not_added').
+
 " - LOCAL FUNCTIONS - "
 
 
-def api_get_channel_videos(a_channel_id, api_service):
+@mt.timed("function")
+def api_get_channel_videos(a_channel_id, api_service, lower_bound=None, channel_cache=None):
     """Get all videos published / uploaded by a YouTube channel. Public, unlisted and premiere type videos will be
     retrieved by this function.
 
     :param a_channel_id: A channel ID (https://www.youtube.com/channel/[THIS PART]).
     :param api_service: API Google Token generated with Google.py call.
-    :return: All video uploaded to this channel.
+    :param lower_bound: if given, stop retrieving once videos are older than this date (see 'api_iter_channel_pages'),
+                        otherwise the whole channel history is retrieved.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :return: All video uploaded to this channel (since 'lower_bound' if given).
     """
     lst_of_videos = []
+
+    for page in api_iter_channel_pages(a_channel_id, api_service, lower_bound=lower_bound, channel_cache=channel_cache):
+        lst_of_videos += page
+
+    return lst_of_videos
+
+
+def api_iter_channel_pages(a_channel_id, api_service, lower_bound=None, extra_pages=1, channel_cache=None):
+    """Yield, page by page, videos uploaded by a YouTube channel, from the most recent to the oldest.
+
+    When 'lower_bound' is given, paging stops once 'extra_pages' consecutive pages only contain videos older than it.
+    Uploads playlists are not always strictly ordered (premieres, scheduled or re-published videos), so a single old
+    video never stops the iteration and both upload and playlist insertion dates must be older than the bound.
+
+    :param a_channel_id: A channel ID (https://www.youtube.com/channel/[THIS PART]).
+    :param api_service: API Google Token generated with Google.py call.
+    :param lower_bound: Lower bound of time interval (naive local or aware datetime), None to retrieve everything.
+    :param extra_pages: number of consecutive pages older than 'lower_bound' to read before stopping.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :return: a generator of lists of 'playlistItems' resources (at most 50 per list).
+    """
     next_page_token = None
+    old_pages = 0
 
-    request = api_service.channels().list(id=a_channel_id, part='contentDetails').execute()
-    playlist_id = request['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+    if lower_bound is not None:
+        lower_bound = lower_bound.astimezone(tz.tzlocal())
 
-    try:
-        while 1:
+    playlist_id = api_get_channel_info(a_channel_id, api_service, channel_cache)["uploads"]
+
+    while 1:
 
-            request = api_service.playlistItems().list(playlistId=playlist_id, part=['snippet', 'contentDetails'],
-                                                       maxResults=50,
-                                                       pageToken=next_page_token).execute()
-            lst_of_videos += request['items']
-            next_page_token = request.get('nextPageToken')
+        request = api_service.playlistItems().list(playlistId=playlist_id, part=['snippet', 'contentDetails'],
+                                                   maxResults=50,
+                                                   pageToken=next_page_token).execute()
+        yield request['items']
+        next_page_token = request.get('nextPageToken')
 
-            if next_page_token is None:
-                break
+        if next_page_token is None:
+            break
 
-    except HttpError:
-        pass
+        if lower_bound is not None:
+            if page_older_than(request['items'], lower_bound):
+                old_pages += 1
+
+                if old_pages >= extra_pages:
+                    break
+
+            else:
+                old_pages = 0
 
-    return lst_of_videos
 
+def page_older_than(page_items, a_date):
+    """Return a Boolean indicating if every video of a 'playlistItems' page is older than a date.
 
+    :param page_items: list of 'playlistItems' resources.
+    :param a_date: an aware datetime.datetime object.
+    :return: True if no video in the page was uploaded (or added to the playlist) after 'a_date'.
+    """
+    for video in page_items:
+        dates = [video["snippet"].get("publishedAt"), video["contentDetails"].get("videoPublishedAt")]
+
+        for a_video_date in dates:
+            if a_video_date is not None and datetime.strptime(a_video_date, "%Y-%m-%dT%H:%M:%S%z") >= a_date:
+                return False
+
+    return True
+
+
+@mt.timed("function")
 def api_isin_playlist(a_playlist_id, a_video_id, api_service):
     """Define if a video is in a YouTube playlist or not.
 
@@ -97,167 +175,307 @@ def api_isin_playlist(a_playlist_id, a_video_id, api_service):
     :param api_service: API Google Token generated with Google.py call.
     :return: A boolean to say if the video is in the playlist or not.
     """
+    if a_video_id not in api_get_playlist_video_ids(a_playlist_id, api_service):
+        print(f"Oops, the video \" https://www.youtube.com/watch?v={a_video_id} \" is not here yet!")
+        return False
+
+    return True
+
+
+@mt.timed("function")
+def api_get_playlist_video_ids(a_playlist_id, api_service):
+    """Get IDs of all videos in a YouTube playlist.
+
+    :param a_playlist_id: A playlist ID (https://www.youtube.com/watch?v=[VIDEO ID]&list=[THIS PART]).
+    :param api_service: API Google Token generated with Google.py call.
+    :return: the set of video IDs in the playlist.
+    """
     lst_of_videos = []
     next_page_token = None
 
     while 1:
 
-        success = False
-
-        while not success:
-            try:
-                request = api_service.playlistItems().list(playlistId=a_playlist_id,
-                                                           part=['snippet', 'contentDetails'],
-                                                           maxResults=50,
-                                                           pageToken=next_page_token).execute()
-                lst_of_videos += request['items']
-                next_page_token = request.get('nextPageToken')
-                success = True
-
-            except ConnectionResetError:
-                print("ConnectionResetError: let me sleep for 5 seconds, just enough time to recover...")
-                sleep(5)
-
-            except HttpError:
-                print("OUT OF GOOGLE CREDIT - COME BACK LATER")
-                success = True
+        request = api_service.playlistItems().list(playlistId=a_playlist_id,
+                                                   part=['snippet', 'contentDetails'],
+                                                   maxResults=50,
+                                                   pageToken=next_page_token).execute()
+        lst_of_videos += request['items']
+        next_page_token = request.get('nextPageToken')
 
         if next_page_token is None:
             break
 
-    id_set = {video['contentDetails']['videoId'] for video in lst_of_videos}
+    return {video['contentDetails']['videoId'] for video in lst_of_videos}
 
-    # print(id_set)
 
-    if a_video_id not in id_set:
-        print(f"Oops, the video \" https://www.youtube.com/watch?v={a_video_id} \" is not here yet!")
-        return False
+@mt.timed("function")
+def api_get_videos_duration(list_videos, api_service, batch_size=50, duration_cache=None):
+    """Get the duration of videos, 50 videos per request and several requests per HTTP batch. Responses are joined
+    with videos on their ID: the API leaves deleted and private videos out of its responses.
 
-    return True
+    :param list_videos: A list of videos ((video ID, upload date, channel ID, title) tuples, see 'video_selection') or
+                        video IDs.
+    :param api_service: API Google Token generated with Google.py call.
+    :param batch_size: number of 50 IDs requests sent in one HTTP batch. (Corresponding with 'bt.execute_batch')
+    :param duration_cache: duration cache dictionary (see 'duration_cache.py'): cached videos are not requested, found
+                           ones are added to it. None to request every video.
+    :return: a 'rs.VideoRecords' store of the videos with their duration, sorted by upload date. Iterating over it
+             gives (video, duration, date) tuples, IDs of videos not returned by the API are in its 'missing' list.
+    """
+    records = rs.VideoRecords()
+    videos = {}  # Video ID -> video tuple, each video once.
 
+    for video in list_videos:
+        video = video if isinstance(video, tuple) else (video,)
+        videos.setdefault(video[0], video)
 
-def api_get_videos_duration(list_videos, api_service):
-    """Get the duration of 50 videos at once.
+    to_request = []
 
-    :param list_videos: A list of video IDs, maximum size 50.
-    :param api_service: API Google Token generated with Google.py call.
-    :return: a dictionary associating video id and duration of said video.
-    """
-    if list_videos:
-        durations = []
-        dates = []
+    for video_id, video in videos.items():
+        cached = dc.get_duration(duration_cache, video_id)
 
-        if isinstance(list_videos[0], tuple):
-            chunks50 = divide_chunks([video[0] for video in list_videos], 50)
+        if cached is None:
+            to_request.append(video_id)
 
         else:
-            chunks50 = divide_chunks([video for video in list_videos], 50)
+            records.append(video_id, cached[0], video[2] if len(video) > 2 else None,
+                           video[3] if len(video) > 3 else None, cached[1])
+
+    mt.metrics.count("durations", "cached", len(videos) - len(to_request))
+    mt.metrics.count("durations", "requested", len(to_request))
+
+    if to_request:
+        chunks50 = divide_chunks(to_request, 50)
+        items = {}  # Video ID -> 'videos' resource
+
+        def store_response(chunk_idx, response, exception):
+            if exception is not None:
+                raise exception
 
-        # print(chunks50)
+            items.update((item["id"], item) for item in response["items"])
 
-        for chunk in chunks50:
-            request = api_service.videos().list(id=",".join(chunk),
-                                                part=['contentDetails', 'snippet'],
-                                                maxResults=50).execute()
+        requests = [(chunk_idx, api_service.videos().list(id=",".join(chunk), part=['contentDetails', 'snippet'],
+                                                          maxResults=50))
+                    for chunk_idx, chunk in enumerate(chunks50)]
+        bt.execute_batch(api_service, requests, store_response, batch_size=batch_size)
 
-            # print(request)
+        for video_id in to_request:
+            video, item = videos[video_id], items.get(video_id)
 
-            durations += [parse_duration(element["contentDetails"]["duration"]) for element in request["items"]]
-            dates += [element["snippet"]["publishedAt"] for element in request["items"]]
+            if item is None:  # Deleted or private since it was listed in its channel uploads.
+                records.missing.append(video_id)
+                continue
 
-        # print(len(list_videos), len(durations), len(dates))
+            published = rs.epoch(item["snippet"]["publishedAt"])
+            seconds = int(parse_duration(item["contentDetails"]["duration"]).total_seconds())
+            records.append(video_id, published, video[2] if len(video) > 2 else None,
+                           video[3] if len(video) > 3 else None, seconds)
 
-        id_and_duration = sorted([(video_id, durations[idx], datetime.strptime(dates[idx], "%Y-%m-%dT%H:%M:%S%z"))
-                                  for idx, video_id in enumerate(list_videos)], key=lambda tup: tup[2])
+            if duration_cache is not None:
+                dc.set_duration(duration_cache, video_id, published, seconds)
 
-        return id_and_duration
+        mt.metrics.count("durations", "missing", len(records.missing))
 
-    return []
+    records.sort_by_date()
 
+    return records
 
-def api_get_channel_name(channel_id, api_service):
-    """Get the duration of 50 videos at once.
+
+@mt.timed("function")
+def api_get_channel_name(channel_id, api_service, channel_cache=None):
+    """Get the name of a YouTube channel.
 
     :param channel_id: A YouTube channel ID.
     :param api_service: API Google Token generated with Google.py call.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
     :return: the channel name (characters string).
     """
-    request = api_service.channels().list(id=channel_id, part='snippet')
-    success = False
+    return api_get_channel_info(channel_id, api_service, channel_cache)["title"]
 
-    response = None
 
-    while not success:
+@mt.timed("function")
+def api_get_channel_info(channel_id, api_service, channel_cache=None):
+    """Get the uploads playlist ID and the name of a YouTube channel, from the cache if possible.
 
-        try:
-            response = request.execute()
-            success = True
+    :param channel_id: A YouTube channel ID.
+    :param api_service: API Google Token generated with Google.py call.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :return: a dictionary with the uploads playlist ID ("uploads") and the channel name ("title").
+    """
+    if channel_cache is not None:
+        entry = cc.get_entry(channel_cache, channel_id)
+
+        if entry:
+            return entry
 
-        except ConnectionResetError:
-            print("ConnectionResetError: let me sleep for 5 seconds, just enough time to recover...")
-            sleep(5)
+    response = api_service.channels().list(id=channel_id, part='snippet,contentDetails').execute()
+    item = response['items'][0]
+    info = {"uploads": item['contentDetails']['relatedPlaylists']['uploads'], "title": item['snippet']['title']}
 
-    name = response['items'][0]['snippet']['title']
+    if channel_cache is not None:
+        return cc.set_entry(channel_cache, channel_id, **info)
 
-    return name
+    return info
 
 
-def api_add_to_playlist(playlist_id, videos_list, api_service, delay=True):
-    """Add selected video to a playlist.
+@mt.timed("function")
+def api_prefetch_channels_info(channel_ids_list, api_service, channel_cache, force_refresh=False):
+    """Fill the channel cache for a list of channels, requesting missing or expired ones 50 at once.
+
+    :param channel_ids_list: list of YouTube channel IDs.
+    :param api_service: API Google Token generated with Google.py call.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py').
+    :param force_refresh: if True, request every channel even if its cache entry is still fresh.
+    :return: number of 'channels().list' requests made.
+    """
+    missing = [channel_id for channel_id in channel_ids_list
+               if not cc.get_entry(channel_cache, channel_id, force_refresh=force_refresh)]
+    chunks50 = divide_chunks(missing, 50)
+
+    for chunk in chunks50:
+        response = api_service.channels().list(id=",".join(chunk), part='snippet,contentDetails',
+                                               maxResults=50).execute()
+
+        for item in response['items']:
+            cc.set_entry(channel_cache, item['id'], uploads=item['contentDetails']['relatedPlaylists']['uploads'],
+                         title=item['snippet']['title'])
+
+    return len(chunks50)
+
+
+@mt.timed("function")
+def api_add_to_playlist(playlist_id, videos_list, api_service, delay=True, playlist_content=None, batch_size=1,
+                        journal=None, save_not_added=True, not_added_directory=NOT_ADDED_DIRECTORY):
+    """Add selected video to a playlist. Videos already in the playlist are skipped.
 
     :param playlist_id: A specified playlist ID.
     :param videos_list: List of videos (ID, duration, date)
     :param api_service: API Google Token generated with Google.py call.
-    :param delay: if True, will input delay between videos' additions into playlist.
-    :return: small text for logs.
+    :param delay: if True, start with a delay between insertions, then adapt it to rate-limit errors (see
+                  'bt.AdaptivePacer'). Otherwise, only pause after rate-limit errors.
+    :param playlist_content: set of video IDs already in the playlist, updated with added videos. If None, it is
+                             requested once to the API (see 'api_get_playlist_video_ids' function).
+    :param batch_size: number of insertions sent in one HTTP batch. The API may process a batch in any order, so keep
+                       1 to add videos in the order of 'videos_list'.
+    :param journal: execution journal (see 'checkpoint.py'). Videos already added according to it are skipped, newly
+                    added videos are written in it.
+    :param save_not_added: if True, write videos not added in the 'NOT_ADDED_<playlist ID>.json' file (see
+                           'write_not_added'), replacing the previous one.
+    :param not_added_directory: directory of the 'NOT_ADDED_<playlist ID>.json' files.
+    :return: a dictionary containing small text for logs, the list of videos not added, to add later ("not_added"),
+             and the list of videos which can't be added at all ("failed": deleted, private, ...).
     """
     added = set()
     not_added = set()
+    failed = set()  # Permanent errors: logged once, never sent again.
+
+    unavailable = None
+
+    if videos_list and playlist_content is None:
+        try:
+            playlist_content = api_get_playlist_video_ids(playlist_id, api_service)
 
-    if videos_list:
-        to_print = f"Estimated cost: {len(videos_list) * 50}\n"
+        except tp.UNAVAILABLE_ERRORS as error:  # Without the playlist content, nothing is added (duplicates).
+            unavailable = f"Playlist content unavailable, videos deferred: {error}\n"
+
+    if unavailable:
+        to_print = unavailable
         print(to_print)
 
-        for cpt, video in enumerate(videos_list):
-            video_id = video[0]
+    elif videos_list:
+        if journal is not None:
+            already_added = journal.inserted(playlist_id)
+            videos_list = [video for video in videos_list if video[0] not in already_added]
 
-            the_body = {"snippet": {"playlistId": playlist_id,
-                                    "resourceId": {"videoId": video_id, "kind": "youtube#video"}}}
-            if delay:
-                sleep(1 + (cpt - 1) / 10)
+        positions = {video[0]: cpt + 1 for cpt, video in enumerate(videos_list)}
+        to_insert = [video_id for video_id in positions if video_id not in playlist_content]
+        errors = []
 
-            success = False
+        to_print = f"Estimated cost: {len(to_insert) * 50}\n"
+        print(to_print)
 
-            while not success:
-                print(f"{cpt + 1:02d}. Adding https://www.youtube.com/watch?v={video_id}...")
+        for video_id in positions:
+            if video_id in playlist_content:
+                print(f"{positions[video_id]:02d}. https://www.youtube.com/watch?v={video_id} already in the playlist.")
+                added.add(video_id)
+
+        def insert_callback(video_id, response, exception):
+            if exception is None and (response.get("snippet", {}).get("resourceId", {}).get("videoId") == video_id
+                                      or api_isin_playlist(playlist_id, video_id, api_service)):
+                # Unexpected answers are checked on the playlist itself.
+                print(f"{positions[video_id]:02d}. https://www.youtube.com/watch?v={video_id} added.")
+                playlist_content.add(video_id)
+                added.add(video_id)
+
+                if journal is not None:
+                    journal.video_inserted(playlist_id, video_id)
+
+            elif exception is not None and tp.classify_error(exception) == 'permanent':
+                error_message = f"Video can't be added, skipped: https://www.youtube.com/watch?v={video_id} " \
+                                f"({exception})"
+                failed.add(video_id)
+                print(error_message)
+                errors.append(error_message)
 
-                try:
-                    api_service.playlistItems().insert(part="snippet", body=the_body).execute()
-                    success = api_isin_playlist(playlist_id, video_id, api_service)
+            else:
+                error_message = f"Problem encountered with this video: https://www.youtube.com/watch?v={video_id}"
+                not_added.add(video_id)
+                print(error_message)
+                errors.append(error_message)
 
-                except ConnectionResetError:
-                    print("ConnectionResetError: let me sleep for 5 seconds, just enough time to recover...")
-                    sleep(5)
+        requests = []
 
-                except HttpError:
+        for video_id in to_insert:
+            the_body = {"snippet": {"playlistId": playlist_id,
+                                    "resourceId": {"videoId": video_id, "kind": "youtube#video"}}}
+            requests.append((video_id, api_service.playlistItems().insert(part="snippet", body=the_body)))
+
+        pacer = bt.AdaptivePacer(initial_delay=1.0 if delay else 0.0)
+
+        try:
+            bt.execute_batch(api_service, requests, insert_callback, batch_size=batch_size, pacer=pacer)
 
-                    error_message = f"Problem encountered with this video: https://www.youtube.com/watch?v={video_id}"
-                    not_added.add(video_id)
-                    print(error_message)
-                    to_print += error_message + '\n'
-                    success = True
+        except tp.UNAVAILABLE_ERRORS as error:
+            errors.append(f"Daily quota budget reached (or API unavailable), remaining videos deferred: {error}")
+            print(errors[-1])
 
-            added.add(video_id)
+        to_print += "".join(f"{error_message}\n" for error_message in errors)
 
     else:
         to_print = "No video in this list.\n"
 
-    to_save = list(not_added.union({video[0] for video in videos_list if video[0] not in added}))
+    to_save = list(not_added.union({video[0] for video in videos_list if video[0] not in added | failed}))
 
-    with open(f'../files/NOT_ADDED_{playlist_id}.json', 'w', encoding='utf8') as json_file:
-        json.dump(to_save, json_file, default=str, indent=4)
+    if save_not_added:
+        write_not_added(playlist_id, to_save, not_added_directory)
 
-    return to_print
+    return {"logs": to_print, "not_added": to_save, "failed": sorted(failed)}
+
+
+def write_not_added(playlist_id, video_ids, directory=NOT_ADDED_DIRECTORY):
+    """Write videos which could not be added to a playlist, to add them during the next execution.
+
+    :param playlist_id: A specified playlist ID.
+    :param video_ids: list of video IDs.
+    :param directory: directory of the 'NOT_ADDED_<playlist ID>.json' files.
+    """
+    with open(f'{directory}/NOT_ADDED_{playlist_id}.json', 'w', encoding='utf8') as json_file:
+        json.dump(video_ids, json_file, default=str, indent=4)
+
+
+def read_not_added(playlist_id, directory=NOT_ADDED_DIRECTORY):
+    """Read videos which could not be added to a playlist during the previous execution (see 'api_add_to_playlist').
+
+    :param playlist_id: A specified playlist ID.
+    :param directory: directory of the 'NOT_ADDED_<playlist ID>.json' files.
+    :return: list of (video ID,) tuples, empty if there is no such file.
+    """
+    json_path = f'{directory}/NOT_ADDED_{playlist_id}.json'
+
+    if not isfile(json_path):
+        return []
+
+    return [(video_id,) for video_id in read_json(json_path)]
 
 
 def divide_chunks(a_list, n):
@@ -277,10 +495,7 @@ def get_channel_list(json_path, category):
     :param category: a channel category to explore.
     :return: the list of channel's id in the said category.
     """
-    with open(json_path) as json_file:
-        data = json.load(json_file)
-
-    channel_ids_list = data[category]
+    channel_ids_list = cd.load_channel_db(json_path, index_path=None)["categories"][category]  # Parsed once.
 
     return channel_ids_list
 
@@ -315,75 +530,261 @@ def video_in_period(latest_date, oldest_date, video_date):
     return False
 
 
-def video_selection(api_videos_list, latest_date, oldest_date, channel_id, api_service):
+def video_selection(api_videos_list, latest_date, oldest_date, channel_id, api_service, channel_cache=None,
+                    columnar=None):
     """Give videos uploaded by a channel in a specified period and the number of videos upload in a year.
 
     :param api_videos_list: list of videos got from 'api_get_channel_videos' function.
     :param latest_date: Upper bound of time interval. (Corresponding with 'video_in_period' function)
     :param oldest_date: Lower bound of time interval. (Corresponding with 'video_in_period' function)
-    :param channel_id: YouTube channel ID, in case there is no video on the channel yet.
+    :param channel_id: YouTube channel ID, kept with each selected video (and used if there is no video on the channel
+                       yet).
     :param api_service: API Google Token generated with Google.py call, in case there is no video on the channel yet.
-    :return: a dictionary containing selected videos and number of video uploaded in a year.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), in case there is no video on the channel yet.
+    :param columnar: if True, select videos in bulk with 'columnar.py', if False, video by video. By default, columnar
+                     selection is used from 'COLUMNAR_MIN_VIDEOS' videos.
+    :return: a dictionary containing selected videos ((video ID, upload date, channel ID, title) tuples) and number of
+             video uploaded in a year.
     """
     if api_videos_list:
         channel_name = api_videos_list[0]["snippet"]["channelTitle"]  # Get the channel name to write into logs.
+        a_year_ago = datetime.today() - relativedelta(years=1)
+
+        if columnar is None:
+            columnar = len(api_videos_list) >= COLUMNAR_MIN_VIDEOS
+
+        if columnar:
+            selection_list, a_year_ago_count, missing = cl.select_videos(cl.videos_frame(api_videos_list),
+                                                                         latest_date, oldest_date, a_year_ago,
+                                                                         channel_id=channel_id)
+
+            for video_id in missing:
+                print(f'Can\'t find this video: https://www.youtube.com/watch?v={video_id}')
+
+            return {"selection_list": selection_list, "a_year_ago_count": a_year_ago_count,
+                    "channel_name": channel_name}
 
         selection_list = []
         a_year_ago_count = int()
-        a_year_ago = datetime.today() - relativedelta(years=1)
 
-        # cpt_test = 1
+        # Bounds converted once into epoch seconds (naive dates being local ones), compared with integers.
+        latest_epoch = latest_date.timestamp()
+        oldest_epoch = oldest_date.timestamp()
+        a_year_ago_epoch = a_year_ago.timestamp()
 
         for video in api_videos_list:
 
             try:
-                # Convert date string in ISO 8601 format into a datetime object.
-                upload_date = datetime.strptime(video["contentDetails"]["videoPublishedAt"], "%Y-%m-%dT%H:%M:%S%z")
+                # Convert date string in ISO 8601 format into epoch seconds.
+                upload_date = rs.epoch(video["contentDetails"]["videoPublishedAt"])
 
-                if video_in_period(latest_date, oldest_date, upload_date):
+                if oldest_epoch <= upload_date <= latest_epoch:
                     selection_list.append((video["snippet"]["resourceId"]["videoId"],
-                                           video["contentDetails"]["videoPublishedAt"]))
+                                           video["contentDetails"]["videoPublishedAt"], channel_id,
+                                           video["snippet"].get("title")))
 
-                if video_in_period(latest_date, a_year_ago, upload_date):
+                if a_year_ago_epoch <= upload_date <= latest_epoch:
                     a_year_ago_count += 1
 
             except KeyError:
                 print(f'Can\'t find this video: https://www.youtube.com/watch?v={video["contentDetails"]["videoId"]}')
 
-            # cpt_test += 1
-
         return {"selection_list": selection_list, "a_year_ago_count": a_year_ago_count, "channel_name": channel_name}
 
-    return {"selection_list": [], "a_year_ago_count": 0, "channel_name": api_get_channel_name(channel_id, api_service)}
+    return {"selection_list": [], "a_year_ago_count": 0,
+            "channel_name": api_get_channel_name(channel_id, api_service, channel_cache)}
+
+
+@mt.timed("function")
+def crawl_channel(channel_id, latest_date, oldest_date, lower_bound, api_service, channel_cache=None):
+    """Retrieve and select videos of one channel (see 'api_get_channel_videos' and 'video_selection' functions).
+
+    :param channel_id: a YouTube channel ID.
+    :param latest_date: Upper bound of time interval.
+    :param oldest_date: Lower bound of time interval.
+    :param lower_bound: date after which channel's history is no longer needed, None to retrieve everything.
+    :param api_service: API Google Token generated with Google.py call.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :return: a tuple with the list of retrieved videos and the 'video_selection' dictionary, with crawl duration in
+             seconds and newest upload date (see 'ac.newest_upload') (None if the channel is deferred because the daily
+             quota budget is reached, or because the API keeps failing, see 'transport.py').
+    """
+    start = perf_counter()
+
+    try:
+        channel_videos = api_get_channel_videos(channel_id, api_service, lower_bound=lower_bound,
+                                                channel_cache=channel_cache)
+        channel_selection = video_selection(channel_videos, latest_date, oldest_date, channel_id, api_service,
+                                            channel_cache=channel_cache)
+
+    except (*tp.UNAVAILABLE_ERRORS, HttpError) as error:
+        print(f"Channel {channel_id} deferred: {error}")
+        return [], None
+
+    channel_selection["seconds"] = round(perf_counter() - start, 3)
+    channel_selection["last_upload"] = ac.newest_upload(channel_videos)
+
+    return channel_videos, channel_selection
 
 
-def get_all_videos(channel_ids_list, latest_date, oldest_date, api_service):
-    """Get all videos from all channels in selected category. The function will also open in a web browser inactive
-    YouTube channel link (one year without a video).
+def iter_crawled_channels(channel_windows, latest_date, api_service, channel_cache=None, max_workers=1,
+                          service_factory=None):
+    """Crawl channels, sequentially or with a pool of threads, and yield results in the order of the channel list.
+
+    'httplib2' (used by 'googleapiclient') is not thread-safe: with several workers, each thread builds its own
+    service object with 'service_factory'.
+
+    :param channel_windows: list of (channel ID, oldest date, lower bound) tuples (see 'crawl_channel' function).
+    :param latest_date: Upper bound of time interval.
+    :param api_service: API Google Token generated with Google.py call, used when crawling sequentially.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :param max_workers: maximum number of channels crawled at the same time.
+    :param service_factory: function without argument returning a new API service, mandatory if 'max_workers' > 1.
+    :return: a generator of 'crawl_channel' results.
+    """
+    if max_workers <= 1:
+        for channel_id, oldest_date, lower_bound in channel_windows:
+            yield crawl_channel(channel_id, latest_date, oldest_date, lower_bound, api_service, channel_cache)
+        return
+
+    if service_factory is None:
+        raise ValueError("A 'service_factory' is needed to crawl channels with several workers.")
+
+    thread_data = threading.local()
+
+    def worker(channel_window):
+        if not hasattr(thread_data, 'service'):
+            thread_data.service = service_factory()
+
+        return crawl_channel(channel_window[0], latest_date, channel_window[1], channel_window[2],
+                             thread_data.service, channel_cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Results are yielded in the order of submitted channels, and at most 2 * 'max_workers' channels are crawled
+        # ahead of the consumer: a slow consumer (see 'pipeline.py') does not let raw results pile up in memory.
+        pending = deque()
+
+        for channel_window in channel_windows:
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+
+            pending.append(executor.submit(worker, channel_window))
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_all_videos(channel_ids_list, latest_date, oldest_date, api_service, windowed=True, channel_cache=None,
+                   force_refresh=False, video_index=None, max_workers=1, service_factory=None, journal=None,
+                   run_log=None, on_selected=None, activity=None):
+    """Get all videos from all channels in selected category. Inactive channels (no video uploaded for a year, see
+    'activity.py') are listed in the returned dictionary.
 
     :param channel_ids_list: list of channel from 'get_channel_list'.
     :param latest_date: Upper bound of time interval. (Corresponding with 'video_in_period' function)
     :param oldest_date: Lower bound of time interval. (Corresponding with 'video_in_period' function)
     :param api_service: API Google Token generated with Google.py call.
-    :return: a dictionary containing list of video's id and information to write into log.
+    :param windowed: if True, only retrieve the part of channels' history needed by 'video_selection' (selection
+                     period, or the first page for the newest upload) instead of the whole history.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None to always request the API.
+    :param force_refresh: if True, request channel metadata again even if cached.
+    :param video_index: local video index (see 'video_index.py'). If given, channels already processed are only
+                        explored after their own high-water mark instead of 'oldest_date', and videos already added to
+                        a playlist are not selected again.
+    :param max_workers: maximum number of channels crawled at the same time. (Corresponding with
+                        'iter_crawled_channels' function)
+    :param service_factory: function without argument returning a new API service, one per worker thread.
+    :param journal: execution journal (see 'checkpoint.py'). Channels already in it are not crawled again, newly
+                    crawled channels are added to it.
+    :param run_log: execution log (see 'run_log.py'), streamed channel after channel.
+    :param on_selected: function called with the list of videos selected from each active channel, as soon as the
+                        channel is processed (it may block, see 'pipeline.py'). Videos are then handed over and not
+                        kept in the returned list.
+    :param activity: channel activity store (see 'activity.py'), updated with newest uploads, None to only rely on
+                     the crawled videos.
+    :return: a dictionary containing list of video's id, information to write into log and inactive channels.
     """
-    log_str = str()
+    log_parts = []
     all_video_ids = []
+    nb_selected = 0
     ignored_report = []
+    inactive_report = []
+    deferred_channels = []
 
     nb_channels = len(channel_ids_list)
+    a_year_ago = datetime.today() - relativedelta(years=1)
+    insert_cost = qt.UNIT_COSTS['playlistItems.insert']
+    insert_budget = qt.insert_budget(api_service)
+
+    if channel_cache is not None:
+        try:
+            api_prefetch_channels_info(channel_ids_list, api_service, channel_cache, force_refresh=force_refresh)
+
+        except tp.UNAVAILABLE_ERRORS as error:  # Missing channels are requested one by one (or deferred).
+            print(f"Channel metadata not prefetched: {error}")
+
+    channel_windows = []
+
+    for channel_id in channel_ids_list:
+        channel_oldest_date = oldest_date
+        lower_bound = oldest_date if windowed else None  # The first page is always read: activity is known.
+
+        if video_index is not None and vi.get_watermark(video_index, channel_id) is not None:
+            # The one-year activity count is kept by the index, no need to go further than the watermark.
+            channel_oldest_date = vi.get_watermark(video_index, channel_id)
+            lower_bound = channel_oldest_date if windowed else None
+
+        channel_windows.append((channel_id, channel_oldest_date, lower_bound))
+
+    replayed = journal.crawled_channels() if journal is not None else {}
+    crawled_channels = iter_crawled_channels([window for window in channel_windows if window[0] not in replayed],
+                                             latest_date, api_service, channel_cache=channel_cache,
+                                             max_workers=max_workers, service_factory=service_factory)
 
     for count, channel_id in enumerate(channel_ids_list):
-        channel_selection = video_selection(api_get_channel_videos(channel_id, api_service), latest_date, oldest_date,
-                                            channel_id, api_service)
+        if channel_id in replayed:
+            channel_videos, channel_selection = replayed[channel_id]
+
+        else:
+            channel_videos, channel_selection = next(crawled_channels)
+
+            if journal is not None and channel_selection is not None:
+                journal.channel_crawled(channel_id, channel_videos, channel_selection)
+
+        if channel_selection is None:
+            deferred_channels.append(channel_id)
+            to_print = f"Channel {count + 1} out of {nb_channels} ({(count + 1) * 100 / nb_channels:.2f} %).\n\n" \
+                       f"Channel ID: {channel_id}\n" \
+                       f"STATUS: DEFERRED (daily quota budget reached or API unavailable)\n{'/' * 50}\n"
+            log_parts.append(f"{to_print}\n")
+            print(to_print)
+
+            if run_log is not None:
+                run_log.write(log_parts[-1])
+                run_log.event("channel", channel_id=channel_id, status="DEFERRED", quota_used=quota_used(api_service))
+
+            continue
+
+        if video_index is not None:
+            vi.add_seen_videos(video_index, channel_id, channel_videos)
+            channel_selection["selection_list"] = [video for video in channel_selection["selection_list"]
+                                                   if not vi.is_routed(video_index, channel_id, video[0])]
+            channel_selection["a_year_ago_count"] = vi.count_since(video_index, channel_id, a_year_ago)
+
+        last_upload = channel_selection.get("last_upload")
+
+        if activity is not None:  # Channels without upload in the crawled period keep their known newest upload.
+            last_upload = ac.record_upload(activity, channel_id, last_upload)
 
         to_print = f"Channel {count + 1} out of {nb_channels} ({(count + 1) * 100 / nb_channels:.2f} %).\n\n" \
                    f"Channel ID: {channel_id}\n" \
                    f"Channel Name: {channel_selection['channel_name']}\n\n" \
                    f"Number of selected videos: {len(channel_selection['selection_list'])}\n"
 
-        if channel_id in channels_ignored or len(channel_selection['selection_list']) * 50 > 2000:
-            to_print += f"Number of videos uploaded in a year: {channel_selection['a_year_ago_count']}\n" \
+        if channel_id in channels_ignored or \
+                len(channel_selection['selection_list']) * insert_cost > insert_budget * MAX_CHANNEL_SHARE:
+            status = "IGNORED"
+            to_print += f"Last upload: {last_upload}\n" \
                         f"STATUS: IGNORED\n"
             if channel_id in channels_ignored:
                 ignored_report.append({'channel_id': channel_id,
@@ -396,48 +797,91 @@ def get_all_videos(channel_ids_list, latest_date, oldest_date, api_service):
                                        'cause': 'To many videos selected',
                                        'n': len(channel_selection['selection_list'])})
 
-        elif channel_selection["a_year_ago_count"] != 0:
-            to_print += f"Number of videos uploaded in a year: {channel_selection['a_year_ago_count']}\n" \
+        elif channel_selection["a_year_ago_count"] != 0 or ac.is_active(last_upload):
+            status = "ACTIVE"
+            to_print += f"Last upload: {last_upload}\n" \
                         f"STATUS: ACTIVE\n"
-            all_video_ids += channel_selection["selection_list"]
+            nb_selected += len(channel_selection["selection_list"])
+
+            if on_selected is not None:
+                on_selected(channel_selection["selection_list"])
+
+            else:
+                all_video_ids += channel_selection["selection_list"]
+
+            if video_index is not None:
+                vi.set_watermark(video_index, channel_id, latest_date)
 
         else:
-            to_print += "Number of videos uploaded in a year: 0\n" \
+            status = "INACTIVE"
+            to_print += f"Last upload: {last_upload}\n" \
                         "STATUS: INACTIVE\n"
 
             if channel_id not in channels_url_exception:
-                # Ignore exceptions.
-                webbrowser.open(f"https://www.youtube.com/channel/{channel_id}")
+                # Ignore exceptions. Reported once, after all channels (see 'activity.write_inactive_report').
+                inactive_report.append({'channel_id': channel_id, 'channel_name': channel_selection['channel_name'],
+                                        'last_upload': last_upload})
 
-        to_print += f"\nTotal number of videos selected so far: {len(all_video_ids)}\n{'/' * 50}\n"
+            if video_index is not None:
+                vi.set_watermark(video_index, channel_id, latest_date)
 
-        log_str += f"{to_print}\n"
-
-        for ignored_elem in ignored_report:
-            log_str += f'Channel "{ignored_elem["channel_name"]}"' \
-                       f' ({ignored_elem["channel_id"]}) ignored - ' \
-                       f'Cause: {ignored_elem["cause"]} - N_Videos: {ignored_elem["n"]}\n'
+        to_print += f"\nTotal number of videos selected so far: {nb_selected}\n{'/' * 50}\n"
 
+        log_parts.append(f"{to_print}\n")
         print(to_print)
 
-    if len(all_video_ids) * 50 > 8000:
-        print("Warning! API cost could be higher than 8000.")
-        log_str += "\nWarning! API cost could be higher than 8000."
+        if run_log is not None:
+            run_log.write(log_parts[-1])
+            run_log.event("channel", channel_id=channel_id, channel_name=channel_selection['channel_name'],
+                          status=status, selected=len(channel_selection['selection_list']),
+                          a_year_ago_count=channel_selection['a_year_ago_count'], last_upload=last_upload,
+                          seconds=channel_selection.get('seconds'), quota_used=quota_used(api_service))
+
+    summary = "".join(f'Channel "{ignored_elem["channel_name"]}"'
+                      f' ({ignored_elem["channel_id"]}) ignored - '
+                      f'Cause: {ignored_elem["cause"]} - N_Videos: {ignored_elem["n"]}\n'
+                      for ignored_elem in ignored_report)  # Once, after all channels.
+    summary += "".join(f'Channel "{inactive_elem["channel_name"]}" ({inactive_elem["channel_id"]}) inactive - '
+                       f'Last upload: {inactive_elem["last_upload"]}\n' for inactive_elem in inactive_report)
+
+    if nb_selected * insert_cost > insert_budget * WARNING_SHARE:
+        print(f"Warning! API cost could be higher than {insert_budget * WARNING_SHARE:.0f}.")
+        summary += f"\nWarning! API cost could be higher than {insert_budget * WARNING_SHARE:.0f}."
+
+    log_parts.append(summary)
+
+    if run_log is not None:
+        run_log.write(summary)
+        run_log.event("crawl", channels=nb_channels, selected=nb_selected, ignored=ignored_report,
+                      inactive=len(inactive_report), deferred=len(deferred_channels),
+                      quota_used=quota_used(api_service))
+
+    return {"all_video_ids": all_video_ids, "log_str": "".join(log_parts), "deferred_channels": deferred_channels,
+            "inactive_channels": inactive_report}
+
 
-    return {"all_video_ids": all_video_ids, "log_str": log_str}
+def quota_used(api_service):
+    """Get the quota units spent today, if the service is metered.
+
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped by 'qt.QuotaMeter'.
+    :return: number of units, None if the service is not metered.
+    """
+    usage = qt.usage_of(api_service)
+    return usage.used if usage is not None else None
 
 
 def duration_filter(ids_and_durations, minute_threshold):
     """Sort short and long videos in two list.
 
-    :param ids_and_durations: dictionary of video's id and associated duration (from 'api_get_videos_duration').
+    :param ids_and_durations: 'rs.VideoRecords' store (from 'api_get_videos_duration'), or list of (video, duration,
+                              date) tuples.
     :param minute_threshold: minimum number of minutes to consider a video as a long video (10 minutes by default).
     :return: dictionary separating short and long videos.
     """
-    delta_sec = minute_threshold * 60  # Threshold passed in second to fit 'timedelta'.
-
-    short_videos = [video[0] for video in ids_and_durations if video[1] <= timedelta(seconds=delta_sec)]
-    long_videos = [video[0] for video in ids_and_durations if video[1] > timedelta(seconds=delta_sec)]
+    records = rs.VideoRecords.from_duration_list(ids_and_durations)
+    short_indexes, long_indexes = records.split_by_duration(minute_threshold * 60)  # Integer seconds comparisons.
+    short_videos = [records.video(idx) for idx in short_indexes]
+    long_videos = [records.video(idx) for idx in long_indexes]
 
     to_print = f"- END OF THE RETRIEVING PROCESS -\n\n" \
                f"Number of short videos: {len(short_videos)}\n" \
@@ -450,15 +894,17 @@ def duration_filter(ids_and_durations, minute_threshold):
     return {"short_videos": short_videos, "long_videos": long_videos, "logs": to_print}
 
 
-def clean_logs(directory):
-    """Clean oldest log files.
+def clean_logs(directory, keep=10):
+    """Clean oldest log files, both human-readable and structured ones (see 'run_log.py').
 
     :param directory: Logs folder path.
+    :param keep: number of most recent executions whose logs are kept.
     :return: short string saying if some logs were removed or not.
     """
     to_log = str()
-    files = [{"file_name": f"{directory}/{file}", "creation_date": getctime(f"{directory}/{file}")} for file in
-             listdir(f"{directory}") if isfile(join(f"{directory}", file))][:-9]
+    file_names = sorted(file for file in listdir(f"{directory}") if isfile(join(f"{directory}", file)))
+    old_runs = sorted({splitext(file)[0] for file in file_names})[:-keep]  # Names are sortable dates.
+    files = [{"file_name": f"{directory}/{file}"} for file in file_names if splitext(file)[0] in old_runs]
 
     if not files:
 
@@ -476,66 +922,363 @@ def clean_logs(directory):
 
 
 def execution(path_channel_data_base_json, path_playlist_ids_json, latest_date, oldest_date, api_service,
-              selected_category, short_vid_index, long_vid_index, min_dur_long_vid=10, delay=True):
+              selected_category=None, short_vid_index=None, long_vid_index=None, min_dur_long_vid=10, delay=True,
+              windowed=True, channel_cache_path=cc.DEFAULT_PATH, force_refresh=False, video_index_path=vi.DEFAULT_PATH,
+              max_workers=1, service_factory=None, dry_run=False, checkpoint_path=ck.DEFAULT_PATH, resume=False,
+              logs_directory='../Logs', routing_rules=None, streaming=False, profile=False,
+              activity_path=ac.DEFAULT_PATH, inactive_report_path=ac.REPORT_PATH, duration_cache_path=dc.DEFAULT_PATH,
+              channel_ids=None, channel_db_index_path=cd.DEFAULT_PATH, open_playlists=True,
+              not_added_directory=NOT_ADDED_DIRECTORY):
     """Execute the whole process.
 
-    :param path_channel_data_base_json: file path to channel data_base. (Corresponding with 'get_channel_list' function)
+    :param path_channel_data_base_json: file path to channel data_base. (Corresponding with 'read_json' function)
     :param path_playlist_ids_json: file path to playlists URL. (Corresponding with 'read_json' function)
     :param latest_date: Upper bound of time interval. (Corresponding with 'get_all_videos' function)
     :param oldest_date: Lower bound of time interval. (Corresponding with 'get_all_videos' function)
     :param api_service: API Google Token generated with Google.py call.
-    :param selected_category: channel's category to explore ("MUSIQUE" by default, feel free to change it).
-                              (Corresponding with 'get_channel_list' function)
+    :param selected_category: channel's category to explore ("MUSIQUE" by default, feel free to change it), ignored if
+                              'routing_rules' are given. (Corresponding with 'rt.default_rules' function)
     :param short_vid_index: key value corresponding to short videos playlist in 'playlist_ids_json' file ("music by
-                            default, feel free to change it).
+                            default, feel free to change it), ignored if 'routing_rules' are given.
     :param long_vid_index: key value corresponding to long videos playlist in 'playlist_ids_json' file ("mix" by
-                           default, feel free to change it).
+                           default, feel free to change it), ignored if 'routing_rules' are given.
     :param min_dur_long_vid: minimum duration to consider that a video is long (10 minutes by default, feel free to
-                              change it). (Corresponding with 'minute_threshold' argument in 'duration_filter' function)
+                              change it), ignored if 'routing_rules' are given.
     :param delay: if True, will input delay between videos' additions into playlist.
+    :param windowed: if True, stop retrieving channels' history once out of the needed period.
+                     (Corresponding with 'get_all_videos' function)
+    :param channel_cache_path: file path to the channel metadata cache, None to disable it.
+    :param force_refresh: if True, request channel metadata again even if cached.
+                          (Corresponding with 'get_all_videos' function)
+    :param video_index_path: file path to the local video index, None to disable it. When enabled, each channel is
+                             only explored after its own high-water mark ('oldest_date' is used for new channels).
+    :param max_workers: maximum number of channels crawled at the same time.
+                        (Corresponding with 'get_all_videos' function)
+    :param service_factory: function without argument returning a new API service, needed if 'max_workers' > 1.
+                            (Corresponding with 'get_all_videos' function) With it, durations are looked up during
+                            the crawl (see 'pl.DurationLookup').
+    :param dry_run: if True, only predict the quota cost of the execution (see 'qt.plan_execution'), without any
+                    request.
+    :param checkpoint_path: file path to the execution journal (see 'checkpoint.py'), None to disable it.
+    :param resume: if True and the last execution was interrupted, resume it from its journal, with its dates. Videos
+                   not added during previous executions ('NOT_ADDED_*.json' files) are added again anyway.
+    :param logs_directory: Logs folder path, where logs are streamed (see 'run_log.py').
+    :param routing_rules: list of routing rules (see 'routing.py'): channels of all their categories are crawled once
+                          and each video is added to every playlist whose rule it matches. By default, the rules of
+                          'selected_category', 'short_vid_index', 'long_vid_index' and 'min_dur_long_vid'.
+    :param streaming: if True, get durations of selected videos and add them to playlists during the crawl (see
+                      'pipeline.py'), instead of after it. Each chunk of 50 videos is added in chronological order.
+    :param profile: if True, capture a cProfile of the execution, saved next to the logs (see 'metrics.py').
+    :param activity_path: file path to the channel activity store (see 'activity.py'), None to disable it.
+    :param inactive_report_path: file path to the summary of inactive channels, written after the crawl, None to
+                                 write no summary.
+    :param duration_cache_path: file path to the duration cache (see 'duration_cache.py'), None to disable it.
+    :param channel_ids: IDs of the channels to crawl, among the channels of the explored categories (all of them by
+                        default, see 'scheduler.py').
+    :param channel_db_index_path: file path to the index of the channel database (see 'channel_db.py'), None to parse
+                                  the database without index. With an index, channels removed from the database since
+                                  the last execution are evicted from the local stores.
+    :param open_playlists: if True, open the playlists in the web browser at the end, after a few seconds (False for
+                           unattended executions, see 'scheduler.py').
+    :param not_added_directory: directory of the 'NOT_ADDED_<playlist ID>.json' files (videos not added, added first
+                                during the next execution).
+    :return: the quota cost prediction (see 'qt.plan_execution').
     """
     today_date = datetime.today()
+    journal = None
+    mt.metrics.reset()
+    resumed = False
+
+    if routing_rules is None:
+        routing_rules = rt.default_rules(selected_category, short_vid_index, long_vid_index, min_dur_long_vid)
+
+    categories = rt.rules_categories(routing_rules)
+    playlist_keys = rt.rules_playlists(routing_rules)
+
+    if checkpoint_path and not dry_run:
+        journal = ck.Checkpoint(checkpoint_path, resume=resume)
+        resumed = journal.resumed
+
+        if resumed:
+            latest_date, oldest_date = journal.dates()
+            print("Resuming the last interrupted execution...\n")
+
+        else:
+            journal.start(latest_date, oldest_date)
 
     log = f"Date of execution: {today_date:%Y-%m-%d %H:%M:%S}\n" \
           f"Latest Date: {latest_date:%Y-%m-%d %H:%M:%S}\n" \
           f"Oldest Date: {oldest_date:%Y-%m-%d %H:%M:%S}\n\n"
 
-    print(log)
+    # Each channel once, even if it belongs to several categories.
+    channel_db = cd.load_channel_db(path_channel_data_base_json, channel_db_index_path)
+    channel_categories = rt.channels_by_category(channel_db["categories"], categories)
+
+    if channel_ids is not None:
+        channel_ids = set(channel_ids)
+        channel_categories = {channel_id: categories_of for channel_id, categories_of in channel_categories.items()
+                              if channel_id in channel_ids}
 
-    music_channels = get_channel_list(path_channel_data_base_json, category=selected_category)
+    channels = list(channel_categories)
     playlist_ids = read_json(path_playlist_ids_json)
 
-    all_vid = get_all_videos(music_channels, latest_date=latest_date, oldest_date=oldest_date, api_service=api_service)
-    log += f'{all_vid["log_str"]}\n'
+    log += f"Categories: {', '.join(categories)} ({len(channels)} channels)\n" \
+           f"Playlists: {', '.join(playlist_keys)}\n\n"
 
-    duration_list = api_get_videos_duration(all_vid["all_video_ids"], api_service)
+    if channel_db["added"] or channel_db["removed"]:  # New channels have no high-water mark: 'oldest_date' is used.
+        log += f"Channels added to the database: {len(channel_db['added'])}\n{pformat(channel_db['added'])}\n" \
+               f"Channels removed from the database: {len(channel_db['removed'])}\n" \
+               f"{pformat(channel_db['removed'])}\n\n"
 
-    duration_filter_dict = duration_filter(duration_list, minute_threshold=min_dur_long_vid)
-    log += f'{duration_filter_dict["logs"]}\n'
+    print(log)
+
+    channel_cache = cc.load_channel_cache(channel_cache_path) if channel_cache_path else None
+    video_index = vi.load_video_index(video_index_path) if video_index_path else None
+    activity = ac.load_activity(activity_path) if activity_path else None
+    duration_cache = dc.load_duration_cache(duration_cache_path) if duration_cache_path else None
 
-    print("Adding videos into playlists...\n")
-    log += "Adding videos into playlists...\n\n"
+    if channel_db["removed"] and not dry_run:
+        evicted = cd.evict_channels(channel_db["removed"], channel_cache, video_index, activity, duration_cache,
+                                    rc.cache_of(api_service))
+        to_print = f"Entries of removed channels evicted from local stores: {evicted}\n"
+        print(to_print)
+        log += f"{to_print}\n"
 
-    log_short_vid_text = api_add_to_playlist(playlist_ids[short_vid_index], duration_filter_dict["short_videos"],
-                                             api_service, delay=delay)
-    log += f'{log_short_vid_text}\n'
+    with mt.timed("phase", "plan"):
+        plan = qt.plan_execution(channels, latest_date, oldest_date, video_index=video_index,
+                                 channel_cache=channel_cache, nb_playlists=len(playlist_keys), windowed=windowed)
+    to_print = f"Estimated quota cost: {plan['total']} units ({plan['expected_videos']} new videos expected)\n" \
+               f"{pformat(dict(plan['units']))}\n"
+
+    if qt.usage_of(api_service) is not None:
+        to_print += f"Quota left today: {qt.usage_of(api_service).remaining} units\n"
+
+    if isinstance(qt.usage_of(api_service), qt.PoolUsage):  # Insertions only spend the quota of the owner account.
+        to_print += f"Quota left for insertions: {qt.usage_of(api_service).owner_usage.remaining} units\n"
+
+    print(to_print)
+    log += f"{to_print}\n"
+
+    if dry_run:
+        return plan
+
+    run_log = rl.RunLog(logs_directory, today_date, latest_date=latest_date, oldest_date=oldest_date,
+                        categories=categories, playlists=playlist_keys, channels=len(channels), resumed=resumed,
+                        estimated_quota=plan['total'])
+    run_log.write(log)
+
+    if channel_db["added"] or channel_db["removed"]:
+        run_log.event("channel_db", added=channel_db["added"], removed=channel_db["removed"])
+    profiler = mt.start_profile() if profile else None
+
+    stream = pl.Pipeline(api_service, playlist_ids, routing_rules, channel_categories, delay=delay, journal=journal,
+                         service_factory=service_factory, run_log=run_log, duration_cache=duration_cache,
+                         not_added_directory=not_added_directory) if streaming else None
+    lookup = None
+    unavailable = None  # Quota or API error which stopped duration lookups.
+
+    if not streaming and service_factory is not None:  # Durations looked up during the crawl.
+        lookup = pl.DurationLookup(api_service, journal=journal, service_factory=service_factory,
+                                   duration_cache=duration_cache)
+
+    with mt.timed("phase", "crawl"):
+        all_vid = get_all_videos(channels, latest_date=latest_date, oldest_date=oldest_date, api_service=api_service,
+                                 windowed=windowed, channel_cache=channel_cache, force_refresh=force_refresh,
+                                 video_index=video_index, max_workers=max_workers, service_factory=service_factory,
+                                 journal=journal, run_log=run_log,
+                                 on_selected=stream.put if streaming else lookup.put if lookup is not None else None,
+                                 activity=activity)
+
+    if channel_cache is not None:
+        cc.evict_expired(channel_cache)
+        cc.save_channel_cache(channel_cache, channel_cache_path)
+
+    if activity is not None:
+        ac.save_activity(activity, activity_path)
+
+    if inactive_report_path:
+        ac.write_inactive_report(all_vid["inactive_channels"], inactive_report_path)
+
+    run_log.write('\n')
+
+    start = perf_counter()
+
+    if streaming:
+        with mt.timed("phase", "pipeline"):  # Durations and insertions not finished with the crawl.
+            streamed = stream.close()
+
+        duration_list, routed = streamed["durations"], streamed["routed"]
+        not_added = {playlist_key: set(video_ids) for playlist_key, video_ids in streamed["not_added"].items()}
+
+        if streamed["unavailable"] is not None:  # Same as below: watermarks are not moved.
+            unavailable = streamed["unavailable"]
+            run_log.write(f"Daily quota budget reached (or API unavailable) while getting durations: {unavailable}\n\n")
+            video_index = None
+
+        to_print = "- END OF THE STREAMING PROCESS -\n\n"
+
+        for playlist_key, videos in routed.items():
+            to_print += f"Number of videos for '{playlist_key}': {len(videos)} ({len(not_added[playlist_key])} not " \
+                        f"added)\n" \
+                        f'{pformat([f"https://www.youtube.com/watch?v={video[0]}" for video in videos])}\n\n'
+
+        print(to_print)
+        run_log.write(to_print)
+        run_log.event("pipeline", videos=len(duration_list), missing=duration_list.missing,
+                      first_insert=streamed["first_insert"], seconds=round(perf_counter() - start, 3),
+                      routed={playlist_key: len(videos) for playlist_key, videos in routed.items()},
+                      quota_used=quota_used(api_service))
+
+    else:
+        try:
+            if lookup is not None:
+                duration_list = lookup.close()
+
+                if lookup.unavailable is not None:
+                    raise lookup.unavailable
+
+            else:  # Durations found before an interruption are not requested again.
+                known = journal.duration_chunks() if journal is not None else {}
+                found = api_get_videos_duration([video for video in all_vid["all_video_ids"] if video[0] not in known],
+                                                api_service, duration_cache=duration_cache)
+
+                if journal is not None and found:
+                    journal.duration_chunk_found(found)
+
+                duration_list = rs.VideoRecords.merge([rs.VideoRecords.from_duration_list(sorted(
+                    (known[video[0]] for video in all_vid["all_video_ids"] if video[0] in known), key=itemgetter(2))),
+                    found])
+
+        except tp.UNAVAILABLE_ERRORS as error:
+            unavailable = error
+            # Without durations nothing is added: the video index is not saved so watermarks are not moved.
+            print(f"Daily quota budget reached (or API unavailable) before getting durations: {error}\n")
+            run_log.write(f"Daily quota budget reached (or API unavailable) before getting durations: {error}\n\n")
+            duration_list = rs.VideoRecords()
+            video_index = None
+
+        routed = rt.route_videos(duration_list, routing_rules, channel_categories)
+        to_print = "- END OF THE RETRIEVING PROCESS -\n\n"
+
+        for playlist_key, videos in routed.items():
+            to_print += f"Number of videos for '{playlist_key}': {len(videos)}\n" \
+                        f'{pformat([f"https://www.youtube.com/watch?v={video[0]}" for video in videos])}\n\n'
+
+        print(to_print)
+        run_log.write(to_print)
+        run_log.event("durations", videos=len(duration_list), missing=duration_list.missing,
+                      seconds=round(perf_counter() - start, 3),
+                      routed={playlist_key: len(videos) for playlist_key, videos in routed.items()},
+                      quota_used=quota_used(api_service))
+        mt.metrics.observe("phase", "durations", perf_counter() - start)
+
+        print("Adding videos into playlists...\n")
+        run_log.write("Adding videos into playlists...\n\n")
+
+        not_added = {}
+
+        with mt.timed("phase", "insert"):
+            for playlist_key, videos in routed.items():
+                # Videos not added during previous executions first, as they are older.
+                start = perf_counter()
+                added = api_add_to_playlist(playlist_ids[playlist_key],
+                                            read_not_added(playlist_ids[playlist_key], not_added_directory) + videos,
+                                            api_service, delay=delay, journal=journal,
+                                            not_added_directory=not_added_directory)
+                not_added[playlist_key] = set(added["not_added"])
+                run_log.write(f'{added["logs"]}\n')
+                run_log.event("insert", playlist=playlist_key, not_added=len(added["not_added"]),
+                              failed=len(added["failed"]), seconds=round(perf_counter() - start, 3),
+                              quota_used=quota_used(api_service))
+
+    if duration_list.missing:
+        to_print = f"Videos not found while getting durations (deleted or private): {len(duration_list.missing)}\n" \
+                   f"{pformat(duration_list.missing)}\n"
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+
+    if duration_cache is not None:
+        dc.save_duration_cache(duration_cache, duration_cache_path)
+
+    if video_index is not None:
+        targets = {}
+
+        for playlist_key, videos in routed.items():
+            for video in videos:
+                targets.setdefault(video[0], []).append(playlist_key)
+
+        # Videos are routed once added to all their playlists (possibly none).
+        results = {video[0]: (duration, targets.get(video[0], [])) for video, duration, _ in duration_list
+                   if not any(video[0] in not_added[playlist_key] for playlist_key in targets.get(video[0], []))}
+
+        vi.set_video_results(video_index, results)
+        vi.set_last_run(video_index, latest_date)
+
+        with mt.timed("phase", "save"):
+            vi.save_video_index(video_index, video_index_path)
+
+    if channel_db_index_path:  # Once stores are saved without removed channels.
+        cd.save_channel_db(channel_db, channel_db_index_path)
+
+    usage = qt.usage_of(api_service)
+
+    if usage is not None:
+        usage.save()
+        to_print = f"Quota used today: {usage.used} / {usage.budget} units\n" \
+                   f"{pformat(dict(usage.by_method))}\n"
+        accounts = usage.by_account() if isinstance(usage, qt.PoolUsage) else None
+
+        if accounts is not None:
+            to_print += f"By account:\n{pformat(accounts)}\n"
+
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+        run_log.event("quota", used=usage.used, budget=usage.budget, by_method=usage.by_method, accounts=accounts)
+
+    response_cache = rc.cache_of(api_service)
+
+    if response_cache is not None:
+        response_cache.save()
+        stats = response_cache.stats()
+        to_print = f"Response cache: {stats['hits']} not modified out of {stats['hits'] + stats['misses']} requests " \
+                   f"({stats['hit_ratio']:.1%}), {stats['bytes_saved'] / 1024:.0f} KiB not downloaded\n"
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+        run_log.event("response_cache", **stats)
+
+    if journal is not None and (all_vid["deferred_channels"] or unavailable is not None or any(not_added.values())):
+        to_print = "Execution interrupted (channels, durations or insertions deferred): run it again with '--resume' " \
+                   "to go on without spending quota on finished steps.\n"
+        print(to_print)
+        run_log.write(f"{to_print}\n")
+
+    elif journal is not None:
+        journal.finish()
+
+    # Timings next to the logs: "metrics" event and Prometheus text file (see 'metrics.py').
+    to_print = f"Timings:\n{mt.metrics.report()}"
+    print(to_print)
+    run_log.write(f"{to_print}\n")
+    run_log.event("metrics", **mt.metrics.summary())
+    mt.metrics.write_prometheus(f"{splitext(run_log.text_path)[0]}.prom")
 
-    log_long_vid_text = api_add_to_playlist(playlist_ids[long_vid_index], duration_filter_dict["long_videos"],
-                                            api_service, delay=delay)
-    log += f'{log_long_vid_text}\n'
+    if profiler is not None:
+        run_log.write(f"Profile (calling thread only):\n"
+                      f"{mt.stop_profile(profiler, f'{splitext(run_log.text_path)[0]}.pstats')}\n")
 
     print("- ALL DONE! -\n")
-    log += "- ALL DONE! -\n"
+    run_log.write("- ALL DONE! -\n")
 
-    log += f"\n{clean_logs('../Logs')}"
+    run_log.write(f"\n{clean_logs(logs_directory)}")
+    run_log.close()
 
-    with open(f'../Logs/Log_{today_date:%Y-%m-%d_%H.%M.%S}.txt', 'w', encoding="utf-8") as file:
-        file.write(log)
+    if open_playlists:
+        sleep(5)
 
-    sleep(5)
+        for playlist_key in playlist_keys:
+            webbrowser.open(f"https://www.youtube.com/playlist?list={playlist_ids[playlist_key]}")
 
-    webbrowser.open(f"https://www.youtube.com/playlist?list={playlist_ids[short_vid_index]}")
-    webbrowser.open(f"https://www.youtube.com/playlist?list={playlist_ids[long_vid_index]}")
+    return plan
 
 
 " - MAIN PROGRAM -"
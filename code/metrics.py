@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import wrapping as wr
+
+from time import perf_counter
+
+"""- SCRIPT INFORMATION -
+
+@file_name: metrics.py
+@author: Dylan "dyl-m" Monfret
+
+Timing instrumentation of an execution: number of calls and latency histograms, grouped by family.
+
+- "request": API round trips by "resource.method" ("batch" for a batch request), measured by 'TimedService' which wraps
+  the service object generated with Google.py (below retries and cache, so each attempt is measured);
+- "function": 'get_videos.api_*' functions, decorated with 'timed';
+- "phase": phases of 'get_videos.execution' (plan, crawl, durations, insert, save);
+- "wait": sleeps, between insertions ("pacer", see 'batching.AdaptivePacer') and before retries ("retry", see
+  'transport.Transport').
+
+Requests sent inside batch requests are counted ("batched" counters), their latency being the one of their batch.
+Metrics are exported at the end of an execution as a "metrics" event of the structured log and as a Prometheus text
+file ('Log_<date>.prom') next to it. A cProfile capture can be added ('Log_<date>.pstats', see 'start_profile').
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)  # Upper bounds, seconds.
+PREFIX = 'youtube_playlists'  # Prometheus metric names prefix.
+
+" - LOCAL CLASSES - "
+
+
+class Histogram:
+    """Number of observations, their sum, their maximum and their distribution in 'BUCKETS'."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # Last one: above the highest bound.
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[next((idx for idx, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))] += 1
+
+    def summary(self):
+        return {"count": self.count, "seconds": round(self.total, 3),
+                "mean": round(self.total / self.count, 4) if self.count else 0.0, "max": round(self.max, 4),
+                "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], self.buckets))}
+
+
+class Timer:
+    """Measure the duration of a block ('with' statement) and record it."""
+
+    def __init__(self, registry, family, name):
+        self.registry = registry
+        self.family = family
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.family, self.name, perf_counter() - self.start)
+
+
+class Metrics:
+    """Histograms and counters of the current run, shared by all threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (family, name) -> Histogram
+        self.counters = {}  # (family, name) -> number
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def observe(self, family, name, seconds):
+        with self.lock:
+            self.histograms.setdefault((family, name), Histogram()).observe(seconds)
+
+    def count(self, family, name, number=1):
+        with self.lock:
+            self.counters[(family, name)] = self.counters.get((family, name), 0) + number
+
+    def timed(self, family, name=None):
+        """Time a block or a function.
+
+        :param family: family of the measure ("request", "function", "phase", "wait").
+        :param name: name of the measure, the function name by default when used as a decorator.
+        :return: a 'Timer' for a 'with' statement, or a decorator if 'name' is None.
+        """
+        if name is not None:
+            return Timer(self, family, name)
+
+        def decorator(function):
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                with Timer(self, family, function.__name__):
+                    return function(*args, **kwargs)
+
+            return timed_function
+
+        return decorator
+
+    def summary(self):
+        """Get metrics as a dictionary {family: {name: histogram summary or count}}."""
+        with self.lock:
+            summary = {}
+
+            for (family, name), histogram in sorted(self.histograms.items()):
+                summary.setdefault(family, {})[name] = histogram.summary()
+
+            for (family, name), number in sorted(self.counters.items()):
+                summary.setdefault(family, {})[name] = number
+
+            return summary
+
+    def report(self):
+        """Get a small human-readable table of histograms: calls, total, mean and maximum durations."""
+        with self.lock:
+            lines = [f"{family + ' ' + name:<50}{histogram.count:>8} calls {histogram.total:10.2f} s "
+                     f"(mean {histogram.total / histogram.count * 1000:8.1f} ms, max {histogram.max * 1000:8.1f} ms)"
+                     for (family, name), histogram in sorted(self.histograms.items())]
+            lines += [f"{family + ' ' + name:<50}{number:>8}"
+                      for (family, name), number in sorted(self.counters.items())]
+
+        return "\n".join(lines) + "\n"
+
+    def prometheus(self):
+        """Get metrics in Prometheus text exposition format."""
+        lines = []
+
+        with self.lock:
+            for family in sorted({family for family, _ in self.histograms}):
+                metric = f"{PREFIX}_{family}_seconds"
+                lines += [f"# HELP {metric} Duration of '{family}' measures.", f"# TYPE {metric} histogram"]
+
+                for (hist_family, name), histogram in sorted(self.histograms.items()):
+                    if hist_family != family:
+                        continue
+
+                    cumulated = 0
+
+                    for bound, number in zip([*map(str, BUCKETS), "+Inf"], histogram.buckets):
+                        cumulated += number
+                        lines.append(f'{metric}_bucket{{name="{name}",le="{bound}"}} {cumulated}')
+
+                    lines += [f'{metric}_sum{{name="{name}"}} {histogram.total:.6f}',
+                              f'{metric}_count{{name="{name}"}} {histogram.count}']
+
+            for family in sorted({family for family, _ in self.counters}):
+                metric = f"{PREFIX}_{family}_total"
+                lines += [f"# HELP {metric} Number of '{family}' events.", f"# TYPE {metric} counter"]
+                lines += [f'{metric}{{name="{name}"}} {number}'
+                          for (counter_family, name), number in sorted(self.counters.items())
+                          if counter_family == family]
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf8') as prom_file:
+            prom_file.write(self.prometheus())
+
+
+class TimedRequest(wr.WrappedRequest):
+    """API request whose round trip is timed."""
+
+    def execute(self, *args, **kwargs):
+        with metrics.timed("request", self.method_name):
+            return self.request.execute(*args, **kwargs)
+
+
+class TimedBatch(wr.WrappedBatch):
+    """Batch request timed as a whole, its requests being counted by method."""
+
+    def added(self, request, callback):
+        metrics.count("batched", request.method_name)
+        return callback
+
+    def execute(self, *args, **kwargs):
+        with metrics.timed("request", "batch"):
+            return self.batch.execute(*args, **kwargs)
+
+
+class TimedService(wr.WrappedService):
+    """Service object timing every round trip. Same interface as the wrapped service."""
+
+    request_class = TimedRequest
+    batch_class = TimedBatch
+
+
+metrics = Metrics()  # Registry of the running execution, reset by 'get_videos.execution'.
+
+" - LOCAL FUNCTIONS - "
+
+
+def timed(family, name=None):
+    """Time a block or a function with the registry of the running execution (see 'Metrics.timed')."""
+    return metrics.timed(family, name)
+
+
+def start_profile():
+    """Start a cProfile capture of the calling thread (crawl workers and pipeline stages are not profiled).
+
+    :return: the 'cProfile.Profile' object.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler, pstats_path, top=25):
+    """Stop a cProfile capture and save it (readable with 'pstats' or 'snakeviz').
+
+    :param profiler: the object returned by 'start_profile'.
+    :param pstats_path: file path of the saved statistics.
+    :param top: number of functions in the report.
+    :return: small text with the functions taking the most cumulative time.
+    """
+    profiler.disable()
+    profiler.dump_stats(pstats_path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+
+    return stream.getvalue()
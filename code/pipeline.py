@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+import get_videos as gv
+import queue
+import records as rs
+import routing as rt
+import threading
+import transport as tp
+
+from operator import itemgetter
+from time import perf_counter
+
+"""- SCRIPT INFORMATION -
+
+@file_name: pipeline.py
+@author: Dylan "dyl-m" Monfret
+
+Streaming execution: videos selected from a channel go through the next stages while the following channels are still
+crawled, instead of waiting for the whole crawl.
+
+crawl (get_videos.get_all_videos) -> durations (chunks of 50 IDs, one 'videos.list' request each) -> routing
+(routing.py) -> insertions (get_videos.api_add_to_playlist)
+
+Stages run in their own threads and are connected by bounded queues: when a stage is slower than the previous one,
+the queue fills up and the previous stage waits (backpressure), down to the crawl itself (see
+'get_videos.iter_crawled_channels'). Memory used by the stages does not depend on the number of channels, and the first
+videos are added a few seconds after the start of the crawl.
+
+Videos of a playlist are added chunk after chunk, each chunk in chronological order (not the whole playlist, as
+channels are crawled in database order). Videos not added during previous executions are added first.
+
+Without streaming, the durations stage alone ('DurationLookup') runs during the crawl, so no lookup is left once the
+last channel is crawled: the whole duration list is then sorted by upload date (its chunks being sorted already, the
+sort only merges them) and videos are added in chronological order, as before.
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+BUFFER_SIZE = 200  # Videos waiting for their duration.
+CHUNK_SIZE = 50  # Video IDs per 'videos.list' request.
+FLUSH_AFTER = 5.0  # Seconds without a new video after which an incomplete chunk is sent.
+
+" - LOCAL CLASSES - "
+
+
+class DurationLookup:
+    """Duration stage, fed with videos selected by the crawl (see 'put'): chunks of 50 IDs are looked up in a thread of
+    their own while the next channels are crawled."""
+
+    def __init__(self, api_service, journal=None, service_factory=None, buffer_size=BUFFER_SIZE,
+                 flush_after=FLUSH_AFTER, duration_cache=None):
+        """
+        :param api_service: API Google Token generated with Google.py call, used by stages if 'service_factory' is None.
+        :param journal: execution journal (see 'checkpoint.py'), durations are written in it chunk after chunk.
+        :param service_factory: function without argument returning a new API service, one per stage ('httplib2' is
+                                not thread-safe).
+        :param buffer_size: maximum number of videos waiting in each queue.
+        :param flush_after: seconds without a new video after which an incomplete chunk is sent.
+        :param duration_cache: duration cache dictionary (see 'duration_cache.py'), None to request every video.
+        """
+        self.api_service = api_service
+        self.journal = journal
+        self.service_factory = service_factory
+        self.flush_after = flush_after
+        self.duration_cache = duration_cache
+        self.known_durations = journal.duration_chunks() if journal is not None else {}
+
+        self.selected = queue.Queue(maxsize=buffer_size)  # Video tuples, None at the end.
+
+        self.start = perf_counter()
+        self.error = None  # Unexpected exception of a stage, raised again by 'put' and 'close'.
+        self.unavailable = None  # Quota or API error which stopped duration lookups.
+        self.streams = {}  # Channel ID -> durations found for its videos, sorted by upload date.
+        self.missing = []  # IDs of videos looked up without result.
+        self.duration_list = None  # Streams merged, once every video is looked up.
+
+        self.threads = [threading.Thread(target=self._run, args=(stage,), daemon=True) for stage in self._stages()]
+
+        for thread in self.threads:
+            thread.start()
+
+    def _stages(self):
+        return [self._durations]
+
+    def _service(self):
+        return self.service_factory() if self.service_factory is not None else self.api_service
+
+    def _run(self, stage):
+        try:
+            stage(self._service())
+
+        except BaseException as error:  # pylint: disable=broad-except - Raised again in the crawl thread.
+            self.error = error
+
+    def _put(self, a_queue, item):
+        """Put an item in a queue, waiting for a free slot as long as no stage failed."""
+        while True:
+            if self.error is not None:
+                raise self.error
+
+            try:
+                a_queue.put(item, timeout=0.1)
+                return
+
+            except queue.Full:
+                continue
+
+    def _get(self, a_queue):
+        """Get an item from a queue, waiting for one as long as no stage failed."""
+        while True:
+            if self.error is not None:
+                raise self.error
+
+            try:
+                return a_queue.get(timeout=0.1)
+
+            except queue.Empty:
+                continue
+
+    " - Crawl side - "
+
+    def put(self, videos):
+        """Hand videos selected from a channel over to the stages, waiting if they are behind.
+
+        :param videos: list of (video ID, upload date, channel ID, title) tuples.
+        """
+        for video in videos:
+            self._put(self.selected, video)
+
+    def _join(self):
+        self._put(self.selected, None)
+
+        for thread in self.threads:
+            thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+        self.duration_list = rs.VideoRecords.merge(self.streams.values())
+        self.duration_list.missing = self.missing
+
+    def close(self):
+        """Wait for all videos to be looked up.
+
+        :return: the duration list (see 'get_videos.api_get_videos_duration'), sorted by upload date. Videos dropped
+                 after a quota or API error ('unavailable' attribute) are not in it.
+        """
+        self._join()
+
+        return self.duration_list
+
+    " - Durations - "
+
+    def _durations(self, api_service):
+        chunk = []
+        done = False
+
+        while not done:
+            try:
+                video = self.selected.get(timeout=self.flush_after if chunk else None)
+
+            except queue.Empty:  # The crawl is slow: do not keep a few videos waiting.
+                video = False
+
+            if video is None:
+                done = True
+
+            elif video:
+                chunk.append(video)
+
+            if chunk and (len(chunk) >= CHUNK_SIZE or not video):
+                self._found(self._lookup(chunk, api_service))
+                chunk = []
+
+        self._durations_done()
+
+    def _lookup(self, chunk, api_service):
+        """Get durations of a chunk of videos, from the journal if already found by an interrupted execution."""
+        if self.unavailable is not None:  # Videos are dropped: their channels are journaled, a resume finds them.
+            return rs.VideoRecords()
+
+        known = rs.VideoRecords.from_duration_list(sorted((self.known_durations[video[0]] for video in chunk
+                                                           if video[0] in self.known_durations), key=itemgetter(2)))
+        to_request = [video for video in chunk if video[0] not in self.known_durations]
+
+        try:
+            found = gv.api_get_videos_duration(to_request, api_service, duration_cache=self.duration_cache)
+
+        except tp.UNAVAILABLE_ERRORS as error:
+            self.unavailable = error
+            print(f"Daily quota budget reached (or API unavailable) while getting durations: {error}\n")
+            return rs.VideoRecords()
+
+        if self.journal is not None and found:
+            self.journal.duration_chunk_found(found)
+
+        return rs.VideoRecords.merge([known, found])
+
+    def _found(self, duration_list):
+        """Keep the durations of a chunk (sorted by upload date) in the streams of their channels."""
+        self.missing += duration_list.missing
+
+        for channel_id, videos in duration_list.by_channel().items():
+            self.streams[channel_id] = rs.VideoRecords.merge([self.streams[channel_id], videos]) \
+                if channel_id in self.streams else videos
+
+    def _durations_done(self):
+        """Called once every chunk is looked up."""
+
+
+class Pipeline(DurationLookup):
+    """Duration, routing and insertion stages, fed with videos selected by the crawl (see 'put')."""
+
+    def __init__(self, api_service, playlist_ids, routing_rules, channel_categories, delay=True, journal=None,
+                 service_factory=None, run_log=None, buffer_size=BUFFER_SIZE, flush_after=FLUSH_AFTER,
+                 duration_cache=None, not_added_directory=None):
+        """
+        :param api_service: API Google Token generated with Google.py call, used by stages if 'service_factory' is None.
+        :param playlist_ids: dictionary associating playlist keys and IDs.
+        :param routing_rules: list of routing rules (see 'routing.py').
+        :param channel_categories: dictionary associating channel ID and its categories (see
+                                   'rt.channels_by_category').
+        :param delay: if True, start with a delay between insertions (see 'get_videos.api_add_to_playlist').
+        :param journal: execution journal (see 'checkpoint.py'), durations are written in it chunk after chunk.
+        :param service_factory: function without argument returning a new API service, one per stage ('httplib2' is
+                                not thread-safe).
+        :param run_log: execution log (see 'run_log.py').
+        :param buffer_size: maximum number of videos waiting in each queue.
+        :param flush_after: seconds without a new video after which an incomplete chunk is sent.
+        :param duration_cache: duration cache dictionary (see 'duration_cache.py'), None to request every video.
+        :param not_added_directory: directory of the 'NOT_ADDED_<playlist ID>.json' files ('gv.NOT_ADDED_DIRECTORY' by
+                                    default).
+        """
+        self.playlist_ids = playlist_ids
+        self.routing_rules = routing_rules
+        self.channel_categories = channel_categories
+        self.delay = delay
+        self.run_log = run_log
+        self.not_added_directory = not_added_directory or gv.NOT_ADDED_DIRECTORY
+
+        self.routed = queue.Queue(maxsize=max(1, buffer_size // CHUNK_SIZE))  # Routed chunks, None at the end.
+
+        self.first_insert = None  # Seconds from the start to the first chunk added.
+        self.routed_videos = {playlist_key: [] for playlist_key in rt.rules_playlists(routing_rules)}
+        self.not_added = {playlist_key: [] for playlist_key in self.routed_videos}
+        self.contents = {}  # Playlist key -> set of video IDs in the playlist.
+
+        super().__init__(api_service, journal=journal, service_factory=service_factory, buffer_size=buffer_size,
+                         flush_after=flush_after, duration_cache=duration_cache)
+
+    def _stages(self):
+        return [self._durations, self._insertions]
+
+    def close(self):
+        """Wait for all videos to go through the stages.
+
+        :return: a dictionary with the duration list (see 'get_videos.api_get_videos_duration'), videos routed and not
+                 added by playlist key, the error which stopped duration lookups (None if none) and the seconds
+                 before the first insertion.
+        """
+        self._join()
+
+        return {"durations": self.duration_list, "routed": self.routed_videos, "not_added": self.not_added,
+                "unavailable": self.unavailable, "first_insert": self.first_insert}
+
+    " - Routing - "
+
+    def _found(self, duration_list):
+        super()._found(duration_list)
+
+        for playlist_key, videos in rt.route_videos(duration_list, self.routing_rules,
+                                                    self.channel_categories).items():
+            if videos:
+                self.routed_videos[playlist_key] += videos
+                self._put(self.routed, (playlist_key, videos))
+
+    def _durations_done(self):
+        self._put(self.routed, None)
+
+    " - Insertions - "
+
+    def _insertions(self, api_service):
+        for playlist_key in self.routed_videos:  # Older videos first.
+            not_added = gv.read_not_added(self.playlist_ids[playlist_key], self.not_added_directory)
+
+            if not_added:
+                self._insert(playlist_key, not_added, api_service)
+
+        for playlist_key, videos in iter(lambda: self._get(self.routed), None):
+            self._insert(playlist_key, videos, api_service)
+
+        for playlist_key, video_ids in self.not_added.items():
+            gv.write_not_added(self.playlist_ids[playlist_key], video_ids, self.not_added_directory)
+
+    def _insert(self, playlist_key, videos, api_service):
+        playlist_id = self.playlist_ids[playlist_key]
+        start = perf_counter()
+
+        if playlist_key not in self.contents:
+            try:
+                self.contents[playlist_key] = gv.api_get_playlist_video_ids(playlist_id, api_service)
+
+            except tp.UNAVAILABLE_ERRORS as error:  # Without the playlist content, nothing is added (duplicates).
+                print(f"Playlist content unavailable, videos deferred: {error}\n")
+                self.not_added[playlist_key] += [video[0] for video in videos]
+                return
+
+        added = gv.api_add_to_playlist(playlist_id, videos, api_service, delay=self.delay,
+                                       playlist_content=self.contents[playlist_key], journal=self.journal,
+                                       save_not_added=False)
+        self.not_added[playlist_key] += added["not_added"]
+
+        if self.first_insert is None:
+            self.first_insert = round(perf_counter() - self.start, 3)
+
+        if self.run_log is not None:
+            self.run_log.write(f'{added["logs"]}\n')
+            self.run_log.event("insert", playlist=playlist_key, videos=len(videos), not_added=len(added["not_added"]),
+                               failed=len(added["failed"]), seconds=round(perf_counter() - start, 3),
+                               quota_used=gv.quota_used(api_service))
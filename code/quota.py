@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+import channel_cache as cc
+import json
+import threading
+import video_index as vi
+import wrapping as wr
+
+from collections import Counter
+from datetime import datetime
+from dateutil import tz
+from dateutil.relativedelta import relativedelta
+from math import ceil
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: quota.py
+@author: Dylan "dyl-m" Monfret
+
+YouTube Data API quota accounting. 'QuotaMeter' wraps the service object generated with Google.py and charges each
+executed request its documented cost (https://developers.google.com/youtube/v3/determine_quota_cost) to a
+'QuotaUsage', persisted per day on disk. Once the daily budget would be exceeded, requests are not sent and
+'QuotaExceededError' is raised instead, so the remaining work can be deferred to the next day.
+
+With several accounts (see 'service_pool.py'), each one has its own usage file, 'PoolUsage' summing them up.
+
+Usage file format: {"date": Pacific Time date (quota reset at midnight PT), "used": units, "by_method": {...}}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/quota_usage.json'
+DAILY_QUOTA = 10000
+DEFAULT_UNIT_COST = 1  # Most of list methods.
+UNIT_COSTS = {'playlistItems.insert': 50, 'playlistItems.update': 50, 'playlistItems.delete': 50,
+              'playlists.insert': 50, 'playlists.update': 50, 'playlists.delete': 50,
+              'search.list': 100}
+DEFAULT_UPLOADS_PER_DAY = 0.3  # Used by the planner for channels without history in the video index.
+
+" - LOCAL CLASSES - "
+
+
+class QuotaExceededError(Exception):
+    """Raised instead of sending a request which would exceed the daily quota budget."""
+
+
+class QuotaUsage:
+    """Units spent during the current quota day, shared by all the metered services of a run."""
+
+    def __init__(self, json_path=DEFAULT_PATH, budget=DAILY_QUOTA):
+        self.json_path = json_path
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.date = quota_day()
+        self.used = 0
+        self.by_method = Counter()
+
+        if json_path and isfile(json_path):
+            with open(json_path, encoding='utf8') as json_file:
+                data = json.load(json_file)
+
+            if data["date"] == self.date:
+                self.used = data["used"]
+                self.by_method.update(data["by_method"])
+
+    @property
+    def remaining(self):
+        return self.budget - self.used
+
+    def charge(self, costs):
+        """Spend units ({method name: units}) all at once, or raise 'QuotaExceededError' if the budget is not enough."""
+        cost = sum(costs.values())
+
+        with self.lock:
+            if quota_day() != self.date:  # Quota reset during the run.
+                self.date, self.used, self.by_method = quota_day(), 0, Counter()
+
+            if self.used + cost > self.budget:
+                raise QuotaExceededError(f"{', '.join(costs)} need(s) {cost} units, only {self.remaining} left today.")
+
+            self.used += cost
+            self.by_method.update(costs)
+
+    def exhaust(self):
+        """Consider the budget spent for today, the API having answered with a quota error."""
+        with self.lock:
+            self.used = max(self.used, self.budget)
+
+    def save(self):
+        if self.json_path:
+            with self.lock, open(self.json_path, 'w', encoding='utf8') as json_file:
+                json.dump({"date": self.date, "used": self.used, "by_method": self.by_method}, json_file, indent=4)
+
+
+class PoolUsage:
+    """Quota usages of the accounts of a 'service_pool.ServicePool', summed up. Insertions are only charged to the
+    owner account ('owner_usage')."""
+
+    def __init__(self, usages, owner):
+        """
+        :param usages: dictionary associating account name and its 'QuotaUsage'.
+        :param owner: name of the account owning the playlists.
+        """
+        self.usages = usages
+        self.owner = owner
+
+    @property
+    def owner_usage(self):
+        return self.usages[self.owner]
+
+    @property
+    def budget(self):
+        return sum(usage.budget for usage in self.usages.values())
+
+    @property
+    def used(self):
+        return sum(usage.used for usage in self.usages.values())
+
+    @property
+    def remaining(self):
+        return sum(max(usage.remaining, 0) for usage in self.usages.values())
+
+    @property
+    def by_method(self):
+        return sum((usage.by_method for usage in self.usages.values()), Counter())
+
+    def by_account(self):
+        return {name: {"used": usage.used, "budget": usage.budget} for name, usage in self.usages.items()}
+
+    def save(self):
+        for usage in self.usages.values():
+            usage.save()
+
+
+class MeteredRequest(wr.WrappedRequest):
+    """API request charged to a 'QuotaUsage' when executed."""
+
+    def __init__(self, request, method_name, kwargs, service):
+        super().__init__(request, method_name, kwargs, service)
+        self.cost = UNIT_COSTS.get(method_name, DEFAULT_UNIT_COST)
+
+    def execute(self, *args, **kwargs):
+        self.service.usage.charge({self.method_name: self.cost})
+        return self.request.execute(*args, **kwargs)
+
+
+class MeteredBatch(wr.WrappedBatch):
+    """Batch request charged all at once (every request or none) when executed."""
+
+    def __init__(self, batch, service):
+        super().__init__(batch, service)
+        self.costs = Counter()
+
+    def added(self, request, callback):
+        self.costs[request.method_name] += request.cost
+        return callback
+
+    def execute(self, *args, **kwargs):
+        self.service.usage.charge(self.costs)
+        return self.batch.execute(*args, **kwargs)
+
+
+class QuotaMeter(wr.WrappedService):
+    """Service object charging every request to a 'QuotaUsage'. Same interface as the wrapped service."""
+
+    request_class = MeteredRequest
+    batch_class = MeteredBatch
+
+    def __init__(self, api_service, usage):
+        super().__init__(api_service)
+        self.usage = usage
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def quota_day():
+    """Get the current quota day, YouTube quotas being reset at midnight Pacific Time.
+
+    :return: the date as ISO characters string.
+    """
+    return f"{datetime.now(tz.gettz('America/Los_Angeles')):%Y-%m-%d}"
+
+
+def seconds_until_reset():
+    """Get the number of seconds before the next quota reset (midnight Pacific Time)."""
+    now = datetime.now(tz.gettz('America/Los_Angeles'))
+    return (now.replace(hour=0, minute=0, second=0, microsecond=0) + relativedelta(days=1) - now).total_seconds()
+
+
+def usage_of(api_service):
+    """Get the quota usage a service charges its requests to, even if the 'QuotaMeter' is wrapped by other services
+    (see 'transport.RetryingService').
+
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :return: the 'QuotaUsage' object ('PoolUsage' for a pool of services), None if the service is not metered.
+    """
+    return wr.unwrap(api_service, 'usage')
+
+
+def insert_budget(api_service):
+    """Get the daily budget available for insertions: the one of the playlists owner account for a pool of services.
+
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :return: number of units ('DAILY_QUOTA' if the service is not metered).
+    """
+    usage = usage_of(api_service)
+
+    if usage is None:
+        return DAILY_QUOTA
+
+    return usage.owner_usage.budget if isinstance(usage, PoolUsage) else usage.budget
+
+
+def insert_remaining(api_service):
+    """Get the units left today for insertions: the ones of the playlists owner account for a pool of services.
+
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :return: number of units ('DAILY_QUOTA' if the service is not metered).
+    """
+    usage = usage_of(api_service)
+
+    if usage is None:
+        return DAILY_QUOTA
+
+    return usage.owner_usage.remaining if isinstance(usage, PoolUsage) else usage.remaining
+
+
+def plan_execution(channel_ids_list, latest_date, oldest_date, video_index=None, channel_cache=None,
+                   nb_playlists=2, windowed=True):
+    """Predict the quota cost of 'get_videos.execution' without sending any request. Upload frequencies come from the
+    video index when channels are known, 'DEFAULT_UPLOADS_PER_DAY' is used otherwise.
+
+    :param channel_ids_list: list of channel IDs to crawl.
+    :param latest_date: Upper bound of time interval.
+    :param oldest_date: Lower bound of time interval.
+    :param video_index: local video index (see 'video_index.py'), None if not used.
+    :param channel_cache: channel metadata cache (see 'channel_cache.py'), None if not used.
+    :param nb_playlists: number of playlists videos are added to.
+    :param windowed: if channels' history is retrieved with 'windowed' mode (see 'get_videos.get_all_videos').
+    :return: a dictionary with predicted units per method, their total and the expected number of new videos.
+    """
+    units = Counter()
+    expected_videos = 0.0
+    a_year_ago = datetime.today() - relativedelta(years=1)
+
+    if channel_cache is not None:
+        missing = [channel_id for channel_id in channel_ids_list if not cc.is_fresh(channel_cache.get(channel_id))]
+        units['channels.list'] = ceil(len(missing) / 50)
+    else:
+        units['channels.list'] = len(channel_ids_list)
+
+    for channel_id in channel_ids_list:
+        watermark = vi.get_watermark(video_index, channel_id) if video_index is not None else None
+        uploads_per_day = DEFAULT_UPLOADS_PER_DAY
+
+        if watermark is not None:
+            uploads_per_day = vi.count_since(video_index, channel_id, a_year_ago) / 365
+
+        channel_oldest_date = watermark or oldest_date
+        history_days = (latest_date - channel_oldest_date).days + 1 if windowed else 365 * 10  # Assume 10 years.
+
+        units['playlistItems.list'] += ceil(uploads_per_day * history_days / 50) + (1 if windowed else 0)
+        expected_videos += uploads_per_day * max((latest_date - channel_oldest_date).total_seconds(), 0) / 86400
+
+    expected_videos = round(expected_videos)
+    units['playlistItems.list'] += nb_playlists  # Playlist contents, listed once (considered small).
+    units['videos.list'] = ceil(expected_videos / 50)
+    units['playlistItems.insert'] = expected_videos * UNIT_COSTS['playlistItems.insert']
+
+    return {"units": units, "total": sum(units.values()), "expected_videos": expected_videos}
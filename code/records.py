@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from operator import itemgetter
+
+"""- SCRIPT INFORMATION -
+
+@file_name: records.py
+@author: Dylan "dyl-m" Monfret
+
+Compact store of video records, used from duration lookups ('get_videos.api_get_videos_duration') to the duration
+split ('get_videos.duration_filter'). Instead of one (video tuple, datetime.timedelta, datetime.datetime) tuple per
+video, records are kept in columns:
+
+- video IDs and titles in lists;
+- channel IDs interned: each channel ID is stored once, videos keep its index in an 'array' column;
+- upload dates as epoch seconds and durations as seconds (-1 when unknown) in 'array' columns of 64 bits integers.
+
+Iterating over a store still yields (video, duration, date) tuples, video being a (video ID, upload date, channel ID,
+title) tuple, built on the fly: code reading duration lists (routing, journal, logs) works with both. Videos looked
+up without result are listed apart ('missing').
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+UNKNOWN = -1  # Duration of a video not looked up yet.
+
+" - LOCAL CLASSES - "
+
+
+class VideoRecords:
+    """Array-backed store of video records: one entry per video in each column."""
+
+    def __init__(self):
+        self.video_ids = []
+        self.titles = []
+        self.channel_ids = []  # Each channel once, in order of first appearance.
+        self.channel_index = {}  # Channel ID -> its index in 'channel_ids'.
+        self.channels = array('I')
+        self.published = array('q')
+        self.durations = array('q')
+        self.missing = []  # IDs of videos looked up but not returned by the API (deleted or private).
+
+    @classmethod
+    def from_duration_list(cls, duration_list):
+        """Build a store from (video, duration, date) tuples (see 'checkpoint.Checkpoint.duration_chunks')."""
+        if isinstance(duration_list, cls):
+            return duration_list
+
+        records = cls()
+
+        for video, duration, date in duration_list:
+            records.append(video[0], epoch(date) if date is not None else 0, video[2] if len(video) > 2 else None,
+                           video[3] if len(video) > 3 else None, int(duration.total_seconds()))
+
+        return records
+
+    def append(self, video_id, published, channel_id=None, title=None, duration=UNKNOWN):
+        """Add a video.
+
+        :param video_id: a YouTube video ID.
+        :param published: upload date as epoch seconds (see 'epoch').
+        :param channel_id: ID of the channel which uploaded the video, None if unknown.
+        :param title: video title, None if unknown.
+        :param duration: duration in seconds, 'UNKNOWN' if not looked up yet.
+        """
+        if channel_id not in self.channel_index:
+            self.channel_index[channel_id] = len(self.channel_ids)
+            self.channel_ids.append(channel_id)
+
+        self.video_ids.append(video_id)
+        self.titles.append(title)
+        self.channels.append(self.channel_index[channel_id])
+        self.published.append(published)
+        self.durations.append(duration)
+
+    def extend(self, other):
+        self.missing += other.missing
+
+        for idx in range(len(other)):
+            self.append(other.video_ids[idx], other.published[idx], other.channel_ids[other.channels[idx]],
+                        other.titles[idx], other.durations[idx])
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def video(self, idx):
+        """Get the (video ID, upload date, channel ID, title) tuple of a video (see 'get_videos.video_selection')."""
+        return self.video_ids[idx], iso_date(self.published[idx]), self.channel_ids[self.channels[idx]], \
+            self.titles[idx]
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.video(idx), timedelta(seconds=self.durations[idx]), datetime.fromtimestamp(self.published[idx],
+                                                                                                  timezone.utc)
+
+    def by_channel(self):
+        """Split the store by channel, in the order of the store.
+
+        :return: dictionary associating channel ID and a store of its videos.
+        """
+        stores = {}
+
+        for idx in range(len(self)):
+            channel_id = self.channel_ids[self.channels[idx]]
+            stores.setdefault(channel_id, VideoRecords()).append(self.video_ids[idx], self.published[idx], channel_id,
+                                                                 self.titles[idx], self.durations[idx])
+
+        return stores
+
+    @classmethod
+    def merge(cls, stores):
+        """Merge stores sorted by upload date into one sorted store, without sorting again (k-way merge, stable:
+        videos uploaded at the same time keep the order of the stores).
+
+        :param stores: iterable of stores, each sorted by upload date.
+        :return: a new store.
+        """
+        merged = cls()
+        stores = list(stores)
+
+        for store, idx in heapq.merge(*(zip(repeat(store), range(len(store))) for store in stores),
+                                      key=lambda row: row[0].published[row[1]]):
+            merged.append(store.video_ids[idx], store.published[idx], store.channel_ids[store.channels[idx]],
+                          store.titles[idx], store.durations[idx])
+
+        for store in stores:
+            merged.missing += store.missing
+
+        return merged
+
+    def sort_by_date(self):
+        """Sort records by upload date (stable), in place."""
+        if len(self) < 2:
+            return
+
+        order = sorted(range(len(self)), key=self.published.__getitem__)
+        take = itemgetter(*order)  # One C call per column instead of a Python loop.
+
+        for column in ('video_ids', 'titles'):
+            setattr(self, column, list(take(getattr(self, column))))
+
+        for column in ('channels', 'published', 'durations'):
+            values = getattr(self, column)
+            setattr(self, column, array(values.typecode, take(values)))
+
+    def split_by_duration(self, threshold):
+        """Split videos into short and long ones, reading the durations column only.
+
+        :param threshold: minimum number of seconds (excluded) to consider a video as a long video.
+        :return: a tuple with indexes of short videos and indexes of long videos, in the order of the store (see
+                 'video' to get the videos).
+        """
+        short_videos, long_videos = [], []
+
+        for idx, duration in enumerate(self.durations):
+            (long_videos if duration > threshold else short_videos).append(idx)
+
+        return short_videos, long_videos
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def epoch(date):
+    """Convert a date into epoch seconds.
+
+    :param date: an ISO 8601 date string (as given by the API, 'Z' for UTC) or an aware datetime.datetime object.
+    :return: the number of seconds since 1970-01-01 UTC.
+    """
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date.replace('Z', '+00:00'))  # Much faster than 'strptime'.
+
+    return int(date.timestamp())
+
+
+def iso_date(seconds):
+    """Convert epoch seconds into an ISO 8601 UTC date string, in the API format."""
+    return f"{datetime.fromtimestamp(seconds, timezone.utc):%Y-%m-%dT%H:%M:%SZ}"
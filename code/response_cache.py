@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import wrapping as wr
+
+from collections import OrderedDict
+from googleapiclient.errors import HttpError
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: response_cache.py
+@author: Dylan "dyl-m" Monfret
+
+Cache of 'list' responses, revalidated with their ETag: 'CachingService' wraps the service object generated with
+Google.py and sends each cached request again with an 'If-None-Match' header. When the resource did not change, the
+API answers '304 Not Modified' without body and the cached response is used.
+
+The cache is a LRU (least recently used entries are evicted first), limited in number of entries and in size, saved on
+disk between runs.
+
+Cache file format: {"entries": [[request key, ETag, response], ...]} (least recently used first)
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/response_cache.json'
+MAX_ENTRIES = 5000
+MAX_BYTES = 50 * 1024 * 1024
+
+" - LOCAL CLASSES - "
+
+
+class ResponseCache:
+    """LRU cache of API responses and their ETags, with hit statistics of the current run."""
+
+    def __init__(self, json_path=DEFAULT_PATH, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.json_path = json_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # Request key -> {"etag": ..., "response": ..., "size": bytes}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        if json_path and isfile(json_path):
+            with open(json_path, encoding='utf8') as json_file:
+                for key, etag, response in json.load(json_file)["entries"]:
+                    self.store(key, response, etag, count=False)
+
+    @staticmethod
+    def key(method_name, kwargs):
+        return json.dumps([method_name, kwargs], sort_keys=True, default=str)
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def store(self, key, response, etag=None, count=True):
+        """Cache a response (if it has an ETag), evicting least recently used entries beyond the limits."""
+        etag = etag or response.get("etag")
+        size = len(json.dumps(response))
+
+        with self.lock:
+            self.misses += count
+
+            if key in self.entries:
+                self.size -= self.entries.pop(key)["size"]
+
+            if etag is None or size > self.max_bytes:
+                return
+
+            self.entries[key] = {"etag": etag, "response": response, "size": size}
+            self.size += size
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1]["size"]
+
+    def hit(self, key):
+        """Count a '304 Not Modified' answer and get the cached response."""
+        with self.lock:
+            self.entries.move_to_end(key)
+            entry = self.entries[key]
+            self.hits += 1
+            self.bytes_saved += entry["size"]
+
+            return entry["response"]
+
+    def evict(self, predicate):
+        """Remove the entries whose request key matches a predicate (see 'channel_db.evict_channels').
+
+        :param predicate: function taking a request key and returning True if its entry has to be removed.
+        :return: number of entries removed.
+        """
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+
+            for key in keys:
+                self.size -= self.entries.pop(key)["size"]
+
+            return len(keys)
+
+    @property
+    def hit_ratio(self):
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hit_ratio, 3),
+                "bytes_saved": self.bytes_saved, "entries": len(self.entries), "bytes": self.size}
+
+    def save(self):
+        if self.json_path:
+            with self.lock, open(self.json_path, 'w', encoding='utf8') as json_file:
+                json.dump({"entries": [[key, entry["etag"], entry["response"]]
+                                       for key, entry in self.entries.items()]}, json_file)
+
+
+class CachingRequest(wr.WrappedRequest):
+    """'list' request revalidating its cached response, if any."""
+
+    def __init__(self, request, method_name, kwargs, service):
+        super().__init__(request, method_name, kwargs, service)
+        self.key = service.cache.key(method_name, kwargs)
+
+    def execute(self, *args, **kwargs):
+        cache = self.service.cache
+        entry = cache.get(self.key)
+
+        if entry is not None:
+            self.request.headers['If-None-Match'] = entry["etag"]
+
+        try:
+            response = self.request.execute(*args, **kwargs)
+
+        except HttpError as error:
+            if entry is not None and error.resp.status == 304:
+                return cache.hit(self.key)
+            raise
+
+        cache.store(self.key, response)
+        return response
+
+
+class CachingService(wr.WrappedService):
+    """Service object revalidating cached 'list' responses. Same interface as the wrapped service. Requests of batch
+    requests are sent without revalidation."""
+
+    request_class = CachingRequest
+
+    def __init__(self, api_service, cache):
+        super().__init__(api_service)
+        self.cache = cache
+
+    def wrap(self, request, method_name, kwargs):
+        if not method_name.endswith('.list'):
+            return request
+
+        return super().wrap(request, method_name, kwargs)
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def cache_of(api_service):
+    """Get the response cache of a service, even if the 'CachingService' is wrapped by other services.
+
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :return: the 'ResponseCache' object, None if responses are not cached.
+    """
+    return wr.unwrap(api_service, 'cache')
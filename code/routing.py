@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import json
+import re
+
+from datetime import timedelta
+
+"""- SCRIPT INFORMATION -
+
+@file_name: routing.py
+@author: Dylan "dyl-m" Monfret
+
+Routing rules sending each selected video to any number of playlists, so several categories of the PocketTube database
+can be crawled in a single execution (each channel being crawled once, even if it belongs to several categories).
+
+A rule is a dictionary with a target playlist key (from the playlists JSON file) and optional conditions, all of them
+having to match:
+
+{"playlist": "mix",                 # Key of the target playlist.
+ "categories": ["MUSIQUE"],         # Channel in at least one of these categories.
+ "min_duration": 10,                # Duration strictly above this number of minutes.
+ "max_duration": null,              # Duration lower or equal to this number of minutes.
+ "channels": ["UC..."],             # Channel ID in this list.
+ "title": "(?i)live|mix"}           # Regular expression found in the video title.
+"""
+
+" - LOCAL FUNCTIONS - "
+
+
+def load_rules(json_path):
+    """Read routing rules.
+
+    :param json_path: file path to a JSON file containing a list of rules.
+    :return: the list of rules.
+    """
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def default_rules(category, short_vid_index, long_vid_index, min_dur_long_vid=10):
+    """Rules of a single category split into short and long videos (behaviour of previous versions).
+
+    :param category: a channel category.
+    :param short_vid_index: key of the short videos playlist.
+    :param long_vid_index: key of the long videos playlist.
+    :param min_dur_long_vid: minimum duration (minutes) to consider that a video is long.
+    :return: the list of rules.
+    """
+    return [{"playlist": short_vid_index, "categories": [category], "max_duration": min_dur_long_vid},
+            {"playlist": long_vid_index, "categories": [category], "min_duration": min_dur_long_vid}]
+
+
+def rules_categories(rules):
+    """Get categories to crawl for a list of rules.
+
+    :param rules: list of rules.
+    :return: list of categories, in order of first appearance.
+    """
+    return list(dict.fromkeys(category for rule in rules for category in rule.get("categories", [])))
+
+
+def rules_playlists(rules):
+    """Get target playlists of a list of rules.
+
+    :param rules: list of rules.
+    :return: list of playlist keys, in order of first appearance.
+    """
+    return list(dict.fromkeys(rule["playlist"] for rule in rules))
+
+
+def channels_by_category(database, categories):
+    """Index channels of several categories, each channel appearing once.
+
+    :param database: PocketTube database categories (see 'channel_db.load_channel_db').
+    :param categories: list of categories to explore.
+    :return: dictionary associating channel ID and the set of its categories (frozenset), in database order.
+    """
+    channels = {}
+
+    for category in categories:  # Category after category, only channels already seen being handled one by one.
+        channel_ids = database[category]
+        already_seen = {channel_id: channels[channel_id] for channel_id in channels.keys() & channel_ids}
+        channels.update(dict.fromkeys(channel_ids, frozenset((category,))))
+
+        for channel_id, categories_of in already_seen.items():
+            channels[channel_id] = categories_of | {category}
+
+    return channels
+
+
+def rule_matches(rule, channel_id, categories, duration, title=None):
+    """Return a Boolean indicating if a video matches all the conditions of a rule.
+
+    :param rule: a routing rule.
+    :param channel_id: ID of the channel which uploaded the video.
+    :param categories: set of categories of this channel.
+    :param duration: video duration as datetime.timedelta.
+    :param title: video title, None if unknown (title conditions do not match then).
+    :return: True if the video has to be added to the rule playlist.
+    """
+    if "categories" in rule and not categories.intersection(rule["categories"]):
+        return False
+
+    if rule.get("min_duration") is not None and duration <= timedelta(minutes=rule["min_duration"]):
+        return False
+
+    if rule.get("max_duration") is not None and duration > timedelta(minutes=rule["max_duration"]):
+        return False
+
+    if "channels" in rule and channel_id not in rule["channels"]:
+        return False
+
+    if "title" in rule and (title is None or not re.search(rule["title"], title)):
+        return False
+
+    return True
+
+
+def route_videos(ids_and_durations, rules, channel_categories):
+    """Dispatch videos into playlists.
+
+    :param ids_and_durations: list of (video, duration, date) tuples (from 'get_videos.api_get_videos_duration'),
+                              video being a (video ID, upload date, channel ID, title) tuple.
+    :param rules: list of rules.
+    :param channel_categories: dictionary associating channel ID and its categories (see 'channels_by_category').
+    :return: dictionary associating each playlist key and the list of its videos, in the order of 'ids_and_durations'.
+    """
+    routed = {playlist: [] for playlist in rules_playlists(rules)}
+
+    for video, duration, _ in ids_and_durations:
+        _, _, channel_id, title = video
+        categories = channel_categories.get(channel_id, set())
+        targets = {rule["playlist"] for rule in rules if rule_matches(rule, channel_id, categories, duration, title)}
+
+        for playlist in targets:
+            routed[playlist].append(video)
+
+    return routed
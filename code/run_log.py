@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import threading
+
+from datetime import datetime
+from os.path import basename
+from time import perf_counter
+
+"""- SCRIPT INFORMATION -
+
+@file_name: run_log.py
+@author: Dylan "dyl-m" Monfret
+
+Streaming logs of an execution. Each run writes, as things happen, two files in the logs' directory:
+
+- 'Log_<date>.txt': the human-readable log (same format as before, but written progressively, so a crash keeps it);
+- 'Log_<date>.jsonl': structured events, one JSON object per line, the first one being the "start" event.
+
+Events: {"event": ..., "time": ISO date, "elapsed": seconds since start, ...event fields}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DATE_FORMAT = '%Y-%m-%d_%H.%M.%S'
+
+" - LOCAL CLASSES - "
+
+
+class RunLog:
+    """Human-readable log and structured events of one execution, both streamed to disk."""
+
+    def __init__(self, logs_directory, run_date, **start_fields):
+        self.start = perf_counter()
+        self.text_path = f'{logs_directory}/Log_{run_date:{DATE_FORMAT}}.txt'
+        self.events_path = f'{logs_directory}/Log_{run_date:{DATE_FORMAT}}.jsonl'
+        self.lock = threading.Lock()  # Stages of the streaming pipeline (see 'pipeline.py') log from their threads.
+        self.text_file = open(self.text_path, 'w', encoding='utf-8')
+        self.events_file = open(self.events_path, 'w', encoding='utf-8')
+        self.event("start", run_date=run_date.isoformat(), **start_fields)
+
+    def write(self, text):
+        """Append text to the human-readable log."""
+        with self.lock:
+            self.text_file.write(text)
+            self.text_file.flush()
+
+    def event(self, event, **fields):
+        """Append a structured event."""
+        record = {"event": event, "time": f"{datetime.today():%Y-%m-%dT%H:%M:%S}",
+                  "elapsed": round(perf_counter() - self.start, 3), **fields}
+        with self.lock:
+            self.events_file.write(json.dumps(record, default=str) + '\n')
+            self.events_file.flush()
+
+    def close(self):
+        self.event("end")
+        self.text_file.close()
+        self.events_file.close()
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def read_events(events_path, event=None):
+    """Read structured events of a run.
+
+    :param events_path: file path to a 'Log_<date>.jsonl' file.
+    :param event: if given, only yield this kind of event.
+    :return: a generator of event dictionaries.
+    """
+    with open(events_path, encoding='utf-8') as events_file:
+        for line in events_file:
+            if line.strip():
+                record = json.loads(line)
+
+                if event is None or record["event"] == event:
+                    yield record
+
+
+def last_run_start(logs_directory):
+    """Get the "start" event of the most recent run, reading a single line.
+
+    :param logs_directory: Logs' directory.
+    :return: the event dictionary, or None if no run has structured events yet.
+    """
+    events_files = sorted(glob.glob(f'{logs_directory}/Log_*.jsonl'), key=basename)  # Names are sortable dates.
+
+    if not events_files:
+        return None
+
+    return next(read_events(events_files[-1], "start"), None)
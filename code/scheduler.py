@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import activity as ac
+import channel_db as cd
+import get_videos as gv
+import heapq
+import quota as qt
+import routing as rt
+import video_index as vi
+
+from datetime import datetime, timedelta
+from os import makedirs
+from time import sleep, time
+
+"""- SCRIPT INFORMATION -
+
+@file_name: scheduler.py
+@author: Dylan "dyl-m" Monfret
+
+Daemon mode: instead of crawling every channel once per execution, channels are polled on their own schedule, kept in
+a priority queue (earliest next check first). The interval between two checks of a channel follows its upload
+frequency over the last year (see 'video_index.upload_frequency'): a channel uploading several times a day is checked
+every 15 minutes, other active channels every few hours, a channel without upload for a year ('activity.py') once a
+week.
+
+Each tick, channels due are crawled with 'get_videos.execution' restricted to them (durations, routing and insertions
+included), the most overdue first, as long as the request-rate budget allows it: a token bucket refilled with
+'UNITS_PER_HOUR' quota units per hour, charged with the units each tick really spent.
+
+The last check of a channel is its high-water mark in the video index: the schedule survives restarts without store
+of its own. Channels whose check moves no high-water mark (ignored, deferred or without new video) are pushed back from
+the time of their check, kept in memory.
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+MIN_INTERVAL = timedelta(minutes=15)  # Between two checks of the most prolific channels.
+MAX_INTERVAL = timedelta(days=7)  # Between two checks of dormant channels.
+MAX_ACTIVE_INTERVAL = timedelta(hours=6)  # Between two checks of channels active in the last year.
+CHECKS_PER_UPLOAD = 4  # Checks of a channel between two of its uploads (on average).
+UNITS_PER_HOUR = qt.DAILY_QUOTA / 24
+MIN_TICK = timedelta(minutes=1)  # Minimum sleep between two ticks.
+LOGS_DIRECTORY = '../Logs/daemon'
+
+" - LOCAL CLASSES - "
+
+
+class RateBudget:
+    """Token bucket of quota units, refilled continuously."""
+
+    def __init__(self, units_per_hour=UNITS_PER_HOUR, burst=None, clock=time):
+        """
+        :param units_per_hour: units added to the bucket per hour.
+        :param burst: maximum number of units in the bucket (one hour of units by default).
+        :param clock: function returning the current time in seconds.
+        """
+        self.rate = units_per_hour / 3600
+        self.capacity = burst if burst is not None else units_per_hour
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def available(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        return self.tokens
+
+    def spend(self, units):
+        self.available()
+        self.tokens -= units  # May go below zero: the next ticks wait for the debt to be paid back.
+
+    def seconds_until(self, units):
+        """Get the number of seconds before 'units' are available."""
+        return max(0.0, (units - self.available()) / self.rate) if self.rate else float('inf')
+
+
+class Scheduler:
+    """Priority queue of channels, ordered by date of next check."""
+
+    def __init__(self, channel_ids, video_index, activity=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 budget=None, clock=time):
+        """
+        :param channel_ids: list of channel IDs to poll.
+        :param video_index: local video index (see 'video_index.py'), read again before each tick.
+        :param activity: channel activity store (see 'activity.py'), None if not used.
+        :param min_interval: minimum interval between two checks of a channel, as datetime.timedelta.
+        :param max_interval: maximum interval between two checks of a channel, as datetime.timedelta.
+        :param budget: a 'RateBudget' object, None for no limit.
+        :param clock: function returning the current time in seconds.
+        """
+        self.video_index = video_index
+        self.activity = activity
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self.clock = clock
+        self.queue = []  # (next check timestamp, -uploads per day, channel ID)
+        self.checked = {}  # Channel ID -> timestamp of its last check by this scheduler
+
+        for channel_id in channel_ids:
+            self.push(channel_id)
+
+    def uploads_per_day(self, channel_id):
+        return vi.upload_frequency(self.video_index, channel_id, datetime.fromtimestamp(self.clock()))
+
+    def interval(self, channel_id):
+        """Get the interval between two checks of a channel, following its upload frequency.
+
+        :param channel_id: a YouTube channel ID.
+        :return: a datetime.timedelta object, between 'min_interval' and 'max_interval' ('MAX_ACTIVE_INTERVAL' for
+                 channels uploading).
+        """
+        uploads_per_day = self.uploads_per_day(channel_id)
+        last_upload = (self.activity or {}).get(channel_id, {}).get("last_upload")
+
+        if not uploads_per_day or (self.activity is not None and not ac.is_active(last_upload)):
+            return self.max_interval
+
+        interval = timedelta(days=1 / uploads_per_day / CHECKS_PER_UPLOAD)
+        return min(self.max_interval, MAX_ACTIVE_INTERVAL, max(self.min_interval, interval))
+
+    def push(self, channel_id):
+        """Put a channel in the queue, due one interval after its last check (at once if never checked)."""
+        watermark = vi.get_watermark(self.video_index, channel_id)
+        last_check = max(self.checked.get(channel_id, 0.0), watermark.timestamp() if watermark is not None else 0.0)
+        next_check = last_check + self.interval(channel_id).total_seconds() if last_check else 0.0
+        heapq.heappush(self.queue, (next_check, -self.uploads_per_day(channel_id), channel_id))
+
+    def next_check(self):
+        """Get the timestamp of the earliest check, None if the queue is empty."""
+        return self.queue[0][0] if self.queue else None
+
+    def pop_due(self, cost_of):
+        """Take the channels due, the most overdue first, as long as the budget allows it.
+
+        :param cost_of: function estimating the quota cost of a channel check (see 'qt.plan_execution').
+        :return: list of channel IDs.
+        """
+        now = self.clock()
+        available = self.budget.available() if self.budget is not None else float('inf')
+        due = []
+
+        while self.queue and self.queue[0][0] <= now:
+            cost = cost_of(self.queue[0][2])
+
+            if due and cost > available:  # At least one channel per tick, the budget going into debt if needed.
+                break
+
+            available -= cost
+            due.append(heapq.heappop(self.queue)[2])
+
+        return due
+
+    def reschedule(self, channel_ids, video_index):
+        """Put checked channels back in the queue, with the video index updated by their check."""
+        self.video_index = video_index
+        now = self.clock()
+
+        for channel_id in channel_ids:
+            self.checked[channel_id] = now
+            self.push(channel_id)
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def run(path_channel_data_base_json, path_playlist_ids_json, oldest_date, api_service, video_index_path=vi.DEFAULT_PATH,
+        activity_path=ac.DEFAULT_PATH, units_per_hour=UNITS_PER_HOUR, min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL, transport=None, until=None, clock=time, wait=sleep,
+        logs_directory=LOGS_DIRECTORY, **execution_kwargs):
+    """Poll channels on their own schedule, until interrupted (or until a given time).
+
+    :param path_channel_data_base_json: file path to channel data_base. (Corresponding with 'gv.execution' function)
+    :param path_playlist_ids_json: file path to playlists URL. (Corresponding with 'gv.execution' function)
+    :param oldest_date: Lower bound of time interval for channels never checked.
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :param video_index_path: file path to the local video index, needed: it keeps the last check of each channel.
+    :param activity_path: file path to the channel activity store (see 'activity.py'), None to disable it.
+    :param units_per_hour: request-rate budget, in quota units per hour.
+    :param min_interval: minimum interval between two checks of a channel, as datetime.timedelta.
+    :param max_interval: maximum interval between two checks of a channel, as datetime.timedelta.
+    :param transport: the 'tp.Transport' of the service, reset before each tick (circuit breaker, retry budgets).
+    :param until: timestamp ('clock' time) after which no tick is started, None to run forever.
+    :param clock: function returning the current time in seconds.
+    :param wait: function sleeping a number of seconds.
+    :param logs_directory: Logs folder path of the ticks executions.
+    :param execution_kwargs: other arguments of 'gv.execution' (categories, playlists, routing rules, ...).
+    :return: list of (tick timestamp, channels checked, quota units spent) tuples, one per tick which checked
+             channels (idle ticks are not recorded).
+    """
+    routing_rules = execution_kwargs.get("routing_rules") or rt.default_rules(
+        execution_kwargs.get("selected_category"), execution_kwargs.get("short_vid_index"),
+        execution_kwargs.get("long_vid_index"), execution_kwargs.get("min_dur_long_vid", 10))
+    categories = cd.load_channel_db(path_channel_data_base_json, index_path=None)["categories"]
+    channel_ids = list(rt.channels_by_category(categories, rt.rules_categories(routing_rules)))
+    budget = RateBudget(units_per_hour, clock=clock)
+    scheduler = Scheduler(channel_ids, vi.load_video_index(video_index_path),
+                          ac.load_activity(activity_path) if activity_path else None, min_interval, max_interval,
+                          budget, clock)
+    ticks = []
+    makedirs(logs_directory, exist_ok=True)
+
+    def cost_of(channel_id):
+        return qt.plan_execution([channel_id], datetime.fromtimestamp(clock()), oldest_date,
+                                 video_index=scheduler.video_index, nb_playlists=0)["total"]
+
+    while until is None or clock() < until:
+        due = scheduler.pop_due(cost_of)
+
+        if due:
+            if transport is not None:
+                transport.reset()
+
+            used_before = gv.quota_used(api_service) or 0
+            gv.execution(path_channel_data_base_json, path_playlist_ids_json, datetime.fromtimestamp(clock()),
+                         oldest_date, api_service, video_index_path=video_index_path, activity_path=activity_path,
+                         inactive_report_path=None, logs_directory=logs_directory, channel_ids=due,
+                         open_playlists=False, **execution_kwargs)
+            spent = (gv.quota_used(api_service) or 0) - used_before
+            budget.spend(max(spent, 0))  # Quota usage may be reset during the tick (new quota day).
+            ticks.append((clock(), len(due), spent))
+
+            scheduler.activity = ac.load_activity(activity_path) if activity_path else None
+            scheduler.reschedule(due, vi.load_video_index(video_index_path))
+
+        next_check = scheduler.next_check()
+        delay = next_check - clock() if next_check is not None else MAX_INTERVAL.total_seconds()
+
+        if scheduler.queue and scheduler.queue[0][0] <= clock():  # Channels due but out of budget.
+            delay = budget.seconds_until(cost_of(scheduler.queue[0][2]))
+
+        usage = qt.usage_of(api_service)
+
+        if usage is not None and usage.remaining <= 0:  # Daily quota spent: wait for its reset.
+            delay = max(delay, qt.seconds_until_reset())
+
+        wait(max(delay, MIN_TICK.total_seconds()))
+
+    return ticks
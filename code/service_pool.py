@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import fake_youtube as fy
+import json
+import metrics as mt
+import quota as qt
+import response_cache as rc
+import transport as tp
+
+from googleapiclient.errors import HttpError
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: service_pool.py
+@author: Dylan "dyl-m" Monfret
+
+Quota sharding over several Google accounts (OAuth client secret and token pairs), each with its own daily quota.
+'ServicePool' has the interface of one service object and sends each request through one of its members (one metered
+service per account, see 'qt.QuotaMeter'):
+
+- read-only 'list' requests go to the account with the most quota left (the owner account once the others are
+  spent), then to the next one if its quota is spent (locally, or according to the API);
+- insertions, updates and deletions, and requests on the playlists filled by the script, stay pinned to the account
+  owning the playlists.
+
+Accounts file format: {"owner": account name,
+                       "accounts": {account name: {"client_secret": file path, "token": file path}, ...}}
+Without accounts file, the only account is the previous one ('DEFAULT_ACCOUNT').
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/accounts.json'
+DEFAULT_ACCOUNT = 'main'
+
+" - LOCAL CLASSES - "
+
+
+class KeyExhaustedError(ConnectionError):
+    """Quota error of one account answered inside a batch: retryable (as a network error), the request being sent
+    again in a later batch, through another account."""
+
+
+class PooledRequest:
+    """Request built on the chosen member service when executed."""
+
+    def __init__(self, pool, resource_call, method, kwargs):
+        self.pool = pool
+        self.resource_call = resource_call  # (resource name, args, kwargs)
+        self.method = method
+        self.kwargs = kwargs
+        self.method_name = f"{resource_call[0]}.{method}"
+
+    def build(self, api_service):
+        resource_name, args, kwargs = self.resource_call
+        return getattr(getattr(api_service, resource_name)(*args, **kwargs), self.method)(**self.kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self.pool.send([self], lambda api_service: self.build(api_service).execute(*args, **kwargs))
+
+
+class PooledBatch:
+    """Batch request sent as a whole through one member service."""
+
+    def __init__(self, pool, batch_args):
+        self.pool = pool
+        self.batch_args = batch_args
+        self.requests = []  # (request, callback, request ID)
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback, request_id))
+
+    def execute(self, *args, **kwargs):
+        return self.pool.send([request for request, _, _ in self.requests],
+                              lambda api_service: self._execute_on(api_service, *args, **kwargs))
+
+    def _execute_on(self, api_service, *args, **kwargs):
+        batch = api_service.new_batch_http_request(*self.batch_args[0], **self.batch_args[1])
+
+        for request, callback, request_id in self.requests:
+            batch.add(request.build(api_service), request_id=request_id,
+                      callback=self._callback(api_service, callback))
+
+        return batch.execute(*args, **kwargs)
+
+    def _callback(self, api_service, callback):
+        def exhaust_then_callback(rid, response, exception):
+            if exception is not None and tp.classify_error(exception) == 'quota':
+                api_service.usage.exhaust()
+
+                if self.pool.members_for([request for request, _, _ in self.requests]):
+                    exception = KeyExhaustedError(f"Quota of an account exhausted: {exception}")
+
+            if callback is not None:
+                callback(rid, response, exception)
+
+        return exhaust_then_callback
+
+
+class PooledResource:
+    """API resource ('channels', 'playlistItems', ...) whose methods build pooled requests."""
+
+    def __init__(self, pool, resource_call):
+        self.pool = pool
+        self.resource_call = resource_call
+
+    def __getattr__(self, method):
+        return lambda **kwargs: PooledRequest(self.pool, self.resource_call, method, kwargs)
+
+
+class ServicePool:
+    """Service object spreading requests over the metered services of several accounts. Same interface as one
+    service."""
+
+    def __init__(self, members, owner, owner_playlists=()):
+        """
+        :param members: dictionary associating account name and its service, wrapped by 'qt.QuotaMeter'.
+        :param owner: name of the account owning the playlists.
+        :param owner_playlists: IDs of the playlists filled by the script, read by their owner only (they may be
+                                private).
+        """
+        self.members = members
+        self.owner = owner
+        self.owner_playlists = set(owner_playlists)
+        self.usage = qt.PoolUsage({name: member.usage for name, member in members.items()}, owner)
+        self.api_service = members[owner]  # Wrapped services are looked for through the owner (see 'wr.unwrap').
+
+    def new_batch_http_request(self, *args, **kwargs):
+        return PooledBatch(self, (args, kwargs))
+
+    def __getattr__(self, resource_name):
+        return lambda *args, **kwargs: PooledResource(self, (resource_name, args, kwargs))
+
+    def is_pinned(self, request):
+        return not request.method_name.endswith('.list') or request.kwargs.get('playlistId') in self.owner_playlists
+
+    def members_for(self, requests):
+        """Get the member services which can send requests: the ones with the most quota left first, the owner account
+        last (its quota is kept for insertions).
+
+        :param requests: list of 'PooledRequest' objects, sent together.
+        :return: list of services, empty if no account has quota left.
+        """
+        if any(self.is_pinned(request) for request in requests):
+            names = [self.owner]
+
+        else:
+            names = sorted(self.members, key=lambda name: (name == self.owner, -self.members[name].usage.remaining))
+
+        return [self.members[name] for name in names if self.members[name].usage.remaining > 0]
+
+    def send(self, requests, execute):
+        """Send requests through the first member with enough quota.
+
+        :param requests: list of 'PooledRequest' objects, sent together.
+        :param execute: function sending the requests through a given member service and returning the response.
+        :return: the response.
+        """
+        error = qt.QuotaExceededError(f"No account with quota left for {', '.join(r.method_name for r in requests)}.")
+
+        for api_service in self.members_for(requests):
+            try:
+                return execute(api_service)
+
+            except qt.QuotaExceededError as exception:  # Not enough units left on this account, nothing was sent.
+                error = exception
+
+            except HttpError as exception:
+                if tp.classify_error(exception) != 'quota':
+                    raise
+
+                api_service.usage.exhaust()
+                error = exception
+
+        raise error
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def load_accounts(json_path=DEFAULT_PATH, client_secret_file=None):
+    """Load the accounts a pool of services is made of.
+
+    :param json_path: file path to the accounts JSON file.
+    :param client_secret_file: client secret file of the only account used if the accounts file does not exist.
+    :return: a tuple (owner account name, dictionary associating account name and {"client_secret": ...,
+             "token": ... (None for the default token file)}).
+    """
+    if not isfile(json_path):
+        return DEFAULT_ACCOUNT, {DEFAULT_ACCOUNT: {"client_secret": client_secret_file, "token": None}}
+
+    with open(json_path, encoding='utf8') as json_file:
+        accounts = json.load(json_file)
+
+    return accounts["owner"], accounts["accounts"]
+
+
+def member_service(api_service, usage, response_cache=None, fixtures=None):
+    """Wrap the service object of one account: responses recorded, 'list' responses revalidated (closest to the API,
+    so that revalidation headers are set on the request actually sent), round trips timed, and requests charged to the
+    quota usage of the account.
+
+    :param api_service: API Google Token generated with Google.py call (or a fake service).
+    :param usage: a 'qt.QuotaUsage' object, today's quota usage of the account.
+    :param response_cache: a 'rc.ResponseCache' object, None to cache nothing.
+    :param fixtures: a 'fy.Fixtures' object where every response is recorded, None to record nothing.
+    :return: a 'qt.QuotaMeter' object.
+    """
+    if fixtures is not None:
+        api_service = fy.RecordingService(api_service, fixtures)
+
+    if response_cache is not None:
+        api_service = rc.CachingService(api_service, response_cache)
+
+    return qt.QuotaMeter(mt.TimedService(api_service), usage)
+
+
+def usage_path(account_name, owner):
+    """Get the quota usage file of an account, the owner account keeping the previous one ('qt.DEFAULT_PATH')."""
+    return qt.DEFAULT_PATH if account_name == owner else qt.DEFAULT_PATH.replace('.json', f'_{account_name}.json')
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import sys
+
+from datetime import timedelta
+from os.path import abspath, dirname
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))  # Scripts of 'code' are imported as top-level modules.
+
+from fake_youtube import FakeYouTube, synthetic_upload_dates  # noqa: E402 - After the path is set.
+
+CHANNEL_ID = "UCtest000000000000000001"
+
+
+@pytest.fixture
+def fake():
+    """Fake service with one channel of 3 videos, uploaded a day apart ('00000100000' being the most recent)."""
+    service = FakeYouTube()
+    service.add_channel(CHANNEL_ID, "Test channel", synthetic_upload_dates(3, timedelta(days=1)))
+    return service
+
+
+@pytest.fixture
+def in_code_directory(tmp_path, monkeypatch):
+    """Run from an empty 'code' directory: scripts write their files in '../files' and '../Logs'."""
+    for name in ('code', 'files', 'Logs'):
+        (tmp_path / name).mkdir()
+
+    monkeypatch.chdir(tmp_path / 'code')
+    return tmp_path
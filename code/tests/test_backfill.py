@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import backfill as bf
+import quota as qt
+import routing as rt
+
+from datetime import datetime
+from fake_youtube import http_error
+
+"""Windows of a backfill: planning within a quota budget, then insertions in chronological order."""
+
+PLAYLIST_IDS = {"music": "PLtestShort", "mix": "PLtestLong"}
+WINDOW_UNITS = 3 * qt.UNIT_COSTS['playlistItems.insert'] + 1  # 3 videos per window.
+
+
+def surveyed(dates):
+    """Surveyed videos of one channel (see queue format), one per upload date."""
+    return {"UCa": [[f"video{idx:06d}", published, f"Video {idx}"] for idx, published in enumerate(dates)]}
+
+
+def queue_of(fake):
+    """Queue of the fake service videos, planned in a single window."""
+    queue = bf.new_queue(datetime(2000, 1, 1), datetime.today(), [])
+    queue["videos"] = {channel_id: [[video_id, video["snippet"]["publishedAt"], video["snippet"]["title"]]
+                                    for video_id, video in fake.video_data.items()
+                                    if video["snippet"]["channelId"] == channel_id]
+                       for channel_id in fake.channel_data}
+    queue["windows"] = bf.plan_windows(queue["videos"], 10 ** 6)
+    return queue
+
+
+def process(queue, api_service, contents, json_path):
+    """Process the first window of a queue with the default rules of the "MUSIQUE" category."""
+    return bf.process_window(queue, queue["windows"][0], api_service, PLAYLIST_IDS,
+                             rt.default_rules("MUSIQUE", "music", "mix"),
+                             {channel_id: frozenset(("MUSIQUE",)) for channel_id in queue["videos"]}, contents,
+                             delay=False, json_path=json_path)
+
+
+def test_plan_windows_within_budget():
+    dates = [f"2021-01-{day:02d}T00:00:00Z" for day in range(10, 0, -1)]
+    windows = bf.plan_windows(surveyed(dates), WINDOW_UNITS)
+
+    assert [window["videos"] for window in windows] == [3, 3, 3, 1]
+    assert windows[0]["oldest"] == "2021-01-01T00:00:00Z" and windows[-1]["latest"] == "2021-01-10T00:00:00Z"
+    assert all(previous["latest"] < window["oldest"] for previous, window in zip(windows, windows[1:]))
+    assert all(window["status"] == "pending" and window["remaining"] is None for window in windows)
+
+
+def test_plan_windows_keeps_same_upload_dates_together():
+    dates = ["2021-01-01T00:00:00Z", "2021-01-02T00:00:00Z"] + ["2021-01-03T00:00:00Z"] * 3
+    windows = bf.plan_windows(surveyed(dates), WINDOW_UNITS)
+
+    assert [window["videos"] for window in windows] == [5]
+
+
+def test_window_videos_and_cost():
+    queue = bf.new_queue(datetime(2021, 1, 1), datetime(2021, 2, 1), [])
+    queue["videos"] = surveyed([f"2021-01-{day:02d}T00:00:00Z" for day in range(1, 8)])
+    window = bf.plan_windows(queue["videos"], WINDOW_UNITS)[1]
+
+    assert [video[0] for video in bf.window_videos(queue, window)] == ["video000003", "video000004", "video000005"]
+    assert all(video[2] == "UCa" for video in bf.window_videos(queue, window))
+    assert bf.window_cost(window) == 3 * qt.UNIT_COSTS['playlistItems.insert'] + 1
+
+    window["remaining"] = {"music": ["video000005"], "mix": []}
+    assert bf.window_cost(window) == qt.UNIT_COSTS['playlistItems.insert']
+
+
+def test_process_window_in_chronological_order(fake, tmp_path):
+    fake.fail_next('playlistItems.insert', http_error(404, 'videoNotFound'))
+    queue = queue_of(fake)
+
+    process(queue, fake, {}, str(tmp_path / 'backfill.json'))
+    window = queue["windows"][0]
+
+    assert window["status"] == "done"
+    assert (window["added"], window["failed"]) == (2, 1)  # The oldest video can't be added: dropped.
+    assert [item["contentDetails"]["videoId"] for item in fake.playlist_data[PLAYLIST_IDS["music"]]] == \
+           ["00000100001", "00000100000"]
+    assert bf.load_queue(str(tmp_path / 'backfill.json')) == queue
+
+
+def test_process_window_resumed_after_quota(fake, tmp_path):
+    queue = queue_of(fake)
+    contents = {}
+    budget = 1 + 1 + qt.UNIT_COSTS['playlistItems.insert']  # Durations, playlist content and one insertion.
+
+    process(queue, qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=budget)), contents, str(tmp_path / 'backfill.json'))
+    window = queue["windows"][0]
+
+    assert window["status"] == "pending" and window["added"] == 1
+    assert window["remaining"] == {"music": ["00000100001", "00000100000"], "mix": []}
+
+    process(queue, fake, contents, str(tmp_path / 'backfill.json'))
+
+    assert window["status"] == "done" and window["added"] == 3 and fake.calls['videos.list'] == 1
+    assert [item["contentDetails"]["videoId"] for item in fake.playlist_data[PLAYLIST_IDS["music"]]] == \
+           ["00000100002", "00000100001", "00000100000"]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import channel_db as cd
+import json
+import pytest
+
+from os import utime
+
+"""PocketTube database index of 'channel_db.py': channels added and removed between two executions."""
+
+SETTINGS = {"ysc_collapse": {"MUSIQUE": False}}  # Application settings, next to categories.
+
+
+def write_db(db_path, categories, mtime_ns):
+    """Write a PocketTube database with a given modification time."""
+    db_path.write_text(json.dumps({**categories, **SETTINGS}))
+    utime(db_path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def parsings(monkeypatch):
+    """Count the databases parsed."""
+    calls = []
+    parse_categories = cd.parse_categories
+
+    def counting(database):
+        calls.append(database)
+        return parse_categories(database)
+
+    monkeypatch.setattr(cd, 'parse_categories', counting)
+    return calls
+
+
+def test_first_load_without_diff(tmp_path, parsings):
+    write_db(tmp_path / 'db.json', {"MUSIQUE": ["UCa", "UCb", "UCa"], "GAMING": ["UCb"]}, 10 ** 18)
+    index = cd.load_channel_db(str(tmp_path / 'db.json'), str(tmp_path / 'index.json'))
+
+    assert index["categories"] == {"MUSIQUE": ["UCa", "UCb"], "GAMING": ["UCb"]}  # Settings and duplicates left out.
+    assert (index["added"], index["removed"]) == ([], [])
+    assert len(parsings) == 1
+
+
+def test_unchanged_or_touched_database_not_parsed(tmp_path, parsings):
+    write_db(tmp_path / 'db.json', {"MUSIQUE": ["UCa", "UCb"]}, 10 ** 18)
+    cd.save_channel_db(cd.load_channel_db(str(tmp_path / 'db.json'), str(tmp_path / 'index.json')),
+                       str(tmp_path / 'index.json'))
+
+    unchanged = cd.load_channel_db(str(tmp_path / 'db.json'), str(tmp_path / 'index.json'))
+    write_db(tmp_path / 'db.json', {"MUSIQUE": ["UCa", "UCb"]}, 2 * 10 ** 18)  # Same content, new modification time.
+    touched = cd.load_channel_db(str(tmp_path / 'db.json'), str(tmp_path / 'index.json'))
+
+    assert len(parsings) == 1
+    assert unchanged["categories"] == touched["categories"] == {"MUSIQUE": ["UCa", "UCb"]}
+    assert (touched["added"], touched["removed"], touched["mtime"]) == ([], [], 2 * 10 ** 18)
+
+
+def test_channels_added_and_removed(tmp_path):
+    write_db(tmp_path / 'db.json', {"MUSIQUE": ["UCa", "UCb", "UCc"], "GAMING": ["UCd"]}, 10 ** 18)
+    cd.save_channel_db(cd.load_channel_db(str(tmp_path / 'db.json'), str(tmp_path / 'index.json')),
+                       str(tmp_path / 'index.json'))
+
+    write_db(tmp_path / 'db.json', {"MUSIQUE": ["UCz", "UCb", "UCd"], "GAMING": ["UCd", "UCy"]}, 2 * 10 ** 18)
+    index = cd.load_channel_db(str(tmp_path / 'db.json'), str(tmp_path / 'index.json'))
+
+    assert index["added"] == ["UCz", "UCy"]  # Database order.
+    assert index["removed"] == ["UCa", "UCc"]  # Sorted.
+    assert set(json.loads((tmp_path / 'index.json').read_text())) == set(cd.INDEX_KEYS)
+
+
+def test_evict_channels():
+    channel_cache = {"UCa": {"uploads": "UUa"}, "UCb": {"uploads": "UUb"}}
+    video_index = {"channels": {"UCa": {"videos": {"a1": {}, "a2": {}}}, "UCb": {"videos": {"b1": {}}}}}
+    activity = {"UCa": {}, "UCb": {}}
+    duration_cache = {"a1": 60, "b1": 60}
+
+    removed = cd.evict_channels(["UCa", "UCunknown"], channel_cache=channel_cache, video_index=video_index,
+                                activity=activity, duration_cache=duration_cache)
+
+    assert removed == 4  # Channel cache, video index, activity and one known duration.
+    assert list(channel_cache) == list(video_index["channels"]) == list(activity) == ["UCb"]
+    assert duration_cache == {"b1": 60}
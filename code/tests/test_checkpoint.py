@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import checkpoint as ck
+import get_videos as gv
+import json
+import quota as qt
+
+from datetime import datetime, timedelta
+from fake_youtube import FakeYouTube, synthetic_upload_dates
+
+"""Executions interrupted by the quota, then resumed from their journal ('checkpoint.py')."""
+
+NB_CHANNELS = 20
+PLAYLIST_IDS = {"music": "PLtestShort", "mix": "PLtestLong"}
+LATEST_DATE = datetime.today()
+OLDEST_DATE = LATEST_DATE - timedelta(days=3)
+
+
+def build_fake():
+    """Fake service with 'NB_CHANNELS' channels of 2 short videos uploaded since 'OLDEST_DATE'."""
+    fake = FakeYouTube()
+
+    for idx in range(NB_CHANNELS):
+        fake.add_channel(f"UCtest{idx:018d}", f"Channel {idx}", synthetic_upload_dates(2, timedelta(hours=6)))
+
+    return fake
+
+
+def execute(fake, directory, budget, resume=False):
+    """Run an execution on all channels of the fake service, with a quota budget.
+
+    :return: the quota units spent.
+    """
+    if not (directory / 'db.json').exists():
+        (directory / 'db.json').write_text(json.dumps({"MUSIQUE": list(fake.channel_data)}))
+        (directory / 'playlists.json').write_text(json.dumps(PLAYLIST_IDS))
+
+    service = qt.QuotaMeter(fake, qt.QuotaUsage(None, budget=budget))
+    gv.execution(str(directory / 'db.json'), str(directory / 'playlists.json'), LATEST_DATE, OLDEST_DATE, service,
+                 "MUSIQUE", "music", "mix", delay=False, resume=resume,
+                 channel_cache_path=str(directory / 'channel_cache.json'),
+                 video_index_path=str(directory / 'video_index.json'),
+                 checkpoint_path=str(directory / 'checkpoint.jsonl'), logs_directory=str(directory / 'Logs'),
+                 activity_path=str(directory / 'channel_activity.json'), inactive_report_path=None,
+                 duration_cache_path=str(directory / 'duration_cache.json'),
+                 channel_db_index_path=str(directory / 'channel_db_index.json'), open_playlists=False)
+
+    return service.usage.used
+
+
+def journal_events(directory):
+    with open(directory / 'checkpoint.jsonl', encoding='utf8') as json_file:
+        return [json.loads(line) for line in json_file]
+
+
+def listed_playlists(fake):
+    """Record the playlists listed from now on."""
+    listed = []
+    list_items = fake._playlist_items_list  # pylint: disable=protected-access
+
+    def spy(playlistId, **kwargs):  # pylint: disable=invalid-name
+        listed.append(playlistId)
+        return list_items(playlistId=playlistId, **kwargs)
+
+    fake._playlist_items_list = spy  # pylint: disable=protected-access
+    return listed
+
+
+def playlist_video_ids(fake, playlist_key):
+    return [item["snippet"]["resourceId"]["videoId"] for item in fake.playlist_data.get(PLAYLIST_IDS[playlist_key], [])]
+
+
+def test_crawl_interrupted_then_resumed(in_code_directory):
+    fake = build_fake()
+    execute(fake, in_code_directory, budget=8)
+
+    events = journal_events(in_code_directory)
+    crawled = {event["channel_id"] for event in events if event["event"] == "channel"}
+    assert 0 < len(crawled) < NB_CHANNELS
+    assert events[-1]["event"] != "done"
+    assert ck.Checkpoint(str(in_code_directory / 'checkpoint.jsonl'), resume=True).resumed
+
+    listed = listed_playlists(fake)
+    execute(fake, in_code_directory, budget=10 ** 6, resume=True)
+
+    assert not {f"UU{channel_id[2:]}" for channel_id in crawled}.intersection(listed)  # Not crawled again.
+    assert sorted(playlist_video_ids(fake, "music")) == sorted(fake.video_data)
+    assert journal_events(in_code_directory)[-1]["event"] == "done"
+
+
+def test_insertions_interrupted_then_resumed(in_code_directory):
+    fake = build_fake()
+    execute(fake, in_code_directory, budget=500)
+
+    inserted = playlist_video_ids(fake, "music")
+    assert 0 < len(inserted) < len(fake.video_data)
+    assert journal_events(in_code_directory)[-1]["event"] != "done"
+
+    fake.calls.clear()
+    listed = listed_playlists(fake)
+    execute(fake, in_code_directory, budget=10 ** 6, resume=True)
+
+    assert listed == [PLAYLIST_IDS["music"]]  # Only the playlist content, no channel crawled again.
+    assert fake.calls['videos.list'] == 0  # Durations found by the first run.
+    assert fake.calls['playlistItems.insert'] == len(fake.video_data) - len(inserted)
+    assert sorted(playlist_video_ids(fake, "music")) == sorted(fake.video_data)  # Each video once.
+    assert journal_events(in_code_directory)[-1]["event"] == "done"
+
+
+def test_complete_execution_not_resumed(in_code_directory):
+    fake = build_fake()
+    execute(fake, in_code_directory, budget=10 ** 6)
+
+    assert journal_events(in_code_directory)[-1]["event"] == "done"
+    assert not ck.Checkpoint(str(in_code_directory / 'checkpoint.jsonl'), resume=True).resumed
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import records as rs
+
+"""Channel streams of 'records.VideoRecords' and their k-way merge."""
+
+
+def store_of(videos):
+    """Build a store from (video ID, upload date in epoch seconds, channel ID) tuples."""
+    store = rs.VideoRecords()
+
+    for video_id, published, channel_id in videos:
+        store.append(video_id, published, channel_id, f"Title {video_id}", 60)
+
+    return store
+
+
+def test_by_channel_keeps_store_order():
+    store = store_of([("a1", 10, "UCa"), ("b1", 20, "UCb"), ("a2", 30, "UCa")])
+    channels = store.by_channel()
+
+    assert list(channels) == ["UCa", "UCb"]
+    assert channels["UCa"].video_ids == ["a1", "a2"]
+    assert channels["UCb"].video(0) == store.video(1)
+
+
+def test_merge_sorted_streams():
+    streams = [store_of([("a1", 10, "UCa"), ("a2", 40, "UCa")]),
+               store_of([("b1", 20, "UCb"), ("b2", 40, "UCb"), ("b3", 50, "UCb")]),
+               store_of([]),
+               store_of([("c1", 5, "UCc")])]
+    streams[1].missing = ["deleted"]
+    merged = rs.VideoRecords.merge(streams)
+
+    assert merged.video_ids == ["c1", "a1", "b1", "a2", "b2", "b3"]  # Same date: order of the streams.
+    assert list(merged.published) == sorted(merged.published)
+    assert merged.channel_ids == ["UCc", "UCa", "UCb"]
+    assert merged.missing == ["deleted"]
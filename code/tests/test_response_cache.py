@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import quota as qt
+import response_cache as rc
+import transport as tp
+
+from datetime import datetime, timezone
+from fake_youtube import http_error
+from googleapiclient.errors import HttpError
+
+"""'list' responses revalidated with their ETag by 'response_cache.CachingService'."""
+
+
+def list_uploads(service, fake):
+    """Request the first page of the fake channel uploads playlist."""
+    uploads_id = next(iter(fake.channel_data.values()))["uploads"]
+    return service.playlistItems().list(part="contentDetails", playlistId=uploads_id, maxResults=50).execute()
+
+
+def test_not_modified_response_served_from_cache(fake):
+    cache = rc.ResponseCache(None)
+    service = rc.CachingService(fake, cache)
+
+    first = list_uploads(service, fake)
+    second = list_uploads(service, fake)
+
+    assert second == first
+    assert fake.calls['playlistItems.list'] == 2  # Revalidated, not skipped.
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.bytes_saved == cache.size > 0
+
+
+def test_modified_response_replaces_cached_one(fake):
+    cache = rc.ResponseCache(None)
+    service = rc.CachingService(fake, cache)
+
+    first = list_uploads(service, fake)
+    video_id = fake.upload(next(iter(fake.channel_data)), datetime.now(timezone.utc))
+    second = list_uploads(service, fake)
+
+    assert second["etag"] != first["etag"]
+    assert second["items"][0]["contentDetails"]["videoId"] == video_id
+    assert (cache.hits, cache.misses, len(cache.entries)) == (0, 2, 1)
+    assert list_uploads(service, fake) == second and cache.hits == 1
+
+
+def test_other_errors_not_hidden_by_cache(fake):
+    service = rc.CachingService(fake, rc.ResponseCache(None))
+    list_uploads(service, fake)
+    fake.fail_next('playlistItems.list', http_error(404, 'playlistNotFound'))
+
+    with pytest.raises(HttpError):
+        list_uploads(service, fake)
+
+
+def test_only_list_requests_revalidated(fake):
+    cache = rc.ResponseCache(None)
+    service = rc.CachingService(fake, cache)
+    body = {"snippet": {"playlistId": "PLtest", "resourceId": {"videoId": "00000100000", "kind": "youtube#video"}}}
+
+    request = service.playlistItems().insert(part="snippet", body=body)
+    request.execute()
+
+    assert not isinstance(request, rc.CachingRequest) and not cache.entries
+
+
+def test_cache_saved_then_loaded(fake, tmp_path):
+    cache = rc.ResponseCache(str(tmp_path / 'response_cache.json'))
+    list_uploads(rc.CachingService(fake, cache), fake)
+    cache.save()
+
+    loaded = rc.ResponseCache(str(tmp_path / 'response_cache.json'))
+    response = list_uploads(rc.CachingService(fake, loaded), fake)
+
+    assert response["etag"] == next(iter(cache.entries.values()))["etag"]
+    assert (loaded.hits, loaded.misses) == (1, 0)
+
+
+def test_least_recently_used_entries_evicted():
+    cache = rc.ResponseCache(None, max_entries=2)
+
+    for key in ("a", "b", "c"):
+        cache.store(key, {"etag": key, "items": []})
+
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.store("d", {"items": []}) is None and "d" not in cache.entries  # No ETag.
+
+
+def test_cache_found_through_wrapping_services(fake):
+    cache = rc.ResponseCache(None)
+    service = tp.RetryingService(qt.QuotaMeter(rc.CachingService(fake, cache), qt.QuotaUsage(None, budget=100)),
+                                 tp.Transport(base_delay=0.0))
+
+    list_uploads(service, fake)
+    list_uploads(service, fake)
+
+    assert rc.cache_of(service) is cache and cache.hits == 1
+    assert rc.cache_of(fake) is None
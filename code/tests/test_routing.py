@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import routing as rt
+
+from datetime import datetime, timedelta, timezone
+
+"""Matching of routing rules, and dispatch of videos into the playlists of several categories."""
+
+MUSIC = frozenset(("MUSIQUE",))
+
+
+@pytest.mark.parametrize("rule, duration, title, expected", [
+    ({"playlist": "music"}, timedelta(minutes=3), "Song", True),
+    ({"playlist": "music", "categories": ["MUSIQUE", "GAMING"]}, timedelta(minutes=3), "Song", True),
+    ({"playlist": "music", "categories": ["GAMING"]}, timedelta(minutes=3), "Song", False),
+    ({"playlist": "mix", "min_duration": 10}, timedelta(minutes=10), "Mix", False),  # Strictly above.
+    ({"playlist": "mix", "min_duration": 10}, timedelta(minutes=10, seconds=1), "Mix", True),
+    ({"playlist": "music", "max_duration": 10}, timedelta(minutes=10), "Song", True),  # Lower or equal.
+    ({"playlist": "music", "max_duration": 10}, timedelta(minutes=10, seconds=1), "Song", False),
+    ({"playlist": "music", "max_duration": None}, timedelta(hours=2), "Song", True),
+    ({"playlist": "music", "channels": ["UCa"]}, timedelta(minutes=3), "Song", True),
+    ({"playlist": "music", "channels": ["UCb"]}, timedelta(minutes=3), "Song", False),
+    ({"playlist": "live", "title": "(?i)live"}, timedelta(minutes=3), "Song (LIVE)", True),
+    ({"playlist": "live", "title": "(?i)live"}, timedelta(minutes=3), "Song", False),
+    ({"playlist": "live", "title": "(?i)live"}, timedelta(minutes=3), None, False),  # Unknown title.
+])
+def test_rule_matches(rule, duration, title, expected):
+    assert rt.rule_matches(rule, "UCa", MUSIC, duration, title) is expected
+
+
+def test_channels_by_category_merges_categories():
+    channels = rt.channels_by_category({"MUSIQUE": ["UCa", "UCb"], "GAMING": ["UCb", "UCc"], "SPORT": ["UCd"]},
+                                       ["MUSIQUE", "GAMING"])
+
+    assert channels == {"UCa": {"MUSIQUE"}, "UCb": {"MUSIQUE", "GAMING"}, "UCc": {"GAMING"}}
+    assert list(channels) == ["UCa", "UCb", "UCc"]
+
+
+def test_route_videos_to_every_matching_playlist():
+    rules = rt.default_rules("MUSIQUE", "music", "mix") + [{"playlist": "live", "title": "(?i)live"},
+                                                            {"playlist": "games", "categories": ["GAMING"]}]
+    channel_categories = rt.channels_by_category({"MUSIQUE": ["UCa", "UCb"], "GAMING": ["UCb"]},
+                                                 ["MUSIQUE", "GAMING"])
+    date = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    song = ("song0000001", "2021-01-01T00:00:00Z", "UCa", "Song")
+    live = ("live0000001", "2021-01-01T00:00:00Z", "UCb", "Live mix")
+    unknown = ("other000001", "2021-01-01T00:00:00Z", "UCz", "Song")
+    routed = rt.route_videos([(song, timedelta(minutes=3), date), (live, timedelta(hours=1), date),
+                              (unknown, timedelta(minutes=3), date)], rules, channel_categories)
+
+    assert routed == {"music": [song], "mix": [live], "live": [live], "games": [live]}
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import get_videos as gv
+import json
+import pytest
+import quota as qt
+import scheduler as sd
+import video_index as vi
+
+from datetime import datetime, timedelta, timezone
+
+"""Intervals between checks, priority queue and request-rate budget of the daemon mode ('scheduler.py')."""
+
+NOW = datetime(2021, 6, 1, 12).timestamp()
+UPLOADS = {"UCprolific": (200, timedelta(minutes=30)),  # About 48 uploads a day.
+           "UCdaily": (41, timedelta(hours=6)),  # 4.1 uploads a day.
+           "UCrare": (3, timedelta(days=60)),
+           "UCsilent": (0, None)}
+
+
+def index_of(uploads):
+    """Video index of channels uploading regularly until 'NOW', from (number of uploads, interval) tuples."""
+    index = {"last_run": None, "channels": {}}
+
+    for channel_id, (count, every) in uploads.items():
+        dates = (datetime.fromtimestamp(NOW, timezone.utc) - idx * every for idx in range(count))
+        index["channels"][channel_id] = {"watermark": None, "videos": {
+            f"{channel_id}{idx:05d}": {"published_at": f"{date:%Y-%m-%dT%H:%M:%SZ}", "duration": None,
+                                       "playlists": None} for idx, date in enumerate(dates)}}
+
+    return index
+
+
+def scheduler_of(uploads=UPLOADS, activity=None, budget=None):
+    return sd.Scheduler(list(uploads), index_of(uploads), activity, budget=budget, clock=lambda: NOW)
+
+
+def test_interval_follows_upload_frequency():
+    scheduler = scheduler_of()
+
+    assert scheduler.interval("UCprolific") == sd.MIN_INTERVAL
+    assert scheduler.interval("UCdaily").total_seconds() == pytest.approx(86400 / 4.1 / sd.CHECKS_PER_UPLOAD)
+    assert scheduler.interval("UCrare") == sd.MAX_ACTIVE_INTERVAL
+    assert scheduler.interval("UCsilent") == sd.MAX_INTERVAL
+
+
+def test_inactive_channel_checked_once_a_week():
+    scheduler = scheduler_of(activity={"UCdaily": {"last_upload": "2000-01-01T00:00:00+0000"}})
+
+    assert scheduler.interval("UCdaily") == sd.MAX_INTERVAL
+
+
+def test_next_check_one_interval_after_the_last_one():
+    scheduler = scheduler_of()
+    vi.set_watermark(scheduler.video_index, "UCrare", datetime.fromtimestamp(NOW - 3600))
+    scheduler.queue = []
+
+    for channel_id in UPLOADS:
+        scheduler.push(channel_id)
+
+    next_checks = {channel_id: next_check for next_check, _, channel_id in scheduler.queue}
+    assert next_checks["UCrare"] == NOW - 3600 + sd.MAX_ACTIVE_INTERVAL.total_seconds()
+    assert next_checks["UCsilent"] == 0.0  # Never checked: at once.
+
+    scheduler.reschedule(["UCsilent"], scheduler.video_index)
+    assert max(scheduler.queue)[0] == NOW + sd.MAX_INTERVAL.total_seconds()
+
+
+def test_most_overdue_channels_first():
+    scheduler = scheduler_of()
+
+    for channel_id, hours_ago in (("UCdaily", 1), ("UCrare", 7)):
+        vi.set_watermark(scheduler.video_index, channel_id, datetime.fromtimestamp(NOW - hours_ago * 3600))
+
+    scheduler.queue = []
+
+    for channel_id in UPLOADS:
+        scheduler.push(channel_id)
+
+    # Never checked channels (most prolific first), then 'UCrare' due an hour ago: 'UCdaily' is not due yet.
+    assert scheduler.pop_due(lambda channel_id: 1) == ["UCprolific", "UCsilent", "UCrare"]
+    assert [channel_id for _, _, channel_id in scheduler.queue] == ["UCdaily"]
+
+
+def test_channels_taken_within_budget():
+    clock = [NOW]
+    budget = sd.RateBudget(units_per_hour=10, clock=lambda: clock[0])
+    scheduler = scheduler_of(budget=budget)
+
+    assert scheduler.pop_due(lambda channel_id: 4) == ["UCprolific", "UCdaily"]  # Most prolific first.
+
+    budget.spend(100)  # Not enough units for any channel: one is taken anyway.
+    assert scheduler.pop_due(lambda channel_id: 4) == ["UCrare"]
+
+
+def test_rate_budget_refill_and_debt():
+    clock = [NOW]
+    budget = sd.RateBudget(units_per_hour=3600, burst=100, clock=lambda: clock[0])  # One unit per second.
+
+    budget.spend(150)
+    assert budget.available() == -50
+    assert budget.seconds_until(10) == 60
+
+    clock[0] += 30
+    assert budget.available() == -20
+
+    clock[0] += 1000
+    assert budget.available() == 100  # Capped to the burst.
+
+
+def test_run_records_ticks_which_checked_channels(tmp_path, fake, monkeypatch):
+    clock = [NOW]
+    waits = []
+    usage = qt.QuotaUsage(None, budget=10 ** 6)
+    (tmp_path / 'db.json').write_text(json.dumps({"MUSIQUE": ["UCa", "UCb", "UCc"]}))
+
+    def execution(*_, video_index_path, channel_ids, **__):  # One unit per channel, checked at once.
+        index = vi.load_video_index(video_index_path)
+
+        for channel_id in channel_ids:
+            vi.set_watermark(index, channel_id, datetime.fromtimestamp(clock[0]))
+
+        vi.save_video_index(index, video_index_path)
+        usage.charge({"channels.list": len(channel_ids)})
+
+    def wait(seconds):  # Woken up early: idle ticks in between.
+        waits.append(seconds)
+        clock[0] += seconds / 2
+
+    monkeypatch.setattr(gv, 'execution', execution)
+    ticks = sd.run(str(tmp_path / 'db.json'), str(tmp_path / 'playlists.json'), datetime.fromtimestamp(NOW),
+                   qt.QuotaMeter(fake, usage), video_index_path=str(tmp_path / 'video_index.json'), activity_path=None,
+                   max_interval=timedelta(hours=1), until=NOW + 3 * 3600, clock=lambda: clock[0], wait=wait,
+                   logs_directory=str(tmp_path / 'Logs'), selected_category="MUSIQUE", short_vid_index="music",
+                   long_vid_index="mix")
+
+    assert [(channels, spent) for _, channels, spent in ticks] == [(3, 3)] * 3
+    assert ticks[0][0] == NOW and all(later[0] - tick[0] >= 3600 for tick, later in zip(ticks, ticks[1:]))
+    assert len(waits) > len(ticks)
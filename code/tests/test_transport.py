@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import get_videos as gv
+import pytest
+import quota as qt
+import transport as tp
+
+from fake_youtube import http_error
+
+"""Error classification and retries of 'transport.py'."""
+
+
+@pytest.mark.parametrize("error, kind", [
+    (http_error(403, 'quotaExceeded'), 'quota'),
+    (qt.QuotaExceededError("local budget reached"), 'quota'),
+    (http_error(429, 'tooManyRequests'), 'rate_limit'),
+    (http_error(403, 'userRateLimitExceeded'), 'rate_limit'),
+    (http_error(503, 'backendError'), 'server'),
+    (ConnectionResetError("reset"), 'network'),
+    (TimeoutError("timeout"), 'network'),
+    (tp.RetriesExhaustedError('videos.list', ConnectionResetError("reset")), 'exhausted'),
+    (http_error(404, 'videoNotFound'), 'permanent'),
+    (http_error(403, 'forbidden'), 'permanent')])
+def test_classify_error(error, kind):
+    assert tp.classify_error(error) == kind
+
+
+def test_list_request_retried_after_server_errors(fake):
+    fake.fail_next('channels.list', http_error(503, 'backendError'), times=2)
+    service = tp.RetryingService(fake, tp.Transport(base_delay=0.0))
+
+    assert service.channels().list(id="UCtest000000000000000001", part='snippet').execute()["items"]
+    assert fake.calls['channels.list'] == 3
+
+
+def test_retries_exhausted(fake):
+    fake.fail_next('channels.list', ConnectionResetError("reset"), times=3)
+    service = tp.RetryingService(fake, tp.Transport(max_retries=2, base_delay=0.0))
+
+    with pytest.raises(tp.RetriesExhaustedError):
+        service.channels().list(id="UCtest000000000000000001", part='snippet').execute()
+
+    assert fake.calls['channels.list'] == 3
+
+
+def test_insert_not_retried_after_server_error(fake):
+    fake.fail_next('playlistItems.insert', http_error(503, 'backendError'))
+    service = tp.RetryingService(fake, tp.Transport(base_delay=0.0))
+    body = {"snippet": {"playlistId": "PLtest", "resourceId": {"videoId": "00000100000", "kind": "youtube#video"}}}
+
+    with pytest.raises(tp.RetriesExhaustedError):
+        service.playlistItems().insert(part="snippet", body=body).execute()
+
+    assert fake.calls['playlistItems.insert'] == 1  # Maybe inserted: not sent twice.
+
+
+def test_quota_error_opens_circuit(fake):
+    fake.fail_next('channels.list', http_error(403, 'quotaExceeded'))
+    service = tp.RetryingService(fake, tp.Transport(base_delay=0.0))
+
+    with pytest.raises(tp.CircuitOpenError):
+        service.channels().list(id="UCtest000000000000000001", part='snippet').execute()
+
+    with pytest.raises(tp.CircuitOpenError):
+        service.channels().list(id="UCtest000000000000000001", part='snippet').execute()
+
+    assert fake.calls['channels.list'] == 1
+
+
+def test_transient_insert_failures_deferred(fake):
+    fake.fail_next('playlistItems.insert', ConnectionResetError("reset"))
+    fake.fail_next('playlistItems.insert', http_error(503, 'backendError'))
+    service = tp.RetryingService(fake, tp.Transport(base_delay=0.0))
+    videos = sorted(video_id for video_id in fake.video_data)
+
+    added = gv.api_add_to_playlist("PLtest", [(video_id,) for video_id in videos], service, delay=False,
+                                   playlist_content=set(), save_not_added=False)
+
+    assert sorted(added["not_added"]) == videos[:2]
+    assert added["failed"] == []
+
+
+def test_permanent_insert_failure_dropped(fake):
+    fake.fail_next('playlistItems.insert', http_error(404, 'videoNotFound'))
+    videos = sorted(video_id for video_id in fake.video_data)
+
+    added = gv.api_add_to_playlist("PLtest", [(video_id,) for video_id in videos], fake, delay=False,
+                                   playlist_content=set(), save_not_added=False)
+
+    assert added == {"logs": added["logs"], "not_added": [], "failed": videos[:1]}
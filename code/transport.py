@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+import json
+import metrics as mt
+import quota as qt
+import random
+import ssl
+import threading
+import wrapping as wr
+
+from googleapiclient.errors import HttpError
+from httplib2 import HttpLib2Error
+from time import monotonic, sleep
+
+"""- SCRIPT INFORMATION -
+
+@file_name: transport.py
+@author: Dylan "dyl-m" Monfret
+
+Retries of API requests, in one place. 'RetryingService' wraps the service object generated with Google.py (usually
+around 'qt.QuotaMeter', so each attempt is charged as YouTube does) and executes requests through a shared 'Transport':
+
+- errors are classified: quota (403 'quotaExceeded', or local budget reached), rate limit (429, 403 rate-limit
+  reasons), server (5xx), network (connection reset, timeout, ...), exhausted (retries spent, to be sent again by a
+  later run) and permanent (any other error);
+- rate limit, server and network errors are retried with exponential backoff and jitter, within a retry budget per
+  endpoint ("resource.method") for the whole run. Insertions are not idempotent: only rate-limit errors, for which
+  nothing was done, are retried;
+- a circuit breaker stops sending requests, raising 'CircuitOpenError' at once: until the end of the run after a
+  quota error, for a cooldown after several consecutive failed requests.
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+NETWORK_ERRORS = (ConnectionError, TimeoutError, HttpLib2Error, ssl.SSLError)
+RETRYABLE = {'rate_limit', 'server', 'network'}
+NON_IDEMPOTENT = {'playlistItems.insert'}  # Only retried after rate-limit errors.
+DEFAULT_RETRY_BUDGET = 100  # Retries per endpoint and per run.
+RETRY_BUDGETS = {'playlistItems.insert': 20}
+
+" - LOCAL CLASSES - "
+
+
+class CircuitOpenError(qt.QuotaExceededError):
+    """Raised instead of sending a request while the API is considered unavailable (quota exhausted or too many
+    consecutive failures). Handled as a reached quota budget: the remaining work is deferred."""
+
+
+class RetriesExhaustedError(Exception):
+    """Raised when a request still fails after its retries (or when its endpoint has no retry budget left)."""
+
+    def __init__(self, method_name, error):
+        super().__init__(f"{method_name} failed: {error!r}")
+        self.method_name = method_name
+        self.error = error
+
+
+class Transport:
+    """Retry policy and circuit breaker shared by all the services of a run."""
+
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=64.0, retry_budgets=None, failure_threshold=5,
+                 cooldown=60.0, seed=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budgets = dict(RETRY_BUDGETS if retry_budgets is None else retry_budgets)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.retries = {}  # Endpoint -> retries made
+        self.consecutive_failures = 0
+        self.open_until = None  # monotonic() time, float('inf') after a quota error
+        self.open_reason = None
+
+    def reset(self):
+        """Start a new run: close the circuit and give retry budgets back (see 'scheduler.py', one run per tick)."""
+        with self.lock:
+            self.retries = {}
+            self.consecutive_failures = 0
+            self.open_until = self.open_reason = None
+
+    " - Circuit breaker - "
+
+    def check_circuit(self, method_name):
+        with self.lock:
+            if self.open_until is not None and monotonic() < self.open_until:
+                raise CircuitOpenError(f"{method_name} not sent, circuit open: {self.open_reason}")
+
+    def trip(self, reason, cooldown=None):
+        with self.lock:
+            self.open_until = float('inf') if cooldown is None else monotonic() + cooldown
+            self.open_reason = reason
+
+    def success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+            if self.open_until != float('inf'):  # A request sent before a quota error does not close the circuit.
+                self.open_until = self.open_reason = None
+
+    def failure(self, kind, error):
+        """Record a failed request, after its retries."""
+        if kind == 'quota':
+            self.trip(f"quota exhausted ({error})")
+            return
+
+        with self.lock:
+            self.consecutive_failures += 1
+            too_many = kind in RETRYABLE and self.consecutive_failures >= self.failure_threshold
+
+        if too_many:
+            self.trip(f"{self.consecutive_failures} consecutive failures, last one: {error!r}", self.cooldown)
+
+    " - Retries - "
+
+    def backoff(self, attempt):
+        """Delay before a retry: exponential, with jitter (half fixed, half random) so workers do not retry together."""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + self.random.uniform(0, delay / 2)
+
+    def can_retry(self, method_name, kind, attempt):
+        if kind not in RETRYABLE or attempt >= self.max_retries:
+            return False
+
+        if method_name in NON_IDEMPOTENT and kind != 'rate_limit':
+            return False
+
+        with self.lock:
+            if self.retries.get(method_name, 0) >= self.retry_budgets.get(method_name, DEFAULT_RETRY_BUDGET):
+                return False
+
+            self.retries[method_name] = self.retries.get(method_name, 0) + 1
+
+        return True
+
+    def execute(self, method_name, send):
+        """Send a request, retrying it if possible.
+
+        :param method_name: "resource.method" name of the request.
+        :param send: function without argument sending the request and returning its response.
+        :return: the response.
+        """
+        attempt = 0
+
+        while True:
+            self.check_circuit(method_name)
+
+            try:
+                response = send()
+
+            except (HttpError, qt.QuotaExceededError, *NETWORK_ERRORS) as error:
+                kind = classify_error(error)
+
+                if self.can_retry(method_name, kind, attempt):
+                    with mt.timed("wait", "retry"):
+                        sleep(self.backoff(attempt))
+
+                    attempt += 1
+                    continue
+
+                self.failure(kind, error)
+
+                if kind == 'quota' and not isinstance(error, qt.QuotaExceededError):
+                    raise CircuitOpenError(f"{method_name}: quota exhausted") from error
+
+                if kind in RETRYABLE:
+                    raise RetriesExhaustedError(method_name, error) from error
+
+                raise
+
+            self.success()
+            return response
+
+
+class RetryingRequest(wr.WrappedRequest):
+    """API request executed through a 'Transport'."""
+
+    def execute(self, *args, **kwargs):
+        return self.service.transport.execute(self.method_name, lambda: self.request.execute(*args, **kwargs))
+
+
+class RetryingBatch(wr.WrappedBatch):
+    """Batch request checked against the circuit breaker. Errors of its requests (given to callbacks, and retried by
+    'batching.execute_batch') are recorded by the transport."""
+
+    def added(self, request, callback):
+        def record_then_callback(rid, response, exception):
+            if exception is not None and classify_error(exception) == 'quota':
+                self.service.transport.failure('quota', exception)
+
+            if callback is not None:
+                callback(rid, response, exception)
+
+        return record_then_callback
+
+    def execute(self, *args, **kwargs):
+        self.service.transport.check_circuit('batch')
+        return self.batch.execute(*args, **kwargs)
+
+
+class RetryingService(wr.WrappedService):
+    """Service object executing every request through a 'Transport'. Same interface as the wrapped service."""
+
+    request_class = RetryingRequest
+    batch_class = RetryingBatch
+
+    def __init__(self, api_service, transport):
+        super().__init__(api_service)
+        self.transport = transport
+
+
+UNAVAILABLE_ERRORS = (qt.QuotaExceededError, RetriesExhaustedError)  # The API can't be used for now, defer the work.
+
+" - LOCAL FUNCTIONS - "
+
+
+def error_reason(exception):
+    """Get the reason of an API error ('rateLimitExceeded', 'quotaExceeded', ...).
+
+    :param exception: a googleapiclient.errors.HttpError object.
+    :return: the reason as characters string (empty if it can't be read).
+    """
+    try:
+        return json.loads(exception.content)['error']['errors'][0]['reason']
+
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return ''
+
+
+def classify_error(exception):
+    """Classify an exception raised by a request.
+
+    :param exception: an exception.
+    :return: 'quota', 'rate_limit', 'server', 'network', 'exhausted' or 'permanent'.
+    """
+    if isinstance(exception, qt.QuotaExceededError):
+        return 'quota'
+
+    if isinstance(exception, RetriesExhaustedError):  # Not retried again in this run, nor dropped.
+        return 'exhausted'
+
+    if isinstance(exception, NETWORK_ERRORS):
+        return 'network'
+
+    if isinstance(exception, HttpError):
+        status, reason = exception.resp.status, error_reason(exception)
+
+        if status == 403 and reason in QUOTA_REASONS:
+            return 'quota'
+
+        if status == 429 or reason in RATE_LIMIT_REASONS:
+            return 'rate_limit'
+
+        if status >= 500:
+            return 'server'
+
+    return 'permanent'
+
+
+def is_retryable(exception):
+    """Return a Boolean indicating if a failed request can be sent again later.
+
+    :param exception: an exception raised by a request.
+    :return: True for rate limit, server and network errors.
+    """
+    return classify_error(exception) in RETRYABLE
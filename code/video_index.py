@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from datetime import datetime
+from dateutil import tz
+from dateutil.relativedelta import relativedelta
+from os.path import isfile
+
+"""- SCRIPT INFORMATION -
+
+@file_name: video_index.py
+@author: Dylan "dyl-m" Monfret
+
+Local JSON index of every video seen per channel, with a high-water mark per channel: the upper bound of the last
+period fully processed for this channel. Next executions only ask for videos newer than it.
+
+Index format: {"last_run": ISO date,
+               "channels": {channel ID: {"watermark": ISO date,
+                                         "videos": {video ID: {"published_at": ISO 8601 UTC date,
+                                                               "duration": seconds or None,
+                                                               "playlists": playlist keys or None}}}}}
+"""
+
+" - PREPARATORY ELEMENTS - "
+
+DEFAULT_PATH = '../files/video_index.json'
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+" - LOCAL FUNCTIONS - "
+
+
+def load_video_index(json_path=DEFAULT_PATH):
+    """Load the video index from disk.
+
+    :param json_path: file path to the index JSON file.
+    :return: the index as a dictionary (empty if the file does not exist yet).
+    """
+    if not isfile(json_path):
+        return {"last_run": None, "channels": {}}
+
+    with open(json_path, encoding='utf8') as json_file:
+        return json.load(json_file)
+
+
+def save_video_index(index, json_path=DEFAULT_PATH):
+    """Write the video index on disk.
+
+    :param index: the index dictionary.
+    :param json_path: file path to the index JSON file.
+    """
+    with open(json_path, 'w', encoding='utf8') as json_file:
+        json.dump(index, json_file, indent=1, sort_keys=True)
+
+
+def get_last_run(index):
+    """Get the upper bound of the last period processed.
+
+    :param index: the index dictionary.
+    :return: a naive datetime.datetime object, or None if the index is empty.
+    """
+    if index.get("last_run"):
+        return datetime.strptime(index["last_run"], DATE_FORMAT)
+    return None
+
+
+def set_last_run(index, latest_date):
+    """Save the upper bound of the period processed by an execution.
+
+    :param index: the index dictionary.
+    :param latest_date: Upper bound of time interval (naive local datetime.datetime).
+    """
+    index["last_run"] = f"{latest_date:{DATE_FORMAT}}"
+
+
+def get_watermark(index, channel_id):
+    """Get the high-water mark of a channel.
+
+    :param index: the index dictionary.
+    :param channel_id: a YouTube channel ID.
+    :return: a naive datetime.datetime object, or None if the channel was never processed.
+    """
+    channel = index["channels"].get(channel_id)
+
+    if channel and channel.get("watermark"):
+        return datetime.strptime(channel["watermark"], DATE_FORMAT)
+    return None
+
+
+def set_watermark(index, channel_id, latest_date):
+    """Move the high-water mark of a channel after it has been processed.
+
+    :param index: the index dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param latest_date: Upper bound of the processed time interval (naive local datetime.datetime).
+    """
+    channel = index["channels"].setdefault(channel_id, {"watermark": None, "videos": {}})
+    channel["watermark"] = f"{latest_date:{DATE_FORMAT}}"
+
+
+def add_seen_videos(index, channel_id, api_videos_list):
+    """Record videos retrieved from a channel uploads playlist (see 'get_videos.api_get_channel_videos').
+
+    :param index: the index dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param api_videos_list: list of 'playlistItems' resources.
+    """
+    videos = index["channels"].setdefault(channel_id, {"watermark": None, "videos": {}})["videos"]
+
+    for video in api_videos_list:
+        published_at = video["contentDetails"].get("videoPublishedAt")
+
+        if published_at is not None:
+            videos.setdefault(video["contentDetails"]["videoId"],
+                              {"published_at": published_at, "duration": None, "playlists": None})
+
+
+def is_routed(index, channel_id, video_id):
+    """Return a Boolean indicating if a video was already routed (added to its playlists, if any).
+
+    :param index: the index dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param video_id: a YouTube video ID.
+    :return: True if the video has its playlists in the index.
+    """
+    video = index["channels"].get(channel_id, {"videos": {}})["videos"].get(video_id)
+    return bool(video) and video.get("playlists") is not None
+
+
+def count_since(index, channel_id, a_date):
+    """Count videos of a channel published after a date.
+
+    :param index: the index dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param a_date: a naive local datetime.datetime object.
+    :return: number of indexed videos published after 'a_date'.
+    """
+    videos = index["channels"].get(channel_id, {"videos": {}})["videos"]
+    date_utc = f"{a_date.astimezone(tz.tzutc()):%Y-%m-%dT%H:%M:%SZ}"  # ISO 8601 UTC dates are sorted as strings.
+
+    return sum(1 for video in videos.values() if video["published_at"] >= date_utc)
+
+
+def upload_frequency(index, channel_id, now=None):
+    """Estimate the upload frequency of a channel from its indexed videos of the last year. The index only holds the
+    videos seen since the channel was first crawled: the frequency is measured from the oldest of them, not over a
+    whole year.
+
+    :param index: the index dictionary.
+    :param channel_id: a YouTube channel ID.
+    :param now: reference date, naive local datetime.datetime (today by default).
+    :return: number of uploads per day (0.0 without indexed video in the last year).
+    """
+    now = (now or datetime.today()).astimezone(tz.tzutc())
+    a_year_ago = f"{now - relativedelta(years=1):%Y-%m-%dT%H:%M:%SZ}"  # ISO 8601 UTC dates are sorted as strings.
+    dates = [video["published_at"] for video in index["channels"].get(channel_id, {"videos": {}})["videos"].values()
+             if video["published_at"] >= a_year_ago]
+
+    if not dates:
+        return 0.0
+
+    oldest = datetime.strptime(min(dates), "%Y-%m-%dT%H:%M:%S%z")
+    return len(dates) / max((now - oldest).total_seconds() / 86400, 1.0)
+
+
+def set_video_results(index, results):
+    """Save duration and destination playlists of processed videos.
+
+    :param index: the index dictionary.
+    :param results: dictionary associating video ID and (duration as datetime.timedelta, list of playlist keys).
+    """
+    for channel in index["channels"].values():
+        for video_id, video in channel["videos"].items():
+            if video_id in results:
+                duration, playlists = results[video_id]
+                video["duration"] = int(duration.total_seconds())
+                video["playlists"] = playlists
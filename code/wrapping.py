@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""- SCRIPT INFORMATION -
+
+@file_name: wrapping.py
+@author: Dylan "dyl-m" Monfret
+
+Base classes of the services wrapping the service object generated with Google.py (see 'qt.QuotaMeter',
+'mt.TimedService', 'tp.RetryingService', 'rc.CachingService', 'fy.RecordingService'). A wrapped service has the same
+interface as the service it wraps: resources and methods are forwarded, requests they build are wrapped into the
+'request_class' of the service, and batch requests into its 'batch_class'. Each layer only overrides its hooks:
+'WrappedRequest.execute', 'WrappedBatch.added', 'WrappedBatch.execute' and, if some requests are left as they are,
+'WrappedService.wrap'.
+
+Layers are stacked (see 'sp.member_service'): 'unwrap' looks for the state of one of them through the whole stack.
+"""
+
+" - LOCAL CLASSES - "
+
+
+class WrappedRequest:
+    """API request built by a 'WrappedService', executed as the request it wraps."""
+
+    def __init__(self, request, method_name, kwargs, service):
+        self.request = request
+        self.method_name = method_name
+        self.kwargs = kwargs
+        self.service = service
+
+    @property
+    def headers(self):  # HTTP headers of the wrapped request ('If-None-Match', see 'rc.CachingRequest').
+        return self.request.headers
+
+    def execute(self, *args, **kwargs):
+        return self.request.execute(*args, **kwargs)
+
+
+class WrappedBatch:
+    """Batch request of a 'WrappedService': requests of its layer are unwrapped when added."""
+
+    def __init__(self, batch, service):
+        self.batch = batch
+        self.service = service
+
+    def add(self, request, callback=None, request_id=None):
+        if isinstance(request, self.service.request_class):
+            callback = self.added(request, callback)
+            request = request.request
+
+        self.batch.add(request, callback=callback, request_id=request_id)
+
+    def added(self, request, callback):
+        """Hook called for each request of the layer added to the batch.
+
+        :param request: the 'WrappedRequest' object.
+        :param callback: function called with the response of the request (or its error), possibly None.
+        :return: the callback given to the wrapped batch.
+        """
+        return callback
+
+    def execute(self, *args, **kwargs):
+        return self.batch.execute(*args, **kwargs)
+
+
+class WrappedResource:
+    """API resource ('channels', 'playlistItems', ...) whose methods build requests wrapped by its service."""
+
+    def __init__(self, resource, resource_name, service):
+        self.resource = resource
+        self.resource_name = resource_name
+        self.service = service
+
+    def __getattr__(self, method):
+        build_request = getattr(self.resource, method)
+        return lambda *args, **kwargs: self.service.wrap(build_request(*args, **kwargs),
+                                                         f"{self.resource_name}.{method}", kwargs)
+
+
+class WrappedService:
+    """Service object wrapping another one. Same interface as the wrapped service."""
+
+    request_class = WrappedRequest
+    batch_class = WrappedBatch
+
+    def __init__(self, api_service):
+        self.api_service = api_service
+
+    def new_batch_http_request(self, *args, **kwargs):
+        return self.batch_class(self.api_service.new_batch_http_request(*args, **kwargs), self)
+
+    def __getattr__(self, resource_name):
+        get_resource = getattr(self.api_service, resource_name)
+        return lambda *args, **kwargs: WrappedResource(get_resource(*args, **kwargs), resource_name, self)
+
+    def wrap(self, request, method_name, kwargs):
+        """Wrap a request built by the wrapped service.
+
+        :param request: request object of the wrapped service.
+        :param method_name: "resource.method" name of the request ("playlistItems.insert", ...).
+        :param kwargs: arguments the request was built with.
+        :return: a 'request_class' object.
+        """
+        return self.request_class(request, method_name, kwargs, self)
+
+
+" - LOCAL FUNCTIONS - "
+
+
+def unwrap(api_service, attribute):
+    """Get an attribute of a service, or of the first service it wraps having it ('usage' of a 'qt.QuotaMeter',
+    'cache' of a 'rc.CachingService', ...).
+
+    :param api_service: API Google Token generated with Google.py call, possibly wrapped.
+    :param attribute: name of the attribute.
+    :return: the attribute value, None if no service of the stack has it.
+    """
+    while api_service is not None:
+        attributes = vars(api_service)  # Not 'getattr': wrappers forward unknown attributes to the service they wrap.
+
+        if attribute in attributes:
+            return attributes[attribute]
+
+        api_service = attributes.get('api_service')
+
+    return None